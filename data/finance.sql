@@ -14,3 +14,73 @@
 /*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
 /*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;
 /*!40111 SET @OLD_SQL_NOTES=@@SQL_NOTES, SQL_NOTES=0 */;
+
+--
+-- Table structure for table `stock_info` (schema version 1, see functions/migrations.py)
+--
+
+DROP TABLE IF EXISTS `stock_info`;
+CREATE TABLE `stock_info` (
+  `Fecha` date NOT NULL,
+  `Symbol` varchar(16) NOT NULL,
+  `Open` double DEFAULT NULL,
+  `High` double DEFAULT NULL,
+  `Low` double DEFAULT NULL,
+  `Close_Price` double DEFAULT NULL,
+  `Volume` bigint(20) DEFAULT NULL,
+  PRIMARY KEY (`Symbol`,`Fecha`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+--
+-- Table structure for table `stock_info_weekly` (weekly OHLCV rollup, schema version 2, see functions/resampling.py)
+--
+
+DROP TABLE IF EXISTS `stock_info_weekly`;
+CREATE TABLE `stock_info_weekly` (
+  `Symbol` varchar(16) NOT NULL,
+  `Periodo` date NOT NULL,
+  `Open` double DEFAULT NULL,
+  `High` double DEFAULT NULL,
+  `Low` double DEFAULT NULL,
+  `Close_Price` double DEFAULT NULL,
+  `Volume` bigint(20) DEFAULT NULL,
+  `Dias` int(11) DEFAULT NULL,
+  `Ultima` date DEFAULT NULL,
+  PRIMARY KEY (`Symbol`,`Periodo`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+--
+-- Table structure for table `stock_info_monthly` (monthly OHLCV rollup, schema version 2, see functions/resampling.py)
+--
+
+DROP TABLE IF EXISTS `stock_info_monthly`;
+CREATE TABLE `stock_info_monthly` (
+  `Symbol` varchar(16) NOT NULL,
+  `Periodo` date NOT NULL,
+  `Open` double DEFAULT NULL,
+  `High` double DEFAULT NULL,
+  `Low` double DEFAULT NULL,
+  `Close_Price` double DEFAULT NULL,
+  `Volume` bigint(20) DEFAULT NULL,
+  `Dias` int(11) DEFAULT NULL,
+  `Ultima` date DEFAULT NULL,
+  PRIMARY KEY (`Symbol`,`Periodo`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+--
+-- Table structure for table `stock_info_yearly` (yearly OHLCV rollup, schema version 2, see functions/resampling.py)
+--
+
+DROP TABLE IF EXISTS `stock_info_yearly`;
+CREATE TABLE `stock_info_yearly` (
+  `Symbol` varchar(16) NOT NULL,
+  `Periodo` date NOT NULL,
+  `Open` double DEFAULT NULL,
+  `High` double DEFAULT NULL,
+  `Low` double DEFAULT NULL,
+  `Close_Price` double DEFAULT NULL,
+  `Volume` bigint(20) DEFAULT NULL,
+  `Dias` int(11) DEFAULT NULL,
+  `Ultima` date DEFAULT NULL,
+  PRIMARY KEY (`Symbol`,`Periodo`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
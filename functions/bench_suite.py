@@ -0,0 +1,547 @@
+# THIS MODULE TIMES EVERY PUBLIC FUNCTION OF main, to_sql, stats_functions AND plot_functions
+# ON SYNTHETIC DATA, SO CHANGES CAN BE COMPARED RUN AGAINST RUN.
+# - generar_ohlcv BUILDS SEEDED GBM PRICE PATHS (N SYMBOLS x M YEARS OF BUSINESS DAYS)
+# - EACH TIER IS LOADED INTO A TEMPORARY SQLITE stock_info (SAME SCHEMA AS migrations.py)
+# - ServidorAlphaVantage SERVES THE SAME DATA AS AlphaVantage JSON ON 127.0.0.1, SO
+#   get_data_daily AND to_sql RUN END TO END WITHOUT NETWORK ACCESS OR AN API KEY
+# - RESULTS ARE WRITTEN AS JSON; --comparar FLAGS FUNCTIONS THAT GOT SLOWER THAN A BASELINE
+# RUN IT FROM THE functions/ DIRECTORY:
+#   python bench_suite.py --tiers small medium --salida bench.json --comparar bench_base.json
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import inspect
+import platform
+import datetime
+import argparse
+import tempfile
+import statistics
+import threading
+import contextlib
+import subprocess
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+# TIER -> (SYMBOLS, YEARS)
+TIERS = {
+    "small": (10, 2),
+    "medium": (50, 5),
+    "large": (200, 10),
+}
+
+MODULOS = ("main", "to_sql", "stats_functions", "plot_functions")
+
+# CHARTS USE THE FIRST FEW SYMBOLS OF THE TIER (A CHART WITH 200 LINES IS NOT A REALISTIC JOB)
+SYMBOLS_GRAFICO = 5
+
+
+# SEEDED OHLCV GENERATOR: GEOMETRIC BROWNIAN MOTION WITH A DRIFT AND VOLATILITY PER SYMBOL,
+# OVERNIGHT GAPS, INTRADAY RANGES AROUND OPEN/CLOSE AND LOG-NORMAL VOLUMES.
+# RETURNS A stock_info-SHAPED FRAME ORDERED BY (Symbol, Fecha)
+def generar_ohlcv(n_symbols=10, n_anios=5, seed=0, inicio="2000-01-03"):
+    rng = np.random.default_rng(seed)
+    fechas = pd.bdate_range(inicio, periods=252 * n_anios)
+    n = len(fechas)
+    dt = 1 / 252
+
+    mu = rng.uniform(-0.05, 0.15, n_symbols)
+    sigma = rng.uniform(0.15, 0.60, n_symbols)
+    s0 = rng.uniform(10, 500, n_symbols)
+    paso = sigma * np.sqrt(dt)
+
+    retornos = (mu - sigma ** 2 / 2) * dt + paso * rng.standard_normal((n, n_symbols))
+    cierre = s0 * np.exp(np.cumsum(retornos, axis=0))
+    previo = np.vstack([s0, cierre[:-1]])
+    apertura = previo * np.exp(0.25 * paso * rng.standard_normal((n, n_symbols)))
+    maximo = np.maximum(apertura, cierre) * (1 + np.abs(0.5 * paso * rng.standard_normal((n, n_symbols))))
+    minimo = np.minimum(apertura, cierre) * (1 - np.abs(0.5 * paso * rng.standard_normal((n, n_symbols))))
+    volumen_medio = rng.uniform(1e6, 5e7, n_symbols)
+    volumen = rng.lognormal(np.log(volumen_medio), 0.5, (n, n_symbols)).astype(np.int64)
+
+    symbols = [f"SYM{i:03d}" for i in range(n_symbols)]
+    # COLUMN-MAJOR RAVEL: ALL DATES OF THE FIRST SYMBOL, THEN THE SECOND...
+    df = pd.DataFrame({
+        "Fecha": np.tile(fechas.to_numpy(), n_symbols),
+        "Symbol": np.repeat(symbols, n),
+        "Open": apertura.ravel(order="F").round(4),
+        "High": maximo.ravel(order="F").round(4),
+        "Low": minimo.ravel(order="F").round(4),
+        "Close_Price": cierre.ravel(order="F").round(4),
+        "Volume": volumen.ravel(order="F"),
+    })
+    return df
+
+
+# CREATES A SQLITE FILE WITH THE MIGRATED stock_info SCHEMA AND LOADS df INTO IT
+def cargar_sqlite(df, ruta):
+    from sqlalchemy import create_engine
+    from migrations import migrar
+    from bulk_loader import bulk_write
+    import resampling
+
+    engine = create_engine(f"sqlite:///{ruta}")
+    migrar(engine)
+    bulk_write(df, engine)
+    resampling.actualizar(engine, df)
+    return engine
+
+
+# ALPHAVANTAGE TIME_SERIES_DAILY PAYLOAD (NEWEST DATE FIRST) FOR THE ROWS OF ONE SYMBOL
+# 'compact' KEEPS THE LAST 100 TRADING DAYS LIKE THE REAL API
+def payload_alphavantage(df_symbol, outputsize="full"):
+    if outputsize == "compact":
+        df_symbol = df_symbol.tail(100)
+    df_symbol = df_symbol.iloc[::-1]
+    fechas = df_symbol["Fecha"].dt.strftime("%Y-%m-%d")
+    serie = {
+        fecha: {
+            "1. open": f"{o:.4f}",
+            "2. high": f"{h:.4f}",
+            "3. low": f"{l:.4f}",
+            "4. close": f"{c:.4f}",
+            "5. volume": str(v),
+        }
+        for fecha, o, h, l, c, v in zip(fechas, df_symbol["Open"], df_symbol["High"], df_symbol["Low"],
+                                         df_symbol["Close_Price"], df_symbol["Volume"])
+    }
+    symbol = df_symbol["Symbol"].iat[0] if len(df_symbol) else ""
+    return {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": fechas.iat[0] if len(fechas) else "",
+            "4. Output Size": "Full size" if outputsize == "full" else "Compact",
+            "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": serie,
+    }
+
+
+# OFFLINE STAND-IN FOR https://www.alphavantage.co/query SERVING A SYNTHETIC FRAME
+# USE IT AS A CONTEXT MANAGER; .url IS THE api_url TO CONFIGURE
+class ServidorAlphaVantage:
+    def __init__(self, df):
+        self.grupos = {symbol: grupo for symbol, grupo in df.groupby("Symbol", sort=False)}
+        self.respuestas = {}
+        self.lock = threading.Lock()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                cuerpo = servidor.responder(params.get("symbol", ""), params.get("outputsize", "compact"))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/query"
+        self.hilo = None
+
+    # ENCODED RESPONSES ARE BUILT ONCE PER (SYMBOL, OUTPUTSIZE)
+    def responder(self, symbol, outputsize):
+        clave = (symbol.upper(), outputsize)
+        with self.lock:
+            if clave not in self.respuestas:
+                if clave[0] in self.grupos:
+                    info = payload_alphavantage(self.grupos[clave[0]], outputsize)
+                else:
+                    info = {"Error Message": "Invalid API call. Please retry or visit the documentation."}
+                self.respuestas[clave] = json.dumps(info).encode("utf-8")
+            return self.respuestas[clave]
+
+    def __enter__(self):
+        self.hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# WRITES THE config.yaml THAT get_data_daily/to_sql READ FROM THE WORKING DIRECTORY
+def escribir_config(directorio, symbols, api_url):
+    import yaml
+    config = {
+        "stock_symbols": list(symbols),
+        "adjusted": [True, False],
+        # get_data_daily USES outputsize[1]: THE BENCHMARK INGESTS THE FULL HISTORY
+        "outputsize": ["compact", "full"],
+        "funciones": "TIME_SERIES_DAILY",
+        "api_url": api_url,
+        "rate_limit_per_minute": 1_000_000,
+        "max_workers": 8,
+        "max_retries": 0,
+        "retry_backoff": 0.0,
+        "bulk_strategy": "auto",
+        "bulk_batch_bytes": 1_000_000,
+    }
+    with open(Path(directorio) / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+
+
+def _filas(resultado):
+    if isinstance(resultado, (pd.DataFrame, pd.Series, list, tuple)):
+        return len(resultado)
+    if isinstance(resultado, dict) and "Matriz" in resultado:
+        return len(resultado["Matriz"])
+    if isinstance(resultado, np.ndarray):
+        return int(resultado.shape[0]) if resultado.ndim else 1
+    if isinstance(resultado, (int, np.integer)):
+        return int(resultado)
+    return None
+
+
+def _consumir(generador):
+    return sum(1 for _ in generador)
+
+
+# BUILDS THE (MODULE, NAME, CALL, SETUP) CASES OF A LOADED TIER
+# NAME IS THE FUNCTION NAME, WITH THE VARIANT IN BRACKETS WHEN A FUNCTION HAS SEVERAL CASES
+def casos(ctx):
+    import main
+    import to_sql
+    import resampling
+    import stats_functions as sf
+    import plot_functions as pf
+
+    symbols, uno, grafico = ctx["symbols"], ctx["symbols"][0], ctx["symbols"][:SYMBOLS_GRAFICO]
+    start, end = ctx["start"], ctx["end"]
+    df_uno = ctx["df"][ctx["df"]["Symbol"] == uno]
+    payload = payload_alphavantage(df_uno)["Time Series (Daily)"]
+    precios = sf.GetOpenCloseSpanCompanies(symbols, start, end)
+    panel = sf.PanelRetornos(symbols, start, end)
+    pesos = np.random.default_rng(0).dirichlet(np.ones(len(symbols)), 10_000)
+    chunks = list(sf.StockInfoStream(symbols, start, end, chunksize=50_000))
+    con_retornos = list(sf.LogReturnsStream(chunks))
+    crudo = sf.GetVariousCompanies(symbols, start, end)
+
+    return [
+        ("main", "cargar_configuracion_yaml", lambda: main.cargar_configuracion_yaml("config.yaml"), None),
+        ("main", "parse_daily_payload", lambda: main.parse_daily_payload(uno, payload), None),
+        ("main", "get_data_daily", lambda: main.get_data_daily(), None),
+        ("main", "get_data_daily[raw cache]", ctx["con_cache_crudo"](main.get_data_daily), None),
+
+        ("to_sql", "to_sql[full]", lambda: to_sql.to_sql(incremental=False), ctx["vaciar_ingesta"]),
+        ("to_sql", "to_sql[incremental]", lambda: to_sql.to_sql(incremental=True), ctx["usar_ingesta"]),
+        ("to_sql", "to_sql[replay]", lambda: to_sql.to_sql(incremental=False, replay=True), ctx["vaciar_y_cebar"]),
+        ("to_sql", "get_watermarks", to_sql.get_watermarks, None),
+        ("to_sql", "elegir_outputsize",
+         lambda: to_sql.elegir_outputsize(to_sql.get_watermarks(), symbols), None),
+
+        ("stats_functions", "GetHistoricalData", lambda: sf.GetHistoricalData(uno), None),
+        ("stats_functions", "GetHistoricalData[chunksize]",
+         lambda: _consumir(sf.GetHistoricalData(uno, chunksize=10_000)), None),
+        ("stats_functions", "GetDataPeriodically", lambda: sf.GetDataPeriodically(start, end, uno), None),
+        ("stats_functions", "GetVariousCompanies", lambda: sf.GetVariousCompanies(symbols, start, end), None),
+        ("stats_functions", "GetCompaniesVolumeSpan", lambda: sf.GetCompaniesVolumeSpan(symbols, start, end), None),
+        ("stats_functions", "GetOHLCVBars[W]", lambda: sf.GetOHLCVBars(symbols, start, end, "W"), None),
+        ("stats_functions", "GetOHLCVBars[M]", lambda: sf.GetOHLCVBars(symbols, start, end, "M"), None),
+        ("stats_functions", "GetOHLCVBars[Y]", lambda: sf.GetOHLCVBars(symbols, start, end, "Y"), None),
+        ("stats_functions", "VolumenMensual",
+         lambda: sf.VolumenMensual(resampling.resamplear(crudo, "M")), None),
+        ("stats_functions", "AperturaCierre", lambda: sf.AperturaCierre(crudo), None),
+        ("stats_functions", "GetOpenCloseSpan", lambda: sf.GetOpenCloseSpan(uno, start, end), None),
+        ("stats_functions", "GetOpenCloseSpanCompanies",
+         lambda: sf.GetOpenCloseSpanCompanies(symbols, start, end), None),
+        ("stats_functions", "GetCompanyVolumeSpan", lambda: sf.GetCompanyVolumeSpan(uno, start, end), None),
+        ("stats_functions", "CalcularRetornoAjustado", lambda: sf.CalcularRetornoAjustado(precios), None),
+        ("stats_functions", "GetAdjustedReturn", lambda: sf.GetAdjustedReturn(uno, start, end), None),
+        ("stats_functions", "DrawdownEpisodes",
+         lambda: sf.DrawdownEpisodes(df_uno["Fecha"], df_uno["Close_Price"]), None),
+        ("stats_functions", "GetDrawdownEpisodes", lambda: sf.GetDrawdownEpisodes(symbols, start, end), None),
+        ("stats_functions", "GetMDD_Duration", lambda: sf.GetMDD_Duration(uno, start, end), None),
+        ("stats_functions", "RollingVolatility",
+         lambda: sf.RollingVolatility(panel.to_numpy(), (20, 40, 60, 80, 100, 252)), None),
+        ("stats_functions", "GetVolatilityTermStructure",
+         lambda: sf.GetVolatilityTermStructure(symbols, start, end), None),
+        ("stats_functions", "VolatilidadMovil", lambda: sf.VolatilidadMovil(uno, start, end), None),
+        ("stats_functions", "GetVariousAdjRet", lambda: sf.GetVariousAdjRet(symbols, start, end), None),
+        ("stats_functions", "GetCompaniesCorrInSpan", lambda: sf.GetCompaniesCorrInSpan(symbols, start, end), None),
+        ("stats_functions", "GetPanel", lambda: sf.GetPanel(symbols, start, end), None),
+        ("stats_functions", "GetPanel[float32]", lambda: sf.GetPanel(symbols, start, end, np.float32), None),
+        ("stats_functions", "PanelRetornos", lambda: sf.PanelRetornos(symbols, start, end), None),
+        ("stats_functions", "GetPortfolioStats",
+         lambda: sf.GetPortfolioStats(symbols, start, end, pesos), None),
+        ("stats_functions", "GetEfficientFrontier",
+         lambda: sf.GetEfficientFrontier(symbols, start, end, n_portafolios=50_000), None),
+        ("stats_functions", "RollingCorrelationStream",
+         lambda: _consumir(sf.RollingCorrelationStream(panel.to_numpy(), 60, paso=21)), None),
+        ("stats_functions", "EwmaCorrelationStream",
+         lambda: _consumir(sf.EwmaCorrelationStream(panel.to_numpy(), paso=21)), None),
+        ("stats_functions", "GetRollingCorrelation[rolling]",
+         lambda: sf.GetRollingCorrelation(symbols, start, end, paso=21), None),
+        ("stats_functions", "GetRollingCorrelation[ewma]",
+         lambda: sf.GetRollingCorrelation(symbols, start, end, metodo="ewma", paso=21), None),
+        ("stats_functions", "DailyReturnStats[sql]",
+         lambda: sf.DailyReturnStats(symbols, start, end, modo="sql"), None),
+        ("stats_functions", "DailyReturnStats[pandas]",
+         lambda: sf.DailyReturnStats(symbols, start, end, modo="pandas"), None),
+        ("stats_functions", "GetQuantiilesCompanies[sql]",
+         lambda: sf.GetQuantiilesCompanies(symbols, start, end, modo="sql"), None),
+        ("stats_functions", "GetQuantiilesCompanies[pandas]",
+         lambda: sf.GetQuantiilesCompanies(symbols, start, end, modo="pandas"), None),
+        ("stats_functions", "StockInfoStream",
+         lambda: _consumir(sf.StockInfoStream(symbols, start, end, chunksize=50_000)), None),
+        ("stats_functions", "LogReturnsStream", lambda: _consumir(sf.LogReturnsStream(chunks)), None),
+        ("stats_functions", "DrawdownStream", lambda: _consumir(sf.DrawdownStream(chunks)), None),
+        ("stats_functions", "RunningStatsStream", lambda: _consumir(sf.RunningStatsStream(con_retornos)), None),
+        ("stats_functions", "GetHistorySummary", lambda: sf.GetHistorySummary(symbols, start, end), None),
+        ("stats_functions", "GetRollingVaR", lambda: sf.GetRollingVaR(symbols, start, end), None),
+        ("stats_functions", "GetShardedAnalytics[adjusted_return]",
+         lambda: sf.GetShardedAnalytics(symbols, start, end, "adjusted_return"), None),
+        ("stats_functions", "GetShardedAnalytics[volatility]",
+         lambda: sf.GetShardedAnalytics(symbols, start, end, "volatility"), None),
+        ("stats_functions", "GetShardedAnalytics[mdd]", lambda: sf.GetShardedAnalytics(symbols, start, end, "mdd"), None),
+        ("stats_functions", "GetRollingVaR[approx]",
+         lambda: sf.GetRollingVaR(symbols, start, end, metodo="approx"), None),
+        ("stats_functions", "RebuildLiveMetrics", lambda: sf.RebuildLiveMetrics(symbols), None),
+        ("stats_functions", "GetLiveMetrics", lambda: sf.GetLiveMetrics(symbols), None),
+
+        ("plot_functions", "RutaFigura", lambda: pf.RutaFigura("Bench", uno, start, end), None),
+        ("plot_functions", "MostrarFigura", pf.MostrarFigura, None),
+        ("plot_functions", "PlotVolumeCompany", lambda: pf.PlotVolumeCompany(uno, start, end), None),
+        ("plot_functions", "PlotVolumeCompanies", lambda: pf.PlotVolumeCompanies(grafico, start, end), None),
+        ("plot_functions", "VMDailyGraphCompanies", lambda: pf.VMDailyGraphCompanies(grafico, start, end), None),
+        ("plot_functions", "VMYearlyGraphCompanies", lambda: pf.VMYearlyGraphCompanies(grafico, start, end), None),
+        ("plot_functions", "PlotRetornoCompanies", lambda: pf.PlotRetornoCompanies(grafico, start, end), None),
+        ("plot_functions", "PlotCorrInSpanCompanies",
+         lambda: pf.PlotCorrInSpanCompanies(grafico, start, end), None),
+        ("plot_functions", "PlotHistRetornos", lambda: pf.PlotHistRetornos(grafico, start, end), None),
+    ]
+
+
+# PUBLIC FUNCTIONS OF THE BENCHMARKED MODULES THAT HAVE NO CASE (NEW FUNCTIONS SHOW UP HERE)
+def sin_caso(lista_casos):
+    import importlib
+    cubiertas = {(modulo, nombre.split("[")[0]) for modulo, nombre, _, _ in lista_casos}
+    faltan = []
+    for modulo in MODULOS:
+        mod = importlib.import_module(modulo)
+        for nombre, funcion in inspect.getmembers(mod, inspect.isfunction):
+            if funcion.__module__ == modulo and not nombre.startswith("_") and (modulo, nombre) not in cubiertas:
+                faltan.append(f"{modulo}.{nombre}")
+    return faltan
+
+
+# TIMES ONE CASE: THE FIRST (COLD) CALL AND THE MIN/MEDIAN OF 'repeticiones' CALLS
+# preparar RUNS BEFORE EVERY CALL AND IS NOT TIMED
+def medir_caso(funcion, preparar=None, repeticiones=3):
+    tiempos, resultado, error = [], None, None
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = funcion()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}".splitlines()[0]
+            break
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado, error
+
+
+# LOADS ONE TIER AND TIMES EVERY CASE. RETURNS ONE RESULT DICTIONARY PER CASE
+def correr_tier(tier, repeticiones=3, seed=0, filtro=None):
+    import matplotlib
+    matplotlib.use("Agg")
+    from sqlalchemy import create_engine
+    import db
+    import cache
+    import memo
+    import online
+    import raw_cache
+    import plot_functions
+
+    n_symbols, n_anios = TIERS[tier]
+    directorio = Path(tempfile.mkdtemp(prefix=f"bench_{tier}_"))
+    cwd = os.getcwd()
+    activos = cache.CACHE_DIR, memo.ACTIVO, plot_functions.FIGURES_DIR, online.RUTA_ESTADO
+    crudos = raw_cache.RAW_DIR, raw_cache.ACTIVO
+    fecha_operacion = raw_cache.fecha_operacion
+    resultados = []
+    try:
+        df = generar_ohlcv(n_symbols, n_anios, seed=seed)
+        symbols = list(df["Symbol"].unique())
+        analitica = cargar_sqlite(df, directorio / "stock_info.db")
+        fin = df["Fecha"].max()
+
+        # MEMO OFF SO REPEATED CALLS DO THE WORK AGAIN; LOCAL CACHE, LIVE METRICS AND FIGURES IN THE TEMP DIRECTORY
+        memo.ACTIVO = False
+        cache.CACHE_DIR = directorio / "cache"
+        online.RUTA_ESTADO = directorio / "online_state.json"
+        online.registro().olvidar()
+        plot_functions.FIGURES_DIR = directorio / "figures"
+        # DOWNLOADS ALWAYS HIT THE SERVER EXCEPT IN THE [raw cache] CASE
+        raw_cache.RAW_DIR = directorio / "raw"
+        raw_cache.ACTIVO = False
+        plot_functions.FIGURES_DIR.mkdir()
+
+        # to_sql WRITES INTO ITS OWN DATABASE; EVERY OTHER CASE READS THE LOADED TIER
+        ingesta = create_engine(f"sqlite:///{directorio / 'ingesta.db'}")
+
+        def usar(engine):
+            db.set_engine(engine)
+            cache.invalidar()
+
+        def vaciar_ingesta():
+            with ingesta.begin() as conn:
+                conn.exec_driver_sql("drop table if exists stock_info")
+                conn.exec_driver_sql("drop table if exists schema_version")
+            online.REGISTRO.olvidar()
+            usar(ingesta)
+
+        # THE SYNTHETIC HISTORY ENDS ON fin: IT PLAYS TODAY'S TRADING DATE SO ITS RESPONSES ARE REUSED
+        def con_cache_crudo(funcion):
+            def llamar():
+                raw_cache.ACTIVO = True
+                raw_cache.fecha_operacion = lambda hoy=None: str(fin.date())
+                try:
+                    return funcion()
+                finally:
+                    raw_cache.ACTIVO = False
+                    raw_cache.fecha_operacion = fecha_operacion
+            return llamar
+
+        with ServidorAlphaVantage(df) as servidor:
+            escribir_config(directorio, symbols, servidor.url)
+            usar(analitica)
+
+            # THE REPLAY CASE NEEDS THE RAW RESPONSES; THEY ARE STORED ONCE IF NO CASE DID IT BEFORE
+            def vaciar_y_cebar():
+                vaciar_ingesta()
+                tienda = raw_cache.almacen()
+                if not tienda.listar():
+                    fecha = str(fin.date())
+                    for symbol in symbols:
+                        tienda.guardar("TIME_SERIES_DAILY", symbol, "full", fecha, servidor.responder(symbol, "full"))
+                    tienda.escribir_indice()
+
+            ctx = {
+                "df": df, "symbols": symbols, "start": (2000, 1, 1), "end": (fin.year, fin.month, fin.day),
+                "vaciar_ingesta": vaciar_ingesta, "usar_ingesta": lambda: usar(ingesta),
+                "con_cache_crudo": con_cache_crudo, "vaciar_y_cebar": vaciar_y_cebar,
+            }
+            lista = casos(ctx)
+            faltan = sin_caso(lista)
+            for falta in faltan:
+                print(f"NO BENCHMARK CASE FOR {falta}")
+
+            # get_data_daily AND to_sql READ config.yaml FROM THE WORKING DIRECTORY
+            os.chdir(directorio)
+
+            for modulo, nombre, funcion, preparar in lista:
+                if filtro and filtro not in f"{modulo}.{nombre}":
+                    continue
+                tiempos, resultado, error = medir_caso(funcion, preparar, repeticiones)
+                fila = {
+                    "tier": tier, "modulo": modulo, "funcion": nombre,
+                    "n_symbols": n_symbols, "n_anios": n_anios, "filas_tier": len(df),
+                    "filas": _filas(resultado), "repeticiones": len(tiempos),
+                    "primera": tiempos[0] if tiempos else None,
+                    "min": min(tiempos) if tiempos else None,
+                    "mediana": statistics.median(tiempos) if tiempos else None,
+                    "error": error,
+                }
+                resultados.append(fila)
+                estado = f"ERROR {error}" if error else f"{fila['min'] * 1000:9.1f} ms"
+                print(f"[{tier}] {modulo + '.' + nombre:<52} {estado}")
+                if preparar is not None:
+                    usar(analitica)
+    finally:
+        os.chdir(cwd)
+        db.set_engine(None)
+        cache.CACHE_DIR, memo.ACTIVO, plot_functions.FIGURES_DIR, online.RUTA_ESTADO = activos
+        raw_cache.RAW_DIR, raw_cache.ACTIVO = crudos
+        online.REGISTRO.olvidar()
+        shutil.rmtree(directorio, ignore_errors=True)
+    return resultados
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# RUNS THE REQUESTED TIERS AND RETURNS THE MACHINE-READABLE REPORT
+def correr_suite(tiers=("small",), repeticiones=3, seed=0, filtro=None):
+    resultados = []
+    for tier in tiers:
+        resultados.extend(correr_tier(tier, repeticiones, seed, filtro))
+    return {
+        "meta": {
+            "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "seed": seed,
+            "tiers": {t: TIERS[t] for t in tiers},
+        },
+        "resultados": resultados,
+    }
+
+
+# COMPARES TWO REPORTS CASE BY CASE (BEST TIME). A CASE IS A REGRESSION WHEN IT IS MORE THAN
+# 'umbral' SLOWER AND THE DIFFERENCE IS ABOVE 'minimo' SECONDS (TO IGNORE TIMER NOISE)
+def comparar(base, actual, umbral=0.20, minimo=0.005):
+    previos = {(r["tier"], r["modulo"], r["funcion"]): r for r in base["resultados"]}
+    filas = []
+    for r in actual["resultados"]:
+        clave = (r["tier"], r["modulo"], r["funcion"])
+        previo = previos.get(clave)
+        if previo is None or previo["min"] is None or r["min"] is None:
+            continue
+        razon = r["min"] / previo["min"] if previo["min"] > 0 else float("inf")
+        filas.append({
+            "tier": r["tier"], "modulo": r["modulo"], "funcion": r["funcion"],
+            "base": previo["min"], "actual": r["min"], "razon": razon,
+            "regresion": razon > 1 + umbral and r["min"] - previo["min"] > minimo,
+        })
+    return filas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic-data benchmark suite")
+    parser.add_argument("--tiers", nargs="+", default=["small"], choices=list(TIERS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filtro", default=None, help="only cases whose 'module.function' contains this text")
+    parser.add_argument("--salida", default="bench_results.json")
+    parser.add_argument("--comparar", default=None, help="baseline JSON produced by a previous run")
+    parser.add_argument("--umbral", type=float, default=0.20)
+    args = parser.parse_args()
+
+    reporte = correr_suite(args.tiers, args.repeticiones, args.seed, args.filtro)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, indent=2)
+    print(f"RESULTS WRITTEN TO {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        filas = comparar(base, reporte, umbral=args.umbral)
+        regresiones = [f for f in filas if f["regresion"]]
+        for f in regresiones:
+            print(f"REGRESSION [{f['tier']}] {f['modulo']}.{f['funcion']}: "
+                  f"{f['base'] * 1000:.1f} ms -> {f['actual'] * 1000:.1f} ms (x{f['razon']:.2f})")
+        print(f"{len(regresiones)} REGRESSION(S) IN {len(filas)} COMPARED CASES")
+        sys.exit(1 if regresiones else 0)
@@ -0,0 +1,795 @@
+# THIS MODULE CONTAINS SMALL BENCHMARKS USED TO CHECK PERFORMANCE CHANGES
+# RUN IT FROM THE functions/ DIRECTORY: python benchmarks.py
+import time
+import datetime
+import contextlib
+import numpy as np
+import pandas as pd
+
+
+# MEASURES THE BEST WALL-CLOCK TIME OF A CALLABLE OVER SEVERAL REPETITIONS
+def medir(funcion, *args, repeticiones=3, **kwargs):
+    mejor = float("inf")
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+# BUILDS A SYNTHETIC "Time Series (Daily)" BLOCK WITH n_dias TRADING DAYS (NEWEST FIRST)
+def payload_sintetico(n_dias, adjusted=False, seed=0):
+    rng = np.random.default_rng(seed)
+    precios = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_dias)))
+    volumenes = rng.integers(1_000_000, 50_000_000, n_dias)
+    inicio = datetime.date(2000, 1, 3)
+    info_daily = {}
+    for i in range(n_dias - 1, -1, -1):
+        dia = (inicio + datetime.timedelta(days=i)).isoformat()
+        p = precios[i]
+        valores = {
+            "1. open": f"{p * 0.99:.4f}",
+            "2. high": f"{p * 1.01:.4f}",
+            "3. low": f"{p * 0.98:.4f}",
+            "4. close": f"{p:.4f}",
+        }
+        if adjusted:
+            valores["5. adjusted close"] = f"{p * 0.97:.4f}"
+            valores["6. volume"] = str(volumenes[i])
+        else:
+            valores["5. volume"] = str(volumenes[i])
+        info_daily[dia] = valores
+    return info_daily
+
+
+# ROW-BY-ROW PARSER USED BY get_data_daily BEFORE THE COLUMNAR PARSER (REFERENCE ONLY)
+def _parse_por_filas(symbol, info_daily):
+    datos = []
+    for dia, values in info_daily.items():
+        close_price = values.get('5. adjusted close', values.get('4. close'))
+        volume_key = '6. volume' if '5. adjusted close' in values else '5. volume'
+        datos.append({
+            "Fecha": pd.to_datetime(dia),
+            "Symbol": symbol,
+            "Open": float(values.get('1. open')),
+            "High": float(values.get('2. high')),
+            "Low": float(values.get('3. low')),
+            "Close_Price": float(close_price) if close_price is not None else None,
+            "Volume": int(values.get(volume_key, 0)),
+        })
+    return pd.DataFrame(datos)
+
+
+# COMPARES THE ROW-BY-ROW PARSER AGAINST main.parse_daily_payload
+def bench_parser(n_dias=5000, n_symbols=20):
+    from main import parse_daily_payload
+
+    payloads = {f"SYM{i}": payload_sintetico(n_dias, adjusted=i % 2 == 0, seed=i) for i in range(n_symbols)}
+
+    def por_filas():
+        return pd.concat([_parse_por_filas(s, p) for s, p in payloads.items()], ignore_index=True)
+
+    def columnar():
+        return pd.concat([parse_daily_payload(s, p) for s, p in payloads.items()], ignore_index=True)
+
+    t_filas, df_filas = medir(por_filas, repeticiones=1)
+    t_col, df_col = medir(columnar)
+    pd.testing.assert_frame_equal(df_filas, df_col, check_dtype=False)
+
+    filas = n_dias * n_symbols
+    print(f"PARSER ({filas:,} ROWS): ROW-BY-ROW {t_filas:.3f}s | COLUMNAR {t_col:.3f}s | "
+          f"SPEEDUP x{t_filas / t_col:.1f}")
+    return {"filas": filas, "por_filas": t_filas, "columnar": t_col}
+
+
+# BUILDS A SYNTHETIC stock_info FRAME WITH n_symbols x n_dias ROWS (GBM PRICE PATHS)
+def frame_sintetico(n_symbols=10, n_dias=2520, seed=0):
+    from main import parse_daily_payload
+    return pd.concat(
+        [parse_daily_payload(f"SYM{i}", payload_sintetico(n_dias, seed=seed + i)) for i in range(n_symbols)],
+        ignore_index=True,
+    )
+
+
+# MEASURES ROWS/SEC OF THE PREVIOUS to_sql(chunksize=100) PATH AND EACH bulk_loader STRATEGY
+# THE load_data STRATEGY IS ONLY MEASURED WHEN BENCH_MYSQL_URL POINTS TO A MYSQL/MARIADB SERVER
+def bench_bulk_loader(n_symbols=10, n_dias=2520):
+    import os
+    import tempfile
+    from sqlalchemy import create_engine
+    from bulk_loader import bulk_write
+
+    df = frame_sintetico(n_symbols, n_dias)
+    resultados = {}
+
+    def nuevo_engine():
+        ruta = tempfile.mkstemp(suffix=".db")[1]
+        return create_engine(f"sqlite:///{ruta}"), ruta
+
+    engine, ruta = nuevo_engine()
+    t, _ = medir(df.to_sql, "stock_info", engine, if_exists="append", index=False, chunksize=100,
+                 repeticiones=1)
+    resultados["to_sql_chunksize_100"] = len(df) / t
+    engine.dispose()
+    os.remove(ruta)
+
+    engine, ruta = nuevo_engine()
+    t, _ = medir(bulk_write, df, engine, estrategia="executemany", repeticiones=1)
+    resultados["executemany"] = len(df) / t
+    engine.dispose()
+    os.remove(ruta)
+
+    if os.getenv("BENCH_MYSQL_URL"):
+        engine = create_engine(os.getenv("BENCH_MYSQL_URL"), connect_args={"local_infile": True})
+        for estrategia in ("executemany", "load_data"):
+            with engine.begin() as conn:
+                conn.exec_driver_sql("drop table if exists stock_info")
+            t, _ = medir(bulk_write, df, engine, estrategia=estrategia, repeticiones=1)
+            resultados[f"mysql_{estrategia}"] = len(df) / t
+        engine.dispose()
+
+    for nombre, filas_seg in resultados.items():
+        print(f"BULK LOADER ({len(df):,} ROWS) {nombre}: {filas_seg:,.0f} ROWS/SEC")
+    return resultados
+
+
+# TIMES stats_functions.DrawdownEpisodes OVER n_symbols SERIES OF n_dias DAYS EACH
+def bench_drawdown(n_symbols=200, n_dias=5040):
+    from stats_functions import DrawdownEpisodes
+
+    df = frame_sintetico(n_symbols, n_dias)
+    grupos = [(g["Fecha"].to_numpy(), g["Close_Price"].to_numpy()) for _, g in df.groupby("Symbol")]
+
+    def episodios():
+        return sum(len(DrawdownEpisodes(f, p)) for f, p in grupos)
+
+    t, n = medir(episodios)
+    print(f"DRAWDOWN ({len(df):,} ROWS, {n_symbols} SYMBOLS): {t:.3f}s, {n:,} EPISODES, "
+          f"{len(df) / t:,.0f} ROWS/SEC")
+    return {"filas": len(df), "segundos": t, "episodios": n}
+
+
+# LOADS A SYNTHETIC stock_info INTO A TEMPORARY SQLITE FILE AND RETURNS ITS ENGINE
+def base_sintetica(n_symbols=10, n_dias=2520):
+    import tempfile
+    from sqlalchemy import create_engine
+    from bulk_loader import bulk_write
+
+    ruta = tempfile.mkstemp(suffix=".db")[1]
+    engine = create_engine(f"sqlite:///{ruta}")
+    bulk_write(frame_sintetico(n_symbols, n_dias), engine)
+    return engine
+
+
+# CLOSES THE CONNECTIONS OF A TEMPORARY SQLITE ENGINE AND DELETES ITS FILE
+def borrar_base(engine):
+    import os
+    engine.dispose()
+    if os.path.exists(engine.url.database):
+        os.remove(engine.url.database)
+
+
+# POINTS db AT A SYNTHETIC DATABASE (AND WITH cache_local THE LOCAL CACHE AT AN EMPTY DIRECTORY)
+# WHILE A BENCHMARK RUNS, THEN RESTORES BOTH AND DELETES THE TEMPORARY FILES, EVEN IF IT FAILS
+@contextlib.contextmanager
+def base_temporal(n_symbols=10, n_dias=2520, cache_local=False):
+    import shutil
+    import tempfile
+    from pathlib import Path
+    import cache
+    import db
+
+    engine = base_sintetica(n_symbols, n_dias)
+    anterior, directorio = db.set_engine(engine), cache.CACHE_DIR
+    if cache_local:
+        cache.CACHE_DIR = Path(tempfile.mkdtemp(prefix="bench_cache_"))
+    try:
+        yield engine
+    finally:
+        db.set_engine(anterior)
+        if cache_local:
+            shutil.rmtree(cache.CACHE_DIR, ignore_errors=True)
+        cache.CACHE_DIR = directorio
+        borrar_base(engine)
+
+
+# COMPARES ONE GetAdjustedReturn CALL PER SYMBOL AGAINST THE BATCHED GetVariousAdjRet
+def bench_multi_symbol(n_symbols=100, n_dias=2520):
+    import stats_functions
+
+    with base_temporal(n_symbols, n_dias, cache_local=True):
+        companies = [f"SYM{i}" for i in range(n_symbols)]
+        start, end = (2000, 1, 1), (2010, 12, 31)
+
+        def por_symbol():
+            return pd.concat([stats_functions.GetAdjustedReturn(c, start, end) for c in companies])
+
+        t_loop, _ = medir(por_symbol, repeticiones=1)
+        t_batch, df = medir(stats_functions.GetVariousAdjRet, companies, start, end, repeticiones=1)
+        print(f"MULTI-SYMBOL ({len(df):,} ROWS, {n_symbols} SYMBOLS): PER SYMBOL {t_loop:.3f}s | "
+              f"BATCHED {t_batch:.3f}s | SPEEDUP x{t_loop / t_batch:.1f}")
+        return {"por_symbol": t_loop, "batched": t_batch}
+
+
+# SWEEPS MANY SPANS WITH GetOpenCloseSpan, READING FROM THE DATABASE AND FROM THE LOCAL CACHE
+def bench_cache(n_symbols=20, n_dias=2520, n_spans=50):
+    import cache
+    import stats_functions
+
+    with base_temporal(n_symbols, n_dias, cache_local=True):
+        spans = [((2000 + i % 6, 1 + i % 12, 1), (2002 + i % 6, 1 + i % 12, 28)) for i in range(n_spans)]
+
+        def barrido():
+            for i in range(n_symbols):
+                for start, end in spans:
+                    stats_functions.GetOpenCloseSpan(f"SYM{i}", start, end)
+
+        activo = cache.ACTIVO
+        cache.ACTIVO = False
+        t_db, _ = medir(barrido, repeticiones=1)
+        cache.ACTIVO = True
+        barrido()
+        t_cache, _ = medir(barrido, repeticiones=1)
+        cache.ACTIVO = activo
+        print(f"CACHE ({n_symbols * n_spans} SPAN READS): DATABASE {t_db:.3f}s | WARM CACHE {t_cache:.3f}s | "
+              f"SPEEDUP x{t_db / t_cache:.1f}")
+        return {"database": t_db, "cache": t_cache}
+
+
+# COMPARES ONE pandas rolling().std() PER (SYMBOL, WINDOW) AGAINST stats_functions.RollingVolatility
+def bench_rolling_volatility(n_symbols=200, n_dias=5040, ventanas=(20, 40, 60, 80, 100, 252)):
+    from stats_functions import RollingVolatility
+
+    rng = np.random.default_rng(0)
+    retornos = np.round(rng.normal(0, 0.015, (n_dias, n_symbols)), 2)
+    panel = pd.DataFrame(retornos)
+
+    def por_ventana():
+        return [panel[c].rolling(w).std().to_numpy() for c in panel.columns for w in ventanas]
+
+    t_pandas, esperado = medir(por_ventana, repeticiones=1)
+    t_motor, volatilidad = medir(RollingVolatility, retornos, ventanas)
+    esperado = np.asarray(esperado).reshape(n_symbols, len(ventanas), n_dias).transpose(1, 2, 0)
+    np.testing.assert_allclose(volatilidad, esperado, rtol=1e-7, atol=1e-12, equal_nan=True)
+    print(f"ROLLING VOLATILITY ({n_dias} DAYS x {n_symbols} SYMBOLS x {len(ventanas)} WINDOWS): "
+          f"PANDAS {t_pandas:.3f}s | ENGINE {t_motor:.3f}s | SPEEDUP x{t_pandas / t_motor:.1f}")
+    return {"pandas": t_pandas, "engine": t_motor}
+
+
+# COMPARES pandas rolling().corr() AGAINST THE INCREMENTAL RollingCorrelationStream
+def bench_rolling_correlation(n_symbols=100, n_dias=1260, ventana=60):
+    from stats_functions import RollingCorrelationStream
+
+    rng = np.random.default_rng(0)
+    retornos = np.round(rng.normal(0, 0.015, (n_dias, n_symbols)), 2)
+
+    t_pandas, esperado = medir(lambda: pd.DataFrame(retornos).rolling(ventana).corr(), repeticiones=1)
+    t_motor, matrices = medir(lambda: np.stack([m for _, m in RollingCorrelationStream(retornos, ventana, dtype=np.float32)]),
+                              repeticiones=1)
+    # pandas STACKS ONE N x N BLOCK PER DAY; THE STREAM STARTS AT THE FIRST FULL WINDOW
+    esperado = esperado.to_numpy().reshape(n_dias, n_symbols, n_symbols)[ventana - 1:]
+    np.testing.assert_allclose(matrices, esperado, rtol=1e-5, atol=1e-6, equal_nan=True)
+    print(f"ROLLING CORRELATION ({n_dias} DAYS x {n_symbols} SYMBOLS, {ventana}D): "
+          f"PANDAS {t_pandas:.3f}s | ENGINE {t_motor:.3f}s | SPEEDUP x{t_pandas / t_motor:.1f}")
+    return {"pandas": t_pandas, "engine": t_motor}
+
+
+# COMPARES DailyReturnStats/GetQuantiilesCompanies PUSHED DOWN TO SQLITE AGAINST THE PANDAS PATH
+def bench_pushdown(n_symbols=100, n_dias=2520):
+    import cache
+    import memo
+    import stats_functions
+
+    with base_temporal(n_symbols, n_dias):
+        companies = [f"SYM{i}" for i in range(n_symbols)]
+        start, end = (2000, 1, 1), (2010, 12, 31)
+        activos = cache.ACTIVO, memo.ACTIVO
+        cache.ACTIVO = memo.ACTIVO = False
+
+        resultados = {}
+        for funcion in (stats_functions.DailyReturnStats, stats_functions.GetQuantiilesCompanies):
+            t_pandas, _ = medir(funcion, companies, start, end, modo="pandas", repeticiones=1)
+            t_sql, _ = medir(funcion, companies, start, end, modo="sql", repeticiones=1)
+            resultados[funcion.__name__] = {"pandas": t_pandas, "sql": t_sql}
+            print(f"PUSHDOWN {funcion.__name__} ({n_symbols} SYMBOLS x {n_dias} DAYS): "
+                  f"PANDAS {t_pandas:.3f}s | SQL {t_sql:.3f}s")
+
+    # 102 PRICES GIVE n = 101 RETURNS: q * (n - 1) IS A WHOLE RANK FOR EVERY QUANTILE HERE
+    with base_temporal(3, 102):
+        companies = [f"SYM{i}" for i in range(3)]
+        pd.testing.assert_frame_equal(
+            stats_functions.GetQuantiilesCompanies(companies, start, end, modo="sql"),
+            stats_functions.GetQuantiilesCompanies(companies, start, end, modo="pandas"))
+        cuantiles = [0.01, 0.25, 0.5, 0.75, 0.99]
+        esperado = stats_functions.GetVariousAdjRet(companies, start, end).groupby("Empresa")["Retorno diario"]
+        esperado = esperado.quantile(cuantiles).unstack(level=-1)
+        np.testing.assert_allclose(stats_functions._QuantilesSQL(companies, start, end, cuantiles).to_numpy(),
+                                   esperado.to_numpy())
+    cache.ACTIVO, memo.ACTIVO = activos
+    return resultados
+
+
+# SHOWS THE QUERY PLAN AND TIME OF EVERY Get* QUERY ON A LEGACY stock_info (CREATED BY pandas,
+# NO KEYS) AND AFTER migrations.migrar() ADDS THE (Symbol, Fecha) PRIMARY KEY.
+# THE STATEMENTS ARE CAPTURED FROM THE ENGINE SO THE PLANS MATCH WHAT EACH FUNCTION RUNS.
+def bench_explain(n_symbols=50, n_dias=2520, engine=None):
+    import tempfile
+    from sqlalchemy import create_engine, event
+    import cache
+    import memo
+    import migrations
+    import resampling
+    import db
+    import stats_functions
+
+    temporal = engine is None
+    if temporal:
+        engine = create_engine(f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("drop table if exists stock_info")
+        conn.exec_driver_sql("drop table if exists schema_version")
+        for tabla in resampling.TABLAS.values():
+            conn.exec_driver_sql(f"drop table if exists {tabla}")
+    frame_sintetico(n_symbols, n_dias).to_sql("stock_info", engine, index=False, chunksize=10_000)
+
+    anterior = db.set_engine(engine)
+    try:
+        activos = cache.ACTIVO, memo.ACTIVO
+        cache.ACTIVO = memo.ACTIVO = False
+        explain = "explain query plan " if engine.dialect.name == "sqlite" else "explain "
+        start, end = (2004, 1, 1), (2005, 12, 31)
+        llamadas = {
+            "GetHistoricalData": lambda: stats_functions.GetHistoricalData("SYM7"),
+            "GetDataPeriodically": lambda: stats_functions.GetDataPeriodically(start, end, "SYM7"),
+            "GetVariousCompanies": lambda: stats_functions.GetVariousCompanies(["SYM1", "SYM2"], start, end),
+            "GetCompaniesVolumeSpan": lambda: stats_functions.GetCompaniesVolumeSpan(["SYM1", "SYM2"], start, end),
+            "GetOpenCloseSpan": lambda: stats_functions.GetOpenCloseSpan("SYM7", start, end),
+            "GetOpenCloseSpanCompanies": lambda: stats_functions.GetOpenCloseSpanCompanies(["SYM1", "SYM2"], start, end),
+            "GetCompanyVolumeSpan": lambda: stats_functions.GetCompanyVolumeSpan("SYM7", start, end),
+        }
+
+        capturadas = []
+
+        def capturar(conn, cursor, statement, parameters, context, executemany):
+            capturadas.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", capturar)
+        resultados = {}
+        for etapa in ("before", "after"):
+            if etapa == "after":
+                migrations.migrar(engine)
+                engine.dispose()
+            for nombre, llamada in llamadas.items():
+                capturadas.clear()
+                t, _ = medir(llamada)
+                if not capturadas:
+                    continue
+                statement, parameters = capturadas[-1]
+                try:
+                    with engine.connect() as conn:
+                        plan = conn.exec_driver_sql(explain + statement, parameters).fetchall()
+                    plan = [" | ".join(str(c) for c in fila) for fila in plan]
+                except Exception as e:
+                    plan = [f"EXPLAIN FAILED: {e}".splitlines()[0]]
+                resultados[(nombre, etapa)] = {"segundos": t, "plan": plan}
+                print(f"{nombre} [{etapa.upper()}] {t * 1000:.1f} ms")
+                for fila in plan:
+                    print(f"    {fila}")
+        event.remove(engine, "before_cursor_execute", capturar)
+        cache.ACTIVO, memo.ACTIVO = activos
+        return resultados
+    finally:
+        db.set_engine(anterior)
+        if temporal:
+            borrar_base(engine)
+
+
+# PEAK MEMORY AND TIME OF A WHOLE-TABLE SUMMARY: FULL pd.read_sql + pandas VS THE STREAMING
+# PIPELINE (StockInfoStream -> LogReturnsStream -> DrawdownStream -> RunningStatsStream)
+def bench_streaming(n_symbols=100, n_dias=2520, chunksize=10_000):
+    import tracemalloc
+    import stats_functions
+
+    with base_temporal(n_symbols, n_dias) as engine:
+
+        def completo():
+            df = pd.read_sql("select * from stock_info order by Symbol, Fecha", engine)
+            precios = df.groupby("Symbol")["Close_Price"]
+            retornos = np.log(df["Close_Price"] / precios.shift())
+            drawdown = df["Close_Price"] / precios.cummax() - 1
+            return retornos.groupby(df["Symbol"]).std(), drawdown.groupby(df["Symbol"]).min()
+
+        resultados = {}
+        for nombre, funcion in (("full", completo),
+                                ("streaming", lambda: stats_functions.GetHistorySummary(chunksize=chunksize))):
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            funcion()
+            segundos = time.perf_counter() - inicio
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            resultados[nombre] = {"segundos": segundos, "pico_mb": pico / 1e6}
+        print(f"STREAMING ({n_symbols * n_dias:,} ROWS, CHUNKS OF {chunksize:,}): "
+              f"FULL {resultados['full']['segundos']:.3f}s / {resultados['full']['pico_mb']:.1f} MB | "
+              f"STREAMING {resultados['streaming']['segundos']:.3f}s / {resultados['streaming']['pico_mb']:.1f} MB")
+        return resultados
+
+
+# COMPARES THE MEMORY OF THE LONG-FORMAT stock_info FRAME AGAINST THE COMPACT PANEL (float64 AND
+# float32) AND THE pivot_table CORRELATION AGAINST THE ONE READ STRAIGHT FROM THE PANEL
+def bench_panel(n_symbols=200, n_dias=2520):
+    import stats_functions
+
+    with base_temporal(n_symbols, n_dias, cache_local=True):
+        companies = [f"SYM{i}" for i in range(n_symbols)]
+        start, end = (2000, 1, 1), (2010, 12, 31)
+
+        largo = stats_functions.GetVariousCompanies(companies, start, end)
+        bytes_largo = int(largo.memory_usage(index=True, deep=True).sum())
+        bytes_64 = stats_functions.GetPanel(companies, start, end, np.float64).nbytes
+        bytes_32 = stats_functions.GetPanel(companies, start, end, np.float32).nbytes
+
+        def pivotado():
+            df = stats_functions.GetOpenCloseSpanCompanies(companies, start, end)
+            df['Retorno diario'] = round(np.log(df['Cierre'] / df.groupby('Empresa', sort=False)['Cierre'].shift(1)), 2)
+            return df.pivot_table(values='Retorno diario', index='Fecha', columns='Empresa').corr()
+
+        t_pivot, _ = medir(pivotado, repeticiones=1)
+        t_panel, _ = medir(lambda: stats_functions.PanelRetornos(companies, start, end).corr(), repeticiones=1)
+        print(f"PANEL ({len(largo):,} ROWS, {n_symbols} SYMBOLS): LONG FRAME {bytes_largo / 1e6:.1f} MB | "
+              f"PANEL f8 {bytes_64 / 1e6:.1f} MB (x{bytes_largo / bytes_64:.1f}) | "
+              f"PANEL f4 {bytes_32 / 1e6:.1f} MB (x{bytes_largo / bytes_32:.1f}) | "
+              f"CORRELATION PIVOT {t_pivot:.3f}s vs PANEL {t_panel:.3f}s")
+        return {"largo_mb": bytes_largo / 1e6, "panel_f8_mb": bytes_64 / 1e6, "panel_f4_mb": bytes_32 / 1e6,
+                "pivot": t_pivot, "panel": t_panel}
+
+
+# COMPARES ONE PORTFOLIO AT A TIME (DAILY PORTFOLIO RETURNS WITH pandas) AGAINST THE BATCHED ENGINE
+# AND TIMES A CHUNKED MONTE CARLO FRONTIER
+def bench_portfolio(n_symbols=20, n_dias=2520, n_portafolios=20_000, n_frontera=500_000):
+    import portfolio
+
+    rng = np.random.default_rng(0)
+    retornos = rng.normal(0.0003, 0.015, (n_dias, n_symbols))
+    pesos = rng.dirichlet(np.ones(n_symbols), n_portafolios)
+    muestra = pesos[:500]
+
+    def uno_a_uno():
+        filas = []
+        for w in muestra:
+            diario = pd.Series(np.expm1(retornos) @ w)
+            log = pd.Series(retornos @ w)
+            riqueza = pd.concat([pd.Series([1.0]), (1 + diario).cumprod()])   # THE INITIAL CAPITAL IS THE FIRST PEAK
+            filas.append((log.mean() * 252, log.std() * np.sqrt(252), (riqueza / riqueza.cummax() - 1).min()))
+        return filas
+
+    t_loop, filas = medir(uno_a_uno, repeticiones=1)
+    t_batch, _ = medir(portfolio.AnalizarPortafolios, pesos, retornos, repeticiones=1)
+    lote = portfolio.AnalizarPortafolios(muestra, retornos)
+    esperado = np.array(filas) * [1, 1, 100]
+    np.testing.assert_allclose(lote[["Retorno anual", "Volatilidad anualizada", "MDD %"]].to_numpy(), esperado,
+                               rtol=1e-9, atol=1e-12)
+    media, covarianza = portfolio.momentos(retornos)
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    t_frontera, _ = medir(portfolio.FronteraEficiente, media, covarianza, symbols, n_frontera, repeticiones=1)
+    por_portafolio = t_loop / len(muestra)
+    print(f"PORTFOLIOS ({n_portafolios:,} x {n_symbols} SYMBOLS, {n_dias} DAYS): ONE BY ONE "
+          f"~{por_portafolio * n_portafolios:.1f}s (EXTRAPOLATED) | BATCHED {t_batch:.3f}s | "
+          f"SPEEDUP x{por_portafolio * n_portafolios / t_batch:.0f} | FRONTIER OF {n_frontera:,} DRAWS {t_frontera:.3f}s")
+    return {"uno_a_uno": por_portafolio * n_portafolios, "batched": t_batch, "frontera": t_frontera}
+
+
+# COMPARES RECOMPUTING THE RISK METRICS FROM THE WHOLE HISTORY ON EVERY NEW BAR AGAINST THE
+# O(1) ONLINE ESTIMATORS, FOR A SYMBOL THAT RECEIVES n_barras BARS ON TOP OF n_dias OF HISTORY
+def bench_online(n_dias=2520, n_barras=250, ventanas=(20, 40, 60, 80, 100)):
+    import online
+    from stats_functions import RollingVolatility
+
+    rng = np.random.default_rng(0)
+    precios = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, n_dias + n_barras)))
+    fechas = pd.bdate_range("2000-01-03", periods=len(precios)).strftime("%Y-%m-%d")
+
+    def desde_cero():
+        for fin in range(n_dias, n_dias + n_barras):
+            p = precios[:fin + 1]
+            r = np.round(np.log(p[1:] / p[:-1]), 2)
+            r.mean(), r.std(ddof=1), (p / np.maximum.accumulate(p) - 1).min()
+            RollingVolatility(r[-max(ventanas):], ventanas)
+
+    estimador = online.EstimadorSymbol("SYM", ventanas)
+    for fecha, precio in zip(fechas[:n_dias], precios[:n_dias]):
+        estimador.actualizar(fecha, precio)
+
+    def incremental():
+        for fecha, precio in zip(fechas[n_dias:], precios[n_dias:]):
+            estimador.actualizar(fecha, precio)
+            estimador.metricas()
+
+    t_cero, _ = medir(desde_cero, repeticiones=1)
+    t_online, _ = medir(incremental, repeticiones=1)
+
+    # AFTER THE LAST BAR THE ONLINE STATE MUST MATCH THE METRICS OF THE WHOLE HISTORY
+    r = np.round(np.log(precios[1:] / precios[:-1]), 2)
+    metricas = estimador.metricas()
+    esperado = {
+        "Retorno anual": r.mean() * online.DIAS,
+        "Volatilidad anualizada": r.std(ddof=1) * np.sqrt(online.DIAS),
+        "MDD %": (precios / np.maximum.accumulate(precios) - 1).min() * 100,
+    }
+    for ventana, volatilidad in zip(ventanas, RollingVolatility(r, ventanas)[:, -1, 0]):
+        esperado[f"Volatilidad diaria ({ventana}D)"] = volatilidad
+    np.testing.assert_allclose([metricas[c] for c in esperado], list(esperado.values()), rtol=1e-9, atol=1e-12)
+    print(f"ONLINE ({n_barras} NEW BARS ON {n_dias} DAYS): RECOMPUTE {t_cero / n_barras * 1e6:.0f} us/BAR | "
+          f"ONLINE {t_online / n_barras * 1e6:.0f} us/BAR | SPEEDUP x{t_cero / t_online:.1f}")
+    return {"recalculo": t_cero, "online": t_online}
+
+
+# COMPARES THE PANDAS ROLLING VaR/ES (rolling().quantile PLUS A rolling().apply FOR THE TAIL MEAN)
+# AGAINST THE ORDER-STATISTIC WINDOWS AND THE P-SQUARE APPROXIMATION, FOR ONE 1% AND 5% LEVEL
+def bench_var(n_symbols=50, n_dias=2520, ventana=250, niveles=(0.01, 0.05)):
+    import quantiles
+
+    rng = np.random.default_rng(0)
+    retornos = np.round(rng.standard_t(4, (n_dias, n_symbols)) * 0.01, 4)
+    df = pd.DataFrame(retornos)
+
+    def con_pandas():
+        salida = {}
+        for q in niveles:
+            k = int(np.ceil(q * ventana))
+            salida[q] = (-df.rolling(ventana).quantile(q, interpolation="linear").to_numpy(),
+                         -df.rolling(ventana).apply(lambda x: np.sort(x)[:k].mean(), raw=True).to_numpy())
+        return salida
+
+    t_pandas, esperado = medir(con_pandas, repeticiones=1)
+    t_exacto, exacto = medir(lambda: quantiles.VaRVentana(retornos, ventana, niveles), repeticiones=1)
+    t_p2, aproximado = medir(lambda: quantiles.VaRAproximado(retornos, niveles), repeticiones=1)
+
+    # THE ORDER STATISTICS ARE THE SAME NUMBERS; THE TAIL MEAN ONLY DIFFERS IN THE ORDER OF ITS SUM
+    ordenados = np.sort(retornos, axis=0)
+    for q in niveles:
+        np.testing.assert_array_equal(exacto[q][0], esperado[q][0])
+        np.testing.assert_allclose(exacto[q][1], esperado[q][1], rtol=1e-12, atol=0, equal_nan=True)
+
+        # P-SQUARE ESTIMATES THE QUANTILES OF ALL THE DAYS SEEN: A FEW PERCENT OFF ON A TYPICAL
+        # SYMBOL, UP TO ~40% ON THE WORST ONES WITH ONLY q * n_dias RETURNS IN THE TAIL
+        var = -np.quantile(retornos, q, axis=0)
+        es = -ordenados[:int(np.ceil(q * n_dias))].mean(axis=0)
+        for estimado, real in zip(aproximado[q], (var, es)):
+            error = np.abs(estimado[-1] / real - 1)
+            assert np.median(error) < 0.05 and error.max() < 0.5, (q, np.median(error), error.max())
+    print(f"ROLLING VaR/ES ({n_symbols} SYMBOLS x {n_dias} DAYS, WINDOW {ventana}): PANDAS {t_pandas:.3f}s | "
+          f"ORDER STATISTICS {t_exacto:.3f}s (x{t_pandas / t_exacto:.1f}) | P-SQUARE {t_p2:.3f}s (x{t_pandas / t_p2:.1f})")
+    return {"pandas": t_pandas, "exacto": t_exacto, "p2": t_p2}
+
+
+# STORES n_symbols RAW RESPONSES IN THE CONTENT-ADDRESSED CACHE (COMPRESSION RATIO AND WRITE TIME)
+# AND REPLAYS THEM INTO ONE FRAME IN THIS PROCESS AND IN A POOL OF workers PROCESSES
+def bench_raw_cache(n_symbols=200, n_dias=2520, workers=None):
+    import os
+    import json
+    import shutil
+    import tempfile
+    from pathlib import Path
+    import raw_cache
+
+    workers = workers or os.cpu_count() or 1
+    crudos = {f"SYM{i:04d}": json.dumps({"Time Series (Daily)": payload_sintetico(n_dias, seed=i)}).encode("utf-8")
+              for i in range(n_symbols)}
+    directorio = tempfile.mkdtemp(prefix="bench_raw_")
+    anterior = raw_cache.RAW_DIR
+    try:
+        raw_cache.RAW_DIR = Path(directorio)
+        tienda = raw_cache.almacen()
+        fecha = raw_cache.fecha_operacion()
+
+        def guardar():
+            for symbol, contenido in crudos.items():
+                tienda.guardar("TIME_SERIES_DAILY", symbol, "full", fecha, contenido)
+            tienda.escribir_indice()
+
+        t_guardar, _ = medir(guardar, repeticiones=1)
+        comprimido = tienda.resumen()["bytes"]
+        t_serie, df = medir(lambda: raw_cache.reproducir(workers=1), repeticiones=1)
+        t_pool, _ = medir(lambda: raw_cache.reproducir(workers=workers), repeticiones=1)
+    finally:
+        raw_cache.RAW_DIR = anterior
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    crudo = sum(len(c) for c in crudos.values())
+    print(f"RAW CACHE ({n_symbols} PAYLOADS, {crudo / 1e6:.1f} MB): COMPRESSED x{crudo / comprimido:.1f} IN {t_guardar:.3f}s | "
+          f"REPLAY {len(df):,} ROWS 1 PROCESS {t_serie:.3f}s | {workers} PROCESSES {t_pool:.3f}s (x{t_serie / t_pool:.1f})")
+    return {"guardar": t_guardar, "ratio": crudo / comprimido, "reproducir": t_serie, "reproducir_pool": t_pool}
+
+
+# SCALING OF THE SHARDED ANALYTICS FROM 1 TO max_workers PROCESSES (DEFAULT ONE PER CPU) ON A
+# PANEL OF n_symbols, FOR EVERY SHARD KERNEL. ALSO REPORTS THE SHARED BLOCK AGAINST THE BYTES
+# THE LONG FRAME WOULD COST TO PICKLE TO THE WORKERS
+def bench_sharding(n_symbols=1000, n_dias=2520, max_workers=None):
+    import os
+    import pickle
+    import sharding
+    import stats_functions
+    from panel import Panel
+
+    max_workers = max_workers or os.cpu_count() or 1
+    panel = Panel.desde_frame(frame_sintetico(n_symbols, n_dias))
+    with sharding.PanelCompartido(panel) as compartido:
+        compartido_mb = compartido.nbytes / 1e6
+    pickle_mb = len(pickle.dumps(panel.largo(), protocol=pickle.HIGHEST_PROTOCOL)) / 1e6
+    print(f"SHARDING ({n_symbols} SYMBOLS x {n_dias} DAYS): SHARED PANEL {compartido_mb:.1f} MB "
+          f"(THE PICKLED LONG FRAME WOULD BE {pickle_mb:.1f} MB)")
+
+    kernels = {
+        "adjusted_return": (stats_functions._ShardAdjustedReturn, {}),
+        "volatility": (stats_functions._ShardVolatility, {"ventanas": (20, 40, 60, 80, 100), "dias": 3650}),
+        "mdd": (stats_functions._ShardMDD, {}),
+    }
+    resultados = {}
+    for nombre, (kernel, kwargs) in kernels.items():
+        tiempos, salidas = {}, {}
+        for workers in range(1, max_workers + 1):
+            tiempos[workers], salidas[workers] = medir(sharding.ejecutar, panel, kernel, workers, repeticiones=1, **kwargs)
+        # THE SHARED-MEMORY WORKERS MUST RETURN THE FRAME OF THE IN-PROCESS RUN (CHECKED WITH 2 ON ONE CPU TOO)
+        if max_workers == 1:
+            salidas[2] = sharding.ejecutar(panel, kernel, 2, **kwargs)
+        for salida in salidas.values():
+            pd.testing.assert_frame_equal(salida, salidas[1])
+        escala = " | ".join(f"{w}P {t:.3f}s (x{tiempos[1] / t:.1f})" for w, t in tiempos.items())
+        print(f"  {nombre:<16} {escala}")
+        resultados[nombre] = tiempos
+    return resultados
+
+
+# RESAMPLING AND ROLLUP TABLES: resamplear (reduceat) VS pandas groupby + resample, FULL REBUILD,
+# INCREMENTAL UPDATE AFTER ONE NEW DAY (AND ITS MATCH WITH A REBUILD ACROSS A YEAR BOUNDARY), AND A MULTI-YEAR MONTHLY READ FROM THE ROLLUP VS THE DAILY ROWS
+def bench_rollups(n_symbols=100, n_dias=2520):
+    import tempfile
+    from sqlalchemy import create_engine
+    import cache
+    import memo
+    import resampling
+    import stats_functions
+    from bulk_loader import bulk_write
+
+    df = frame_sintetico(n_symbols, n_dias)
+    t_reduceat, _ = medir(resampling.resamplear, df, "M")
+    agregados = {"Open": "first", "High": "max", "Low": "min", "Close_Price": "last", "Volume": "sum"}
+    t_pandas, _ = medir(lambda: df.set_index("Fecha").groupby("Symbol").resample("MS").agg(agregados))
+    print(f"RESAMPLE MONTHLY ({n_symbols} SYMBOLS x {n_dias} DAYS): pandas {t_pandas:.3f}s | "
+          f"reduceat {t_reduceat:.3f}s (x{t_pandas / t_reduceat:.1f})")
+
+    with base_temporal(n_symbols, n_dias) as engine:
+        with engine.begin() as conn:
+            t_rebuild, barras = medir(resampling.reconstruir, conn, repeticiones=1)
+        print(f"  FULL REBUILD: {t_rebuild:.3f}s ({barras} BARS)")
+
+        ultimo = df.loc[df.groupby("Symbol")["Fecha"].idxmax()]
+        nuevo = ultimo.assign(Fecha=ultimo["Fecha"] + pd.Timedelta(days=1))
+        bulk_write(nuevo, engine)
+        t_incremental, _ = medir(resampling.actualizar, engine, nuevo, repeticiones=1)
+        print(f"  INCREMENTAL UPDATE ({len(nuevo)} NEW ROWS): {t_incremental:.3f}s")
+
+        # AN INGESTION STARTING ON 2002-01-02 REBUILDS THE WEEK OF 2001-12-31: THE INCREMENTAL
+        # BARS MUST MATCH A FULL REBUILD ACROSS THE YEAR BOUNDARY
+        frontera = pd.Timestamp("2002-01-02")
+        parcial = create_engine(f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}")
+        try:
+            bulk_write(df[df["Fecha"] < frontera], parcial)
+            with parcial.begin() as conn:
+                resampling.reconstruir(conn)
+            bulk_write(df[df["Fecha"] >= frontera], parcial)
+            resampling.actualizar(parcial, df[df["Fecha"] >= frontera])
+            with parcial.begin() as conn:
+                leer = lambda tabla: pd.read_sql(f"select * from {tabla} order by Symbol, Periodo", conn)
+                incrementales = {tabla: leer(tabla) for tabla in resampling.TABLAS.values()}
+                resampling.reconstruir(conn)
+                for tabla, barras in incrementales.items():
+                    pd.testing.assert_frame_equal(barras, leer(tabla))
+        finally:
+            borrar_base(parcial)
+
+        # ROWS WRITTEN WITHOUT to_sql LEAVE THE ROLLUP BEHIND: THE BARS MUST COME FROM THE DAILY ROWS
+        siguiente = nuevo.assign(Fecha=nuevo["Fecha"] + pd.Timedelta(days=1))
+        bulk_write(siguiente, engine)
+        activos = cache.ACTIVO, memo.ACTIVO
+        cache.ACTIVO = memo.ACTIVO = False
+        todos = sorted(df["Symbol"].unique())
+        esperado = resampling.resamplear(pd.concat([df, nuevo, siguiente]), "M")
+        pd.testing.assert_frame_equal(stats_functions.GetOHLCVBars(todos, (2000, 1, 1), (2030, 1, 1), "M"), esperado,
+                                      check_dtype=False)
+        with engine.begin() as conn:
+            resampling.reconstruir(conn)
+
+        companies = [f"SYM{i}" for i in range(10)]
+        start, end = (2000, 1, 1), (2030, 1, 1)
+        t_rollup, _ = medir(stats_functions.GetCompaniesVolumeSpan, companies, start, end)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"alter table {resampling.TABLAS['M']} rename to rollup_aparte")
+        t_diario, _ = medir(stats_functions.GetCompaniesVolumeSpan, companies, start, end)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"alter table rollup_aparte rename to {resampling.TABLAS['M']}")
+        cache.ACTIVO, memo.ACTIVO = activos
+    print(f"  MONTHLY VOLUME OF {len(companies)} SYMBOLS: DAILY ROWS {t_diario * 1000:.1f} ms | "
+          f"ROLLUP {t_rollup * 1000:.1f} ms (x{t_diario / t_rollup:.1f})")
+    return {"pandas": t_pandas, "reduceat": t_reduceat, "rebuild": t_rebuild, "incremental": t_incremental,
+            "diario": t_diario, "rollup": t_rollup}
+
+
+# HEAVY PACKAGES EACH MODULE MUST NOT LOAD AT IMPORT TIME (FETCH-ONLY JOBS DON'T NEED SQL OR
+# PLOTS, STATS-ONLY JOBS DON'T NEED PLOTS, NOTHING NEEDS DATABASE_FINANCE UNTIL IT QUERIES)
+IMPORTACION_PROHIBIDA = {
+    "fetcher": ("pandas", "sqlalchemy", "matplotlib", "seaborn"),
+    "raw_cache": ("pandas", "sqlalchemy", "matplotlib", "seaborn"),
+    "main": ("sqlalchemy", "matplotlib", "seaborn"),
+    "stats_functions": ("sqlalchemy", "matplotlib", "seaborn"),
+    "plot_functions": ("sqlalchemy", "seaborn", "matplotlib.pyplot"),
+    "to_sql": ("matplotlib", "seaborn"),
+    "reports": ("pandas", "sqlalchemy", "matplotlib", "seaborn"),
+    "service": ("sqlalchemy", "matplotlib", "seaborn"),
+    "resampling": ("sqlalchemy", "matplotlib", "seaborn"),
+}
+
+_SONDA_IMPORTACION = """
+import sys, time, json, importlib.util
+inicio = time.perf_counter()
+import {modulo}
+segundos = time.perf_counter() - inicio
+perezoso = importlib.util._LazyModule
+cargados = [m for m, mod in list(sys.modules.items()) if type(mod) is not perezoso]
+print(json.dumps({{"segundos": segundos, "cargados": cargados}}))
+"""
+
+
+# IMPORTS EVERY MODULE IN A FRESH INTERPRETER (WITHOUT DATABASE_FINANCE) AND REPORTS ITS
+# IMPORT TIME AND ANY HEAVY PACKAGE IT LOADED THAT IT SHOULDN'T (A STARTUP REGRESSION)
+def bench_import_time(repeticiones=3):
+    import os
+    import sys
+    import json
+    import subprocess
+    from pathlib import Path
+
+    entorno = {k: v for k, v in os.environ.items() if k != "DATABASE_FINANCE"}
+    directorio = Path(__file__).resolve().parent
+    resultados = {}
+    for modulo, prohibidos in IMPORTACION_PROHIBIDA.items():
+        mejor, cargados, error = float("inf"), [], None
+        for _ in range(repeticiones):
+            proceso = subprocess.run([sys.executable, "-c", _SONDA_IMPORTACION.format(modulo=modulo)],
+                                     cwd=directorio, env=entorno, capture_output=True, text=True)
+            if proceso.returncode != 0:
+                error = proceso.stderr.strip().splitlines()[-1]
+                break
+            salida = json.loads(proceso.stdout.strip().splitlines()[-1])
+            mejor, cargados = min(mejor, salida["segundos"]), salida["cargados"]
+        regresiones = [p for p in prohibidos if p in cargados]
+        resultados[modulo] = {"segundos": mejor, "regresiones": regresiones, "error": error}
+        if error:
+            print(f"IMPORT {modulo}: FAILED ({error})")
+        else:
+            estado = f"REGRESSION: LOADS {', '.join(regresiones)}" if regresiones else "OK"
+            print(f"IMPORT {modulo}: {mejor * 1000:.0f} ms | {estado}")
+    return resultados
+
+
+if __name__ == "__main__":
+    bench_parser()
+    bench_bulk_loader()
+    bench_drawdown()
+    bench_multi_symbol()
+    bench_cache()
+    bench_rolling_volatility()
+    bench_rolling_correlation()
+    bench_pushdown()
+    bench_explain()
+    bench_streaming()
+    bench_panel()
+    bench_portfolio()
+    bench_online()
+    bench_var()
+    bench_raw_cache()
+    bench_sharding()
+    bench_rollups()
+    bench_import_time()
@@ -0,0 +1,163 @@
+# THIS MODULE WRITES LARGE DATAFRAMES INTO "stock_info" WITH FEW ROUND TRIPS
+# ROWS ARE SPLIT INTO BATCHES SIZED BY BYTES AND EACH BATCH IS WRITTEN IN ITS OWN TRANSACTION
+# STRATEGIES: 'executemany' (MULTI-ROW UPSERT, ANY BACKEND INCLUDING SQLITE)
+#             'load_data'   (LOAD DATA LOCAL INFILE FROM A TEMPORARY CSV, MYSQL/MARIADB ONLY)
+import os
+import tempfile
+from sqlalchemy import text, inspect, MetaData, Table
+from instrumentation import etapa
+
+TABLA = "stock_info"
+INDICE_UNICO = "ux_stock_info_symbol_fecha"
+
+
+# MAKES SURE (Symbol, Fecha) IS UNIQUE SO THE UPSERT HAS A CONFLICT TARGET
+def asegurar_clave_unica(conn, tabla=TABLA):
+    inspector = inspect(conn)
+    if not inspector.has_table(tabla):
+        return
+    for indice in inspector.get_unique_constraints(tabla) + inspector.get_indexes(tabla):
+        if set(indice["column_names"]) == {"Symbol", "Fecha"} and indice.get("unique", True):
+            return
+    if set(inspector.get_pk_constraint(tabla).get("constrained_columns") or []) == {"Symbol", "Fecha"}:
+        return
+
+    # MYSQL CAN'T INDEX A TEXT COLUMN WITHOUT A PREFIX LENGTH
+    if conn.dialect.name in ("mysql", "mariadb"):
+        columnas = "`Symbol`(16), `Fecha`"
+    else:
+        columnas = "Symbol, Fecha"
+    conn.execute(text(f"create unique index {INDICE_UNICO} on {tabla} ({columnas})"))
+
+
+# BUILDS AN INSERT STATEMENT THAT UPDATES ROWS WHOSE (Symbol, Fecha) ALREADY EXISTS
+# RETURNS NONE WHEN THE DIALECT HAS NO NATIVE UPSERT
+def construir_upsert(tabla, keys, dialecto):
+    actualizar = [k for k in keys if k not in ("Symbol", "Fecha")]
+
+    if dialecto in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(tabla)
+        return stmt.on_duplicate_key_update({k: stmt.inserted[k] for k in actualizar})
+
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(tabla)
+        return stmt.on_conflict_do_update(
+            index_elements=["Symbol", "Fecha"],
+            set_={k: stmt.excluded[k] for k in actualizar},
+        )
+
+    return None
+
+
+# WRITES A LIST OF ROW DICTIONARIES WITH AN UPSERT (OR DELETE + INSERT AS A GENERIC FALLBACK)
+def upsert_filas(conn, tabla, keys, filas):
+    if not filas:
+        return 0
+    stmt = construir_upsert(tabla, keys, conn.dialect.name)
+    if stmt is None:
+        for fila in filas:
+            conn.execute(
+                tabla.delete().where(tabla.c.Symbol == fila["Symbol"]).where(tabla.c.Fecha == fila["Fecha"])
+            )
+        stmt = tabla.insert()
+    result = conn.execute(stmt, filas)
+    return result.rowcount
+
+
+# ESTIMATES HOW MANY BYTES A ROW TAKES ON THE WIRE USING ITS CSV REPRESENTATION
+def estimar_bytes_fila(df, muestra=1000):
+    if df.empty:
+        return 1
+    csv = df.head(muestra).to_csv(index=False, header=False)
+    return max(1, len(csv.encode("utf-8")) // min(len(df), muestra))
+
+
+# SPLITS A DATAFRAME INTO CONSECUTIVE SLICES OF ROUGHLY max_bytes EACH
+def lotes_por_bytes(df, max_bytes=1_000_000):
+    filas_por_lote = max(1, max_bytes // estimar_bytes_fila(df))
+    for i in range(0, len(df), filas_por_lote):
+        yield df.iloc[i:i + filas_por_lote]
+
+
+# CONVERTS A BATCH INTO ROW DICTIONARIES WITH PLAIN PYTHON VALUES FOR THE DB DRIVER
+def _filas(lote):
+    columnas = {}
+    for c in lote.columns:
+        serie = lote[c]
+        if serie.hasnans:
+            serie = serie.astype(object).where(serie.notna(), None)
+        columnas[c] = serie.tolist()
+    keys = list(columnas)
+    return [dict(zip(keys, fila)) for fila in zip(*columnas.values())]
+
+
+# STRATEGY 'executemany': ONE MULTI-ROW UPSERT PER BATCH, ONE TRANSACTION PER BATCH
+def escribir_executemany(df, engine, tabla=TABLA, max_bytes=1_000_000):
+    total = 0
+    tabla_sql = Table(tabla, MetaData(), autoload_with=engine)
+    keys = list(df.columns)
+    for lote in lotes_por_bytes(df, max_bytes):
+        with engine.begin() as conn:
+            upsert_filas(conn, tabla_sql, keys, _filas(lote))
+        total += len(lote)
+    return total
+
+
+# STRATEGY 'load_data': EACH BATCH IS DUMPED TO A TEMPORARY CSV AND LOADED WITH
+# LOAD DATA LOCAL INFILE ... REPLACE (REQUIRES local_infile ON SERVER AND CLIENT)
+def escribir_load_data(df, engine, tabla=TABLA, max_bytes=50_000_000):
+    total = 0
+    columnas = ", ".join(f"`{c}`" for c in df.columns)
+    for lote in lotes_por_bytes(df, max_bytes):
+        fd, ruta = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                lote.to_csv(f, index=False, header=False, na_rep="\\N",
+                            date_format="%Y-%m-%d")
+            query = text(f"""load data local infile :ruta replace into table `{tabla}`
+                        fields terminated by ',' optionally enclosed by '"'
+                        lines terminated by '\\n' ({columnas});""")
+            with engine.begin() as conn:
+                conn.execute(query, {"ruta": ruta.replace("\\", "/")})
+        finally:
+            os.remove(ruta)
+        total += len(lote)
+    return total
+
+
+ESTRATEGIAS = {
+    "executemany": escribir_executemany,
+    "load_data": escribir_load_data,
+}
+
+
+# WRITES df INTO tabla WITH THE REQUESTED STRATEGY AND RETURNS THE NUMBER OF ROWS WRITTEN
+# 'auto' USES executemany; 'load_data' FALLS BACK TO executemany OUTSIDE MYSQL/MARIADB
+def bulk_write(df, engine, tabla=TABLA, estrategia="auto", max_bytes=None):
+    if df.empty:
+        return 0
+
+    # CREATE THE TABLE ON FIRST RUN AND MAKE SURE THE UPSERT KEY EXISTS
+    with engine.begin() as conn:
+        df.head(0).to_sql(tabla, conn, if_exists="append", index=False)
+        asegurar_clave_unica(conn, tabla)
+
+    if estrategia == "auto" or (estrategia == "load_data" and engine.dialect.name not in ("mysql", "mariadb")):
+        estrategia = "executemany"
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"UNKNOWN BULK STRATEGY '{estrategia}'. USE ONE OF {list(ESTRATEGIAS)} OR 'auto'.")
+
+    escribir = ESTRATEGIAS[estrategia]
+    with etapa("bulk_write", "bulk_loader.bulk_write", estrategia=estrategia, tabla=tabla) as medicion:
+        if max_bytes is None:
+            filas = escribir(df, engine, tabla)
+        else:
+            filas = escribir(df, engine, tabla, max_bytes=max_bytes)
+        medicion.filas = filas
+        medicion.bytes = estimar_bytes_fila(df) * filas
+    return filas
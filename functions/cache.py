@@ -0,0 +1,158 @@
+# THIS MODULE KEEPS A LOCAL, COLUMNAR READ-THROUGH CACHE OF "stock_info"
+# EACH SYMBOL IS STORED AS A MEMORY-MAPPED NUMPY STRUCTURED ARRAY SORTED BY DATE,
+# SO READING A SPAN IS A BINARY SEARCH + SLICE INSTEAD OF A SQL QUERY.
+# ON A MISS THE FULL HISTORY OF THE SYMBOL IS READ FROM THE DATABASE AND STORED.
+# to_sql INVALIDATES THE SYMBOLS IT WRITES. SET FINANCE_CACHE=0 TO DISABLE IT.
+# EVERY DATABASE HAS ITS OWN SUBDIRECTORY OF CACHE_DIR (A HASH OF ITS URL), SO SWAPPING THE ENGINE
+# (db.set_engine, service.py --sqlite) NEVER SERVES OR OVERWRITES THE ARRAYS OF ANOTHER DATABASE.
+import os
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import db
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = Path(os.getenv("FINANCE_CACHE_DIR", BASE_DIR / "cache" / "stock_info"))
+ACTIVO = os.getenv("FINANCE_CACHE", "1") != "0"
+
+DTYPE = np.dtype([
+    ("Fecha", "datetime64[us]"),
+    ("Open", "f8"),
+    ("High", "f8"),
+    ("Low", "f8"),
+    ("Close_Price", "f8"),
+    ("Volume", "i8"),
+])
+
+
+# CACHE DIRECTORY OF THE DATABASE THE SHARED ENGINE CURRENTLY POINTS TO
+def directorio():
+    return CACHE_DIR / hashlib.sha256(db.url_actual().encode("utf-8")).hexdigest()[:16]
+
+
+def _ruta(symbol):
+    return directorio() / f"{symbol.upper()}.npy"
+
+
+# CONVERTS A stock_info FRAME OF ONE SYMBOL INTO A SORTED, DE-DUPLICATED STRUCTURED ARRAY
+def _a_array(df):
+    df = df.assign(Fecha=pd.to_datetime(df["Fecha"]))
+    df = df.sort_values("Fecha").drop_duplicates(subset=["Fecha"], keep="last")
+    arr = np.empty(len(df), dtype=DTYPE)
+    arr["Fecha"] = df["Fecha"].to_numpy(dtype="datetime64[us]")
+    for columna in ("Open", "High", "Low", "Close_Price"):
+        arr[columna] = df[columna].to_numpy(dtype=np.float64, na_value=np.nan)
+    arr["Volume"] = df["Volume"].fillna(0).to_numpy(dtype=np.int64)
+    return arr
+
+
+# GENERATION STAMP OF THE CURRENT DATABASE'S DIRECTORY. invalidar CHANGES IT BEFORE DELETING FILES,
+# SO A MISS THAT READ THE DATABASE BEFORE AN INGESTION COMMITTED (POSSIBLY IN ANOTHER PROCESS)
+# CAN TELL THAT ITS ARRAY IS STALE AND DROP IT INSTEAD OF SERVING IT FOREVER
+def _ruta_generacion():
+    return directorio() / "generacion"
+
+
+def generacion():
+    try:
+        return _ruta_generacion().read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return ""
+
+
+def _nueva_generacion():
+    carpeta = directorio()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(f"{time.time_ns()}-{os.getpid()}")
+    os.replace(tmp, _ruta_generacion())
+
+
+# WRITES THE ARRAY ATOMICALLY SO CONCURRENT READERS NEVER SEE A HALF-WRITTEN FILE
+# WITH generacion (READ BEFORE QUERYING THE DATABASE) THE FILE IS REMOVED AGAIN IF AN INVALIDATION
+# HAPPENED IN BETWEEN. RETURNS FALSE WHEN THE ARRAY WAS DROPPED
+def guardar_symbol(symbol, arr, generacion_leida=None):
+    carpeta = directorio()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{symbol.upper()}.npy"
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, ruta)
+    if generacion_leida is not None and generacion() != generacion_leida:
+        ruta.unlink(missing_ok=True)
+        return False
+    return True
+
+
+# RETURNS THE MEMORY-MAPPED HISTORY OF A SYMBOL, READING THROUGH TO THE DATABASE ON A MISS
+# engine MAY BE A FUNCTION RETURNING THE ENGINE: IT IS ONLY CALLED ON A MISS, SO HITS NEVER
+# BUILD AN ENGINE OR IMPORT SQLALCHEMY. A FILE DELETED BY A CONCURRENT invalidar COUNTS AS A MISS
+def leer_symbol(symbol, engine):
+    ruta = _ruta(symbol)
+    try:
+        return np.load(ruta, mmap_mode="r")
+    except FileNotFoundError:
+        pass
+
+    from sqlalchemy import text
+    if callable(engine):
+        engine = engine()
+    vigente = generacion()
+    query = text("select * from `stock_info` where Symbol = :symbol order by Fecha asc;")
+    df = pd.read_sql(query, engine, params={"symbol": symbol.upper()})
+    arr = _a_array(df)
+    if not guardar_symbol(symbol, arr, vigente) or len(arr) == 0:
+        return arr
+    try:
+        return np.load(ruta, mmap_mode="r")
+    except FileNotFoundError:
+        return arr
+
+
+# RETURNS THE ROWS OF A SYMBOL BETWEEN start_date AND end_date (BOTH INCLUSIVE)
+# AS A stock_info-SHAPED DATAFRAME (Fecha, Symbol, Open, High, Low, Close_Price, Volume)
+def leer_span(symbol, engine, start_date=None, end_date=None):
+    arr = leer_symbol(symbol, engine)
+    fechas = arr["Fecha"]
+    inicio = 0 if start_date is None else np.searchsorted(fechas, np.datetime64(start_date, "us"), side="left")
+    fin = len(arr) if end_date is None else np.searchsorted(fechas, np.datetime64(end_date, "us"), side="right")
+    tramo = arr[inicio:fin]
+
+    df = pd.DataFrame({
+        "Fecha": tramo["Fecha"],
+        "Symbol": symbol.upper(),
+        "Open": tramo["Open"],
+        "High": tramo["High"],
+        "Low": tramo["Low"],
+        "Close_Price": tramo["Close_Price"],
+        "Volume": tramo["Volume"],
+    })
+    return df
+
+
+# SAME AS leer_span FOR SEVERAL SYMBOLS, CONCATENATED IN THE ORDER GIVEN
+def leer_spans(symbols, engine, start_date=None, end_date=None):
+    tramos = [leer_span(symbol, engine, start_date, end_date) for symbol in symbols]
+    if not tramos:
+        return pd.DataFrame(columns=["Fecha", "Symbol"] + list(DTYPE.names[1:]))
+    return pd.concat(tramos, ignore_index=True)
+
+
+# REMOVES THE CACHED FILES OF THE GIVEN SYMBOLS (OR OF EVERY SYMBOL IF symbols IS NONE) OF THE CURRENT DATABASE
+def invalidar(symbols=None):
+    carpeta = directorio()
+    _nueva_generacion()
+    if symbols is None:
+        rutas = carpeta.glob("*.npy")
+    else:
+        rutas = [_ruta(symbol) for symbol in symbols]
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
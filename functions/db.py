@@ -1,7 +1,69 @@
 # THIS MODULE HANDLES THE DATABASE CONNECTION USING SQLALCHEMY
-# IT CREATES AN ENGINE THAT OTHER MODULES USE TO RUN SQL QUERIES
+# THE ENGINE IS CREATED ON FIRST USE (get_engine() OR "from db import engine"), SO IMPORTING
+# A MODULE THAT MAY QUERY THE DATABASE NEITHER LOADS SQLALCHEMY NOR NEEDS DATABASE_FINANCE.
+# POOL SETTINGS ARE READ FROM THE ENVIRONMENT:
+#   FINANCE_POOL_SIZE, FINANCE_POOL_MAX_OVERFLOW, FINANCE_POOL_TIMEOUT (SECONDS),
+#   FINANCE_POOL_RECYCLE (SECONDS), FINANCE_POOL_PRE_PING (1/0)
 import os
-from sqlalchemy import create_engine
+import threading
+import instrumentation
 
-DATABASE_FINANCE = os.getenv("DATABASE_FINANCE")
-engine = create_engine(DATABASE_FINANCE, future=True)
\ No newline at end of file
+_engine = None
+_url = None                 # URL OF AN ENGINE INSTALLED WITH set_engine (None: DATABASE_FINANCE)
+_lock = threading.Lock()
+
+OPCIONES_POOL = {
+    "pool_size": ("FINANCE_POOL_SIZE", int),
+    "max_overflow": ("FINANCE_POOL_MAX_OVERFLOW", int),
+    "pool_timeout": ("FINANCE_POOL_TIMEOUT", float),
+    "pool_recycle": ("FINANCE_POOL_RECYCLE", int),
+    "pool_pre_ping": ("FINANCE_POOL_PRE_PING", lambda v: v != "0"),
+}
+
+
+# READS THE POOL OPTIONS THAT ARE SET IN THE ENVIRONMENT (UNSET ONES KEEP SQLALCHEMY'S DEFAULTS)
+def opciones_pool():
+    opciones = {}
+    for opcion, (variable, tipo) in OPCIONES_POOL.items():
+        valor = os.getenv(variable)
+        if valor is not None and valor != "":
+            opciones[opcion] = tipo(valor)
+    return opciones
+
+
+# RETURNS THE SHARED ENGINE, CREATING IT ON THE FIRST CALL
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                url = os.getenv("DATABASE_FINANCE")
+                if not url:
+                    raise RuntimeError("DATABASE_FINANCE IS NOT SET. EXPORT THE DATABASE URL BEFORE QUERYING.")
+                _engine = create_engine(url, future=True, **opciones_pool())
+                instrumentation.escuchar_engine(_engine)
+    return _engine
+
+
+# REPLACES THE SHARED ENGINE (E.G. A TEMPORARY SQLITE DATABASE IN benchmarks.py)
+# AND RETURNS THE PREVIOUS ONE
+def set_engine(nuevo):
+    global _engine, _url
+    instrumentation.escuchar_engine(nuevo)
+    with _lock:
+        anterior, _engine = _engine, nuevo
+        _url = None if nuevo is None else nuevo.url.render_as_string(hide_password=False)
+    return anterior
+
+
+# URL OF THE DATABASE THE SHARED ENGINE POINTS TO, WITHOUT BUILDING THE ENGINE
+def url_actual():
+    return _url or os.getenv("DATABASE_FINANCE", "")
+
+
+# KEEPS "from db import engine" WORKING: THE ATTRIBUTE IS RESOLVED (AND THE ENGINE BUILT) ON ACCESS
+def __getattr__(nombre):
+    if nombre == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
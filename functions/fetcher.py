@@ -0,0 +1,111 @@
+# THIS MODULE DOWNLOADS ALPHAVANTAGE PAYLOADS CONCURRENTLY
+# IT SHARES ONE KEEP-ALIVE SESSION, RESPECTS THE PER-MINUTE QUOTA WITH A TOKEN BUCKET
+# AND RETRIES WITH BACKOFF WHEN THE API ANSWERS WITH A "Note" (THROTTLING) MESSAGE
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import etapa
+
+API_URL = "https://www.alphavantage.co/query"
+
+
+# TOKEN BUCKET RATE LIMITER SHARED BY ALL WORKER THREADS
+# CAPACITY TOKENS ARE REFILLED CONTINUOUSLY AT rate_per_minute / 60 TOKENS PER SECOND
+# THE DEFAULT CAPACITY IS ONE TOKEN, SO CALLS ARE EVENLY PACED: A FULL BUCKET OF rate_per_minute
+# TOKENS WOULD LET THE FIRST MINUTE SPEND THE BURST PLUS THE REFILL (TWICE THE QUOTA)
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(self.capacity)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (ahora - self.ultimo) * self.rate)
+        self.ultimo = ahora
+
+    # BLOCKS UNTIL ONE TOKEN IS AVAILABLE AND CONSUMES IT
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.rate
+            time.sleep(espera)
+
+
+# CREATES A SESSION WITH A CONNECTION POOL BIG ENOUGH FOR ALL WORKERS
+def crear_sesion(max_workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# FETCHES ONE SYMBOL, RETRYING ON THROTTLING NOTES AND NETWORK ERRORS
+# RETURNS A DICTIONARY WITH THE SYMBOL, THE JSON PAYLOAD (OR NONE), ITS RAW BYTES, LATENCY AND ATTEMPTS
+def fetch_symbol(session, bucket, symbol, funcion, size, key,
+                 api_url=API_URL, max_reintentos=3, backoff=2.0, timeout=30):
+    params = {"function": funcion, "symbol": symbol, "outputsize": size, "apikey": key}
+    inicio = time.perf_counter()
+    info = None
+    contenido = None
+    error = None
+
+    for intento in range(1, max_reintentos + 2):
+        with etapa("rate_limit", "fetcher.fetch_symbol", symbol=symbol):
+            bucket.acquire()
+        try:
+            with etapa("http", "fetcher.fetch_symbol", symbol=symbol, intento=intento) as medicion:
+                r = session.get(api_url, params=params, timeout=timeout)
+                medicion.bytes = len(r.content)
+            with etapa("json", "fetcher.fetch_symbol", symbol=symbol) as medicion:
+                info = r.json()
+                contenido = r.content
+                medicion.bytes = len(r.content)
+            error = None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            info = None
+            contenido = None
+            error = e
+
+        # A "Note" MEANS THE QUOTA WAS EXCEEDED: WAIT AND TRY AGAIN
+        throttled = isinstance(info, dict) and "Note" in info
+        if not throttled and error is None:
+            break
+        if intento <= max_reintentos:
+            time.sleep(backoff * (2 ** (intento - 1)))
+
+    return {
+        "symbol": symbol,
+        "info": info,
+        "contenido": contenido,
+        "error": error,
+        "latencia": time.perf_counter() - inicio,
+        "intentos": intento,
+    }
+
+
+# FETCHES ALL SYMBOLS IN A THREAD POOL AND RETURNS THE RESULTS IN THE SAME ORDER AS symbols
+# size CAN BE A SINGLE OUTPUTSIZE OR A DICTIONARY {SYMBOL: OUTPUTSIZE}
+def fetch_all(symbols, funcion, size, key, rate_per_minute=5, max_workers=4,
+              max_reintentos=3, backoff=2.0, api_url=API_URL):
+    bucket = TokenBucket(rate_per_minute)
+    with crear_sesion(max_workers) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futuros = [
+                pool.submit(fetch_symbol, session, bucket, symbol, funcion,
+                            size.get(symbol) if isinstance(size, dict) else size, key,
+                            api_url, max_reintentos, backoff)
+                for symbol in symbols
+            ]
+            return [f.result() for f in futuros]
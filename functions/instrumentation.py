@@ -0,0 +1,379 @@
+# THIS MODULE MEASURES WHERE THE TIME OF A RUN GOES
+# EVERY PIPELINE STAGE (HTTP FETCH, JSON PARSING, PAYLOAD PARSING, BULK WRITE, ANALYTICS, CHARTS)
+# IS WRAPPED WITH @instrumentar OR "with etapa(...)", WHICH RECORDS ITS TIME, ROWS, BYTES AND
+# ERRORS. EVERY SQL STATEMENT IS TIMED THROUGH ENGINE EVENTS AND ATTRIBUTED TO THE FUNCTION OF
+# THIS PROJECT THAT RAN IT. ERRORS THAT A FUNCTION TURNS INTO AN EMPTY RESULT ARE REPORTED WITH
+# registrar_error().
+# ENVIRONMENT:
+#   FINANCE_METRICS=0          DISABLES EVERYTHING
+#   FINANCE_METRICS_LOG=path   APPENDS ONE JSON LINE PER STAGE CALL, QUERY AND ERROR
+#   FINANCE_METRICS_PROM=path  WRITES THE AGGREGATES IN PROMETHEUS TEXT FORMAT AT EXIT
+#   FINANCE_PROFILE=cprofile,tracemalloc   PROFILES EVERY OUTERMOST INSTRUMENTED CALL
+#   FINANCE_PROFILE_MATCH=text ONLY PROFILES CALLS WHOSE "stage:function" CONTAINS text
+#   FINANCE_PROFILE_DIR=path   WHERE .prof FILES ARE WRITTEN (DEFAULT BASE_DIR/profiles)
+import os
+import sys
+import json
+import time
+import atexit
+import tempfile
+import datetime
+import threading
+import contextvars
+from pathlib import Path
+from functools import wraps
+from contextlib import contextmanager
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FUNCTIONS_DIR = str(Path(__file__).resolve().parent)
+
+ACTIVO = os.getenv("FINANCE_METRICS", "1") != "0"
+RUTA_LOG = os.getenv("FINANCE_METRICS_LOG")
+RUTA_PROM = os.getenv("FINANCE_METRICS_PROM")
+PERFILES = {p.strip() for p in os.getenv("FINANCE_PROFILE", "").split(",") if p.strip()}
+PERFIL_FILTRO = os.getenv("FINANCE_PROFILE_MATCH", "")
+PERFIL_DIR = Path(os.getenv("FINANCE_PROFILE_DIR", BASE_DIR / "profiles"))
+
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+# MODULES THAT ONLY CARRY A QUERY FOR SOMEONE ELSE: A QUERY IS ATTRIBUTED TO THE FIRST
+# FUNCTION OUTSIDE THEM (E.G. A CACHE MISS IS CHARGED TO THE stats_functions CALLER)
+MODULOS_INTERMEDIOS = {"cache", "memo", "db", "lazy", "instrumentation"}
+
+# INNERMOST INSTRUMENTED CALL OF THE CURRENT THREAD/TASK
+_actual = contextvars.ContextVar("finance_etapa_actual", default=None)
+
+
+class Agregado:
+    __slots__ = ("n", "errores", "segundos", "maximo", "filas", "bytes", "buckets")
+
+    def __init__(self):
+        self.n = 0
+        self.errores = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        self.filas = 0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def sumar(self, segundos, filas=None, nbytes=None, error=False):
+        self.n += 1
+        self.errores += bool(error)
+        self.segundos += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.filas += filas or 0
+        self.bytes += nbytes or 0
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                self.buckets[i] += 1
+
+    def como_dict(self):
+        return {"n": self.n, "errores": self.errores, "segundos": self.segundos, "maximo": self.maximo,
+                "filas": self.filas, "bytes": self.bytes}
+
+
+class Registro:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.etapas = {}      # (STAGE, FUNCTION) -> Agregado
+        self.consultas = {}   # FUNCTION -> Agregado
+        self.errores = {}     # (FUNCTION, EXCEPTION TYPE) -> COUNT
+
+    def etapa(self, etapa, funcion, segundos, filas=None, nbytes=None, error=False):
+        with self.lock:
+            self.etapas.setdefault((etapa, funcion), Agregado()).sumar(segundos, filas, nbytes, error)
+
+    def consulta(self, funcion, segundos, error=False):
+        with self.lock:
+            self.consultas.setdefault(funcion, Agregado()).sumar(segundos, error=error)
+
+    def error(self, funcion, tipo):
+        with self.lock:
+            self.errores[(funcion, tipo)] = self.errores.get((funcion, tipo), 0) + 1
+
+    def limpiar(self):
+        with self.lock:
+            self.etapas.clear()
+            self.consultas.clear()
+            self.errores.clear()
+
+    def resumen(self):
+        with self.lock:
+            return {
+                "etapas": [{"etapa": e, "funcion": f, **a.como_dict()} for (e, f), a in self.etapas.items()],
+                "consultas": [{"funcion": f, **a.como_dict()} for f, a in self.consultas.items()],
+                "errores": [{"funcion": f, "tipo": t, "n": n} for (f, t), n in self.errores.items()],
+            }
+
+
+REGISTRO = Registro()
+_lock_log = threading.Lock()
+
+
+# APPENDS ONE EVENT TO THE JSON LINES LOG (IF FINANCE_METRICS_LOG IS SET)
+def log_evento(evento):
+    if not RUTA_LOG:
+        return
+    evento = {"ts": datetime.datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), **evento}
+    linea = json.dumps(evento, default=str)
+    with _lock_log:
+        with open(RUTA_LOG, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+
+
+# ROWS AND IN-MEMORY BYTES OF A RESULT (DATAFRAMES, SERIES, ARRAYS AND THE CORRELATION DICTIONARY)
+def medir_resultado(valor):
+    if hasattr(valor, "memory_usage") and hasattr(valor, "__len__"):
+        uso = valor.memory_usage(index=True)
+        return len(valor), int(uso.sum() if hasattr(uso, "sum") else uso)
+    if hasattr(valor, "nbytes") and hasattr(valor, "shape"):
+        return (int(valor.shape[0]) if valor.ndim else 1), int(valor.nbytes)
+    if isinstance(valor, dict) and "Matriz" in valor:
+        return len(valor["Matriz"]), int(valor["Matriz"].nbytes)
+    return None, None
+
+
+class Medicion:
+    __slots__ = ("etapa", "funcion", "filas", "bytes", "error", "extra", "padre")
+
+    def __init__(self, etapa, funcion, extra, padre):
+        self.etapa = etapa
+        self.funcion = funcion
+        self.filas = None
+        self.bytes = None
+        self.error = None
+        self.extra = extra
+        self.padre = padre
+
+
+def _perfilar(medicion):
+    if not PERFILES or medicion.padre is not None:
+        return False
+    return PERFIL_FILTRO in f"{medicion.etapa}:{medicion.funcion}"
+
+
+# CONTEXT MANAGER THAT TIMES ONE STAGE. THE CODE INSIDE MAY SET .filas AND .bytes ON THE
+# YIELDED OBJECT; EXCEPTIONS ARE RECORDED AND RE-RAISED. extra ONLY GOES TO THE JSON LOG
+@contextmanager
+def etapa(nombre, funcion=None, **extra):
+    if not ACTIVO:
+        yield Medicion(nombre, funcion, extra, None)
+        return
+    medicion = Medicion(nombre, funcion or _funcion_llamante(), extra, _actual.get())
+    token = _actual.set(medicion)
+    perfil = _perfilar(medicion)
+    perfilador, memoria = _iniciar_perfil() if perfil else (None, None)
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    except BaseException as e:
+        medicion.error = f"{type(e).__name__}: {e}".splitlines()[0]
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        _actual.reset(token)
+        evento = {}
+        if perfil:
+            evento = _cerrar_perfil(medicion, perfilador, memoria)
+        REGISTRO.etapa(medicion.etapa, medicion.funcion, segundos, medicion.filas, medicion.bytes,
+                       medicion.error is not None)
+        log_evento({"tipo": "etapa", "etapa": medicion.etapa, "funcion": medicion.funcion,
+                    "segundos": segundos, "filas": medicion.filas, "bytes": medicion.bytes,
+                    "error": medicion.error, **evento, **medicion.extra})
+
+
+# DECORATOR VERSION OF etapa: ROWS AND BYTES ARE TAKEN FROM THE RETURNED VALUE
+def instrumentar(nombre):
+    def decorador(func):
+        funcion = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ACTIVO:
+                return func(*args, **kwargs)
+            with etapa(nombre, funcion) as medicion:
+                valor = func(*args, **kwargs)
+                if medicion.filas is None:
+                    medicion.filas, medicion.bytes = medir_resultado(valor)
+            return valor
+        return wrapper
+    return decorador
+
+
+# RECORDS AN ERROR THAT THE CALLER HANDLES ITSELF (E.G. BY RETURNING AN EMPTY DATAFRAME)
+# IT IS CHARGED TO THE INSTRUMENTED CALL IN PROGRESS, OR TO THE CALLING FUNCTION
+def registrar_error(error, funcion=None):
+    if not ACTIVO:
+        return
+    medicion = _actual.get()
+    if funcion is None:
+        funcion = medicion.funcion if medicion is not None else _funcion_llamante()
+    mensaje = f"{type(error).__name__}: {error}".splitlines()[0] if str(error) else type(error).__name__
+    if medicion is not None and medicion.error is None:
+        medicion.error = mensaje
+    REGISTRO.error(funcion, type(error).__name__)
+    log_evento({"tipo": "error", "funcion": funcion, "error": mensaje})
+
+
+# FIRST FRAME OF THIS PROJECT OUTSIDE THE INTERMEDIATE MODULES, AS "module.function"
+def _funcion_llamante():
+    frame = sys._getframe(1)
+    while frame is not None:
+        codigo = frame.f_code
+        if codigo.co_filename.startswith(FUNCTIONS_DIR):
+            modulo = Path(codigo.co_filename).stem
+            if modulo not in MODULOS_INTERMEDIOS and codigo.co_name not in ("wrapper", "<lambda>"):
+                return f"{modulo}.{codigo.co_name}"
+        frame = frame.f_back
+    return "desconocida"
+
+
+def _iniciar_perfil():
+    perfilador = memoria = None
+    if "cprofile" in PERFILES:
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    if "tracemalloc" in PERFILES:
+        import tracemalloc
+        memoria = not tracemalloc.is_tracing()
+        if memoria:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    return perfilador, memoria
+
+
+# STOPS THE PROFILERS OF A CALL AND RETURNS WHAT GOES INTO ITS LOG EVENT
+def _cerrar_perfil(medicion, perfilador, memoria):
+    evento = {}
+    if perfilador is not None:
+        perfilador.disable()
+        PERFIL_DIR.mkdir(parents=True, exist_ok=True)
+        marca = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        ruta = PERFIL_DIR / f"{medicion.etapa}-{medicion.funcion}-{marca}.prof"
+        perfilador.dump_stats(ruta)
+        evento["perfil"] = str(ruta)
+    if memoria is not None:
+        import tracemalloc
+        evento["pico_bytes"] = tracemalloc.get_traced_memory()[1]
+        evento["asignaciones"] = [
+            str(s) for s in tracemalloc.take_snapshot().statistics("lineno")[:5]
+        ]
+        if memoria:
+            tracemalloc.stop()
+    return evento
+
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("finance_inicios", []).append((time.perf_counter(), _funcion_llamante()))
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("finance_inicios")
+    if not inicios:
+        return
+    inicio, funcion = inicios.pop()
+    segundos = time.perf_counter() - inicio
+    REGISTRO.consulta(funcion, segundos)
+    log_evento({"tipo": "consulta", "funcion": funcion, "segundos": segundos,
+                "sql": " ".join(statement.split())[:200]})
+
+
+def _error_de_consulta(contexto):
+    inicios = contexto.connection.info.get("finance_inicios") if contexto.connection is not None else None
+    if not inicios:
+        return
+    inicio, funcion = inicios.pop()
+    REGISTRO.consulta(funcion, time.perf_counter() - inicio, error=True)
+    log_evento({"tipo": "consulta", "funcion": funcion, "segundos": time.perf_counter() - inicio,
+                "error": f"{type(contexto.original_exception).__name__}: {contexto.original_exception}"[:200]})
+
+
+# TIMES EVERY STATEMENT OF engine (CALLED BY db FOR THE SHARED ENGINE; SAFE TO CALL TWICE)
+def escuchar_engine(engine):
+    if not ACTIVO or engine is None:
+        return
+    from sqlalchemy import event
+    if event.contains(engine, "before_cursor_execute", _antes_de_consulta):
+        return
+    event.listen(engine, "before_cursor_execute", _antes_de_consulta)
+    event.listen(engine, "after_cursor_execute", _despues_de_consulta)
+    event.listen(engine, "handle_error", _error_de_consulta)
+
+
+def _etiquetas(**valores):
+    texto = ",".join(
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in valores.items()
+    )
+    return "{" + texto + "}"
+
+
+def _histograma(lineas, nombre, etiquetas, agregado):
+    for limite, n in zip(BUCKETS, agregado.buckets):
+        lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {n}")
+    lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le='+Inf')} {agregado.n}")
+    lineas.append(f"{nombre}_sum{_etiquetas(**etiquetas)} {agregado.segundos}")
+    lineas.append(f"{nombre}_count{_etiquetas(**etiquetas)} {agregado.n}")
+
+
+# RENDERS THE AGGREGATES IN PROMETHEUS TEXT EXPOSITION FORMAT
+def prometheus():
+    with REGISTRO.lock:
+        etapas = list(REGISTRO.etapas.items())
+        consultas = list(REGISTRO.consultas.items())
+        errores = list(REGISTRO.errores.items())
+    lineas = [
+        "# HELP finance_stage_seconds Wall-clock time of each pipeline stage call.",
+        "# TYPE finance_stage_seconds histogram",
+    ]
+    for (e, f), a in etapas:
+        _histograma(lineas, "finance_stage_seconds", {"stage": e, "function": f}, a)
+    for metrica, atributo, ayuda in (
+        ("finance_stage_errors_total", "errores", "Stage calls that raised or reported an error."),
+        ("finance_stage_rows_total", "filas", "Rows produced by each stage."),
+        ("finance_stage_bytes_total", "bytes", "Bytes produced or transferred by each stage."),
+    ):
+        lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} counter"]
+        for (e, f), a in etapas:
+            lineas.append(f"{metrica}{_etiquetas(stage=e, function=f)} {getattr(a, atributo)}")
+    lineas += ["# HELP finance_query_seconds SQL statement latency by calling function.",
+               "# TYPE finance_query_seconds histogram"]
+    for f, a in consultas:
+        _histograma(lineas, "finance_query_seconds", {"function": f}, a)
+    lineas += ["# HELP finance_query_errors_total SQL statements that failed.",
+               "# TYPE finance_query_errors_total counter"]
+    for f, a in consultas:
+        lineas.append(f"finance_query_errors_total{_etiquetas(function=f)} {a.errores}")
+    lineas += ["# HELP finance_errors_total Errors handled inside a function (empty results).",
+               "# TYPE finance_errors_total counter"]
+    for (f, t), n in errores:
+        lineas.append(f"finance_errors_total{_etiquetas(function=f, type=t)} {n}")
+    return "\n".join(lineas) + "\n"
+
+
+def _escribir_atomico(ruta, texto):
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(tmp, ruta)
+
+
+# WRITES THE PROMETHEUS FILE ATOMICALLY (node_exporter TEXTFILE COLLECTORS READ IT AS IS)
+def exportar_prometheus(ruta=None):
+    ruta = ruta or RUTA_PROM
+    if ruta:
+        _escribir_atomico(ruta, prometheus())
+    return ruta
+
+
+# WRITES THE AGGREGATES AS ONE JSON DOCUMENT
+def exportar_json(ruta):
+    _escribir_atomico(ruta, json.dumps(REGISTRO.resumen(), indent=2))
+    return ruta
+
+
+if ACTIVO and RUTA_PROM:
+    atexit.register(exportar_prometheus)
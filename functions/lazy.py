@@ -0,0 +1,24 @@
+# THIS MODULE DEFERS HEAVY IMPORTS UNTIL THEIR FIRST ATTRIBUTE ACCESS
+# importar_diferido("seaborn") RETURNS A MODULE OBJECT AT ONCE; THE MODULE CODE RUNS
+# THE FIRST TIME ONE OF ITS ATTRIBUTES IS USED (importlib.util.LazyLoader).
+import sys
+import importlib
+import importlib.util
+
+
+def importar_diferido(nombre):
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    padre, _, hijo = nombre.rpartition(".")
+    if padre:
+        importlib.import_module(padre)
+    spec = importlib.util.find_spec(nombre)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {nombre!r}", name=nombre)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    spec.loader.exec_module(modulo)
+    if padre:
+        setattr(sys.modules[padre], hijo, modulo)
+    return modulo
@@ -0,0 +1,149 @@
+# THIS SCRIPT LOAD-TESTS THE ANALYTICS SERVICE (service.py) AND REPORTS p50/p90/p99 LATENCY
+# concurrencia KEEP-ALIVE CLIENTS SEND peticiones GET REQUESTS IN TOTAL, CYCLING OVER THE
+# ENDPOINTS, AND THE LATENCIES ARE REPORTED PER ENDPOINT AND OVERALL.
+# WITHOUT --url IT STARTS ITS OWN SERVICE ON A TEMPORARY SQLITE stock_info FILLED WITH SYNTHETIC
+# DATA (bench_suite.generar_ohlcv), SO IT RUNS WITHOUT A DATABASE SERVER OR NETWORK ACCESS.
+# RUN IT FROM THE functions/ DIRECTORY:
+#   python load_test.py [--url http://127.0.0.1:8765] [--peticiones 2000] [--concurrencia 32] [--graficos]
+import time
+import json
+import datetime
+import shutil
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+# PATHS THE CLIENTS CYCLE OVER, FOR THE GIVEN SYMBOLS AND SPAN
+def rutas_prueba(symbols, start, end, graficos=False):
+    consulta = f"companies={','.join(symbols)}&start={start}&end={end}"
+    rutas = [f"/returns?{consulta}", f"/volatility?{consulta}", f"/drawdowns?{consulta}", f"/correlation?{consulta}"]
+    if graficos:
+        rutas.append(f"/chart/CorrInSpan?{consulta}")
+    return rutas
+
+
+# ONE KEEP-ALIVE CLIENT: SENDS ITS REQUESTS ONE AFTER THE OTHER AND RECORDS (PATH, SECONDS, STATUS)
+async def _cliente(host, port, rutas, resultados):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for ruta in rutas:
+            inicio = time.perf_counter()
+            writer.write(f"GET {ruta} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            estado = int((await reader.readline()).split()[1])
+            largo = 0
+            while True:
+                cabecera = await reader.readline()
+                if cabecera in (b"\r\n", b""):
+                    break
+                nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                if nombre.strip().lower() == "content-length":
+                    largo = int(valor)
+            await reader.readexactly(largo)
+            resultados.append((ruta.split("?")[0], time.perf_counter() - inicio, estado))
+    finally:
+        writer.close()
+
+
+async def _cargar(host, port, rutas, peticiones, concurrencia):
+    resultados = []
+    cola = [rutas[i % len(rutas)] for i in range(peticiones)]
+    partes = [cola[i::concurrencia] for i in range(concurrencia)]
+    await asyncio.gather(*(_cliente(host, port, parte, resultados) for parte in partes if parte))
+    return resultados
+
+
+def _resumen(latencias):
+    ms = np.asarray(latencias) * 1000
+    return {"n": len(ms), "p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "media": float(ms.mean()), "max": float(ms.max())}
+
+
+# RUNS THE LOAD AGAINST url AND RETURNS THE LATENCY SUMMARY (MILLISECONDS) OVERALL AND PER ENDPOINT
+def correr(url, rutas, peticiones=2000, concurrencia=32):
+    partes = urlsplit(url)
+    inicio = time.perf_counter()
+    resultados = asyncio.run(_cargar(partes.hostname, partes.port, rutas, peticiones, concurrencia))
+    segundos = time.perf_counter() - inicio
+
+    resumen = {"total": _resumen([r[1] for r in resultados]), "por_ruta": {}}
+    for ruta in dict.fromkeys(r[0] for r in resultados):
+        resumen["por_ruta"][ruta] = _resumen([r[1] for r in resultados if r[0] == ruta])
+    resumen["errores"] = sum(1 for r in resultados if r[2] != 200)
+    resumen["peticiones_por_segundo"] = len(resultados) / segundos
+    return resumen
+
+
+# STARTS service.py IN A CHILD PROCESS (SO CLIENTS AND SERVER DON'T SHARE A GIL) ON A TEMPORARY
+# SQLITE stock_info WITH n_symbols x n_anios OF SYNTHETIC DATA. RETURNS (URL, SYMBOLS, START, END, STOP FUNCTION)
+def servicio_demo(n_symbols=10, n_anios=5, workers=None):
+    import os
+    import sys
+    import subprocess
+    import bench_suite
+
+    directorio = Path(tempfile.mkdtemp(prefix="load_test_"))
+    df = bench_suite.generar_ohlcv(n_symbols, n_anios)
+    bench_suite.cargar_sqlite(df, directorio / "stock_info.db").dispose()
+    symbols = list(df["Symbol"].unique())
+
+    comando = [sys.executable, str(Path(__file__).resolve().parent / "service.py"), "--port", "0",
+               "--sqlite", str(directorio / "stock_info.db"), "--figuras", str(directorio / "figures"),
+               "--calentar", ",".join(symbols)]
+    if workers:
+        comando += ["--workers", str(workers)]
+    entorno = {**os.environ, "FINANCE_CACHE_DIR": str(directorio / "cache")}
+    proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, text=True, env=entorno)
+    linea = proceso.stdout.readline()
+    if not linea.startswith("SERVING ON "):
+        proceso.kill()
+        raise RuntimeError(f"THE SERVICE DID NOT START ({linea.strip() or proceso.wait()}).")
+
+    def detener():
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    url = linea.split()[2]
+    return url, symbols, df["Fecha"].min().date().isoformat(), df["Fecha"].max().date().isoformat(), detener
+
+
+def imprimir(resumen):
+    print(f"{'ENDPOINT':<16}{'N':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'MAX ms':>10}")
+    for ruta, r in [*resumen["por_ruta"].items(), ("TOTAL", resumen["total"])]:
+        print(f"{ruta:<16}{r['n']:>7}{r['p50']:>10.2f}{r['p90']:>10.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+    print(f"{resumen['peticiones_por_segundo']:.0f} REQUESTS/s, {resumen['errores']} ERRORS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the analytics service")
+    parser.add_argument("--url", default=None, help="running service; without it a SQLite demo service is started")
+    parser.add_argument("--symbols", default=None, help="comma-separated symbols (required with --url)")
+    parser.add_argument("--start", default="2000-01-01")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--graficos", action="store_true", help="also request a PNG chart")
+    parser.add_argument("--salida", default=None, help="write the summary as JSON")
+    args = parser.parse_args()
+
+    detener = None
+    if args.url:
+        url, symbols, start = args.url, args.symbols.split(","), args.start
+        end = args.end or datetime.date.today().isoformat()
+    else:
+        url, symbols, start, end, detener = servicio_demo()
+    try:
+        resumen = correr(url, rutas_prueba(symbols, start, end, args.graficos), args.peticiones, args.concurrencia)
+    finally:
+        if detener is not None:
+            detener()
+    imprimir(resumen)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2)
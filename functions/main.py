@@ -1,8 +1,12 @@
 import yaml
 import requests
 import pandas as pd
+import numpy as np
 import os
-from db import engine
+import json
+from fetcher import fetch_all, API_URL
+import raw_cache
+from instrumentation import instrumentar, registrar_error
 
 
 # LOAD CONFIGURATION FROM A YAML FILE SAFELY
@@ -24,9 +28,48 @@ def cargar_configuracion_yaml(ruta_archivo):
         return None
 
 
+# PARSE ONE "Time Series (Daily)" BLOCK INTO A DATAFRAME USING COLUMNAR ARRAYS
+# DATES ARE CONVERTED IN BULK AND THE ADJUSTED/REGULAR KEYS ARE RESOLVED ONCE PER PAYLOAD
+@instrumentar("parse")
+def parse_daily_payload(symbol, info_daily):
+    dias = list(info_daily.keys())
+    valores = list(info_daily.values())
+
+    if not dias:
+        return pd.DataFrame()
+
+    # CLOSE AND VOLUME KEYS DEPEND ON WHETHER THE PAYLOAD IS ADJUSTED
+    if '5. adjusted close' in valores[0]:
+        close_key = '5. adjusted close'
+        volume_key = '6. volume'
+    else:
+        close_key = '4. close'
+        volume_key = '5. volume'
+
+    close_price = np.array([v.get(close_key) for v in valores], dtype=np.float64)
+
+    # ERROR HANDLING FOR MISSING CLOSE PRICES
+    faltantes = np.flatnonzero(np.isnan(close_price))
+    for i in faltantes:
+        print(f"WARNING: MISSING CLOSE PRICE FOR {symbol} ON {dias[i]}. DATA: {valores[i]}")
+
+    df = pd.DataFrame({
+        "Fecha": pd.to_datetime(dias, format="%Y-%m-%d"),
+        "Symbol": symbol,
+        "Open": np.array([v['1. open'] for v in valores], dtype=np.float64),
+        "High": np.array([v['2. high'] for v in valores], dtype=np.float64),
+        "Low": np.array([v['3. low'] for v in valores], dtype=np.float64),
+        "Close_Price": close_price,
+        "Volume": np.array([v.get(volume_key, 0) for v in valores], dtype=np.int64),
+    })
+    return df
+
+
 # REQUEST DAILY STOCK DATA FROM ALPHAVANTAGE API
 # RETURNS A DATAFRAME WITH ALL SYMBOLS' DAILY DATA
-def get_data_daily():
+# sizes OPTIONALLY MAPS EACH SYMBOL TO ITS OWN OUTPUTSIZE (USED BY INCREMENTAL INGESTION)
+@instrumentar("download")
+def get_data_daily(sizes=None):
     configuracion = cargar_configuracion_yaml('config.yaml')
 
     # VALIDATE CONFIGURATION
@@ -39,62 +82,73 @@ def get_data_daily():
         symbols = [stock for stock in configuracion['stock_symbols']]
         funcion = configuracion['funciones']
         size = configuracion['outputsize'][1]
+        if sizes is not None:
+            size = {symbol: sizes.get(symbol, size) for symbol in symbols}
 
         datos = []
-
-        # LOOP OVER EACH STOCK SYMBOL
-        for symbol in symbols:
-            try:
-                url = (
-                    f"https://www.alphavantage.co/query?"
-                    f"function={funcion}&symbol={symbol}&outputsize={size}&apikey={key}"
+        tienda = raw_cache.almacen()
+        fecha = raw_cache.fecha_operacion()
+
+        def size_de(symbol):
+            return size.get(symbol) if isinstance(size, dict) else size
+
+        # RESPONSES ALREADY STORED FOR TODAY'S TRADING DATE ARE READ FROM DISK, NOT FROM THE API
+        guardados = {}
+        if raw_cache.ACTIVO:
+            for symbol in symbols:
+                contenido = tienda.buscar(funcion, symbol, size_de(symbol), fecha)
+                if contenido is not None:
+                    guardados[symbol] = {
+                        "symbol": symbol, "info": json.loads(contenido), "contenido": None,
+                        "error": None, "latencia": 0.0, "intentos": 0,
+                    }
+
+        # DOWNLOAD THE REST CONCURRENTLY THROUGH A SHARED, RATE-LIMITED SESSION
+        faltan = [symbol for symbol in symbols if symbol not in guardados]
+        descargados = fetch_all(
+            faltan, funcion, size, key,
+            rate_per_minute=configuracion.get('rate_limit_per_minute', 5),
+            max_workers=configuracion.get('max_workers', 4),
+            max_reintentos=configuracion.get('max_retries', 3),
+            backoff=configuracion.get('retry_backoff', 2.0),
+            api_url=configuracion.get('api_url', API_URL),
+        ) if faltan else []
+        por_symbol = {**guardados, **{r["symbol"]: r for r in descargados}}
+        resultados = [por_symbol[symbol] for symbol in symbols]
+
+        # LOOP OVER EACH DOWNLOADED PAYLOAD
+        for resultado in resultados:
+            symbol = resultado["symbol"]
+            info = resultado["info"]
+            if resultado["intentos"]:
+                print(
+                    f"FETCHED {symbol} IN {resultado['latencia']:.2f}s "
+                    f"({resultado['intentos']} ATTEMPT(S))"
                 )
-
-                r = requests.get(url)
-                info = r.json()
+            else:
+                print(f"LOADED {symbol} FROM THE RAW RESPONSE CACHE")
+            try:
+                if resultado["error"] is not None:
+                    raise resultado["error"]
 
                 # CHECK IF EXPECTED DAILY DATA EXISTS IN RESPONSE
                 if "Time Series (Daily)" in info:
                     info_daily = info["Time Series (Daily)"]
 
-                    # PARSE EACH DATE ENTRY
-                    for dia, values in info_daily.items():
-                        fecha = pd.to_datetime(dia)
-                        open = float(values.get('1. open'))
-                        high = float(values.get('2. high'))
-                        low = float(values.get('3. low'))
-
-                        # HANDLE CLOSE PRICE (ADJUSTED OR REGULAR)
-                        close_price = values.get('5. adjusted close', values.get('4. close'))
-
-                        if close_price is not None:
-                            close_price = float(close_price)
-                        else:
-                            # ERROR HANDLING FOR MISSING CLOSE PRICES
-                            print(
-                                f"WARNING: MISSING CLOSE PRICE FOR {symbol} ON {dia}. DATA: {values}"
-                            )
-                            close_price = None
-
-                        # VOLUME FIELD DEPENDS ON WHETHER ADJUSTED CLOSE EXISTS
-                        if '5. adjusted close' in values:
-                            volume_key = '6. volume'
-                        else:
-                            volume_key = '5. volume'
-
-                        volume = int(values.get(volume_key, 0))
-
-                        diccionario = {
-                            "Fecha": fecha,
-                            "Symbol": symbol,
-                            "Open": open,
-                            "High": high,
-                            "Low": low,
-                            "Close_Price": close_price,
-                            "Volume": volume
-                        }
-
-                        datos.append(diccionario)
+                    datos.append(parse_daily_payload(symbol, info_daily))
+
+                    # ONLY VALID PAYLOADS ARE STORED, UNDER THE TRADING DATE THEIR DATA REACHES: A RESPONSE
+                    # STILL ENDING ON THE PREVIOUS SESSION IS NOT SERVED FOR fecha, SO A LATER RUN DOWNLOADS
+                    # THE CLOSE ONCE IT IS PUBLISHED. A FULL DISK MUST NOT STOP THE DOWNLOAD
+                    fecha_datos = raw_cache.fecha_datos(info)
+                    if raw_cache.ACTIVO and resultado["contenido"] and fecha_datos:
+                        if fecha_datos != fecha:
+                            print(f"RAW RESPONSE OF {symbol} ENDS ON {fecha_datos}, NOT {fecha}. NOT REUSED TODAY.")
+                        try:
+                            tienda.guardar(funcion, symbol, size_de(symbol), fecha_datos, resultado["contenido"])
+                        except OSError as e:
+                            registrar_error(e)
+                            print(f"WARNING: RAW RESPONSE OF {symbol} NOT CACHED ({e}).")
 
                 else:
                     # HANDLE POSSIBLE API ERROR MESSAGES
@@ -106,11 +160,24 @@ def get_data_daily():
                         print(f"UNEXPECTED API RESPONSE FOR {symbol}: {info}")
 
             except (requests.exceptions.RequestException, KeyError, ValueError, TypeError) as e:
+                registrar_error(e)
                 print(
                     f"ERROR '{e}'. FAILED WHILE FETCHING DATA FOR {symbol}. CONTINUING..."
                 )
 
-        df = pd.DataFrame(datos)
+        # EXPIRED AND LEAST RECENTLY USED RESPONSES ARE EVICTED BEFORE THE INDEX IS SAVED
+        if raw_cache.ACTIVO:
+            try:
+                tienda.podar()
+                tienda.escribir_indice()
+            except OSError as e:
+                registrar_error(e)
+                print(f"WARNING: RAW RESPONSE CACHE INDEX NOT SAVED ({e}).")
+
+        if not datos:
+            return pd.DataFrame()
+
+        df = pd.concat(datos, ignore_index=True)
         return df
 
     except Exception as e:
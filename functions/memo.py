@@ -0,0 +1,100 @@
+# THIS MODULE MEMOIZES COMPUTED ANALYTICS INSIDE THE CURRENT PROCESS
+# RESULTS ARE KEYED ON (FUNCTION, SYMBOLS, SPAN) AND KEPT IN A SIZE-BOUNDED LRU.
+# to_sql INVALIDATES EVERY ENTRY THAT INVOLVES A SYMBOL IT WROTE. A PROCESS THAT DOESN'T SEE THOSE
+# WRITES (E.G. service.py) GIVES THE ENTRIES A MAXIMUM AGE (max_edad, SECONDS) INSTEAD.
+# SET FINANCE_MEMO=0 TO DISABLE IT AND FINANCE_MEMO_SIZE TO CHANGE THE NUMBER OF ENTRIES.
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from functools import wraps
+import pandas as pd
+
+ACTIVO = os.getenv("FINANCE_MEMO", "1") != "0"
+
+
+class MemoLRU:
+    def __init__(self, maxsize=256, max_edad=None):
+        self.maxsize = maxsize
+        self.max_edad = max_edad        # None: ENTRIES LIVE UNTIL EVICTED OR INVALIDATED
+        self.entradas = OrderedDict()   # KEY -> (SYMBOLS, VALUE, INSTANT STORED)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # RETURNS (True, VALUE) ON A HIT AND (False, None) ON A MISS OR AN EXPIRED ENTRY
+    def get(self, key):
+        with self.lock:
+            if key in self.entradas:
+                _, valor, instante = self.entradas[key]
+                if self.max_edad is None or time.monotonic() - instante <= self.max_edad:
+                    self.entradas.move_to_end(key)
+                    self.hits += 1
+                    return True, valor
+                del self.entradas[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, symbols, valor):
+        with self.lock:
+            self.entradas[key] = (symbols, valor, time.monotonic())
+            self.entradas.move_to_end(key)
+            while len(self.entradas) > self.maxsize:
+                self.entradas.popitem(last=False)
+
+    # REMOVES THE ENTRIES THAT INVOLVE ANY OF THE GIVEN SYMBOLS (OR ALL ENTRIES IF symbols IS NONE)
+    def invalidar(self, symbols=None):
+        with self.lock:
+            if symbols is None:
+                self.entradas.clear()
+                return
+            symbols = {str(s).upper() for s in symbols}
+            for key in [k for k, (s, _, _) in self.entradas.items() if s & symbols]:
+                del self.entradas[key]
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entradas": len(self.entradas), "maxsize": self.maxsize, "max_edad": self.max_edad}
+
+
+CACHE = MemoLRU(int(os.getenv("FINANCE_MEMO_SIZE", "256")))
+
+
+def _hashable(valor):
+    if isinstance(valor, (list, tuple)):
+        return tuple(_hashable(v) for v in valor)
+    return valor
+
+
+def _simbolos(valor):
+    if isinstance(valor, str):
+        return frozenset([valor.upper()])
+    return frozenset(str(v).upper() for v in valor)
+
+
+def _copiar(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    return copy.deepcopy(valor)
+
+
+# DECORATOR FOR FUNCTIONS WITH THE SIGNATURE (company_or_companies, start, end, ...)
+# CALLERS RECEIVE A COPY, SO MUTATING A RESULT NEVER CORRUPTS THE CACHE.
+# EMPTY FRAMES (THE ERROR RESULT OF stats_functions) ARE NOT CACHED.
+def memoizar(func):
+    @wraps(func)
+    def wrapper(symbols, *args, **kwargs):
+        if not ACTIVO:
+            return func(symbols, *args, **kwargs)
+        opciones = tuple(sorted((k, _hashable(v)) for k, v in kwargs.items()))
+        key = (func.__qualname__, _hashable(symbols), _hashable(args), opciones)
+        encontrado, valor = CACHE.get(key)
+        if encontrado:
+            return _copiar(valor)
+        valor = func(symbols, *args, **kwargs)
+        if not (isinstance(valor, pd.DataFrame) and valor.empty):
+            CACHE.put(key, _simbolos(symbols), _copiar(valor))
+        return valor
+    return wrapper
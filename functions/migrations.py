@@ -0,0 +1,130 @@
+# THIS MODULE KEEPS THE DATABASE SCHEMA UNDER VERSION CONTROL
+# EVERY MIGRATION HAS A VERSION NUMBER AND IS APPLIED ONCE, INSIDE A TRANSACTION
+# (MYSQL/MARIADB COMMIT DDL IMPLICITLY), AND RECORDED IN THE "schema_version" TABLE.
+# RUN IT WITH: python migrations.py
+import datetime
+from sqlalchemy import text, inspect
+
+COLUMNAS_STOCK_INFO = "Fecha, Symbol, Open, High, Low, Close_Price, Volume"
+
+DDL_STOCK_INFO = """create table {tabla} (
+    Fecha date not null,
+    Symbol varchar(16) not null,
+    Open double,
+    High double,
+    Low double,
+    Close_Price double,
+    Volume bigint,
+    primary key (Symbol, Fecha)
+)"""
+
+
+def _insert_ignore(dialecto):
+    if dialecto in ("mysql", "mariadb"):
+        return "insert ignore into"
+    if dialecto == "sqlite":
+        return "insert or ignore into"
+    return "insert into"
+
+
+def _on_conflict(dialecto):
+    return " on conflict do nothing" if dialecto == "postgresql" else ""
+
+
+# VERSION 1: stock_info WITH TYPED COLUMNS AND A (Symbol, Fecha) PRIMARY KEY
+# A TABLE PREVIOUSLY CREATED BY pandas IS REBUILT: ROWS ARE COPIED INTO THE NEW TABLE
+# (DUPLICATED (Symbol, Fecha) PAIRS ARE DROPPED) AND THE NEW TABLE REPLACES THE OLD ONE
+def _v1_stock_info(conn):
+    dialecto = conn.dialect.name
+    inspector = inspect(conn)
+    if not inspector.has_table("stock_info"):
+        conn.execute(text(DDL_STOCK_INFO.format(tabla="stock_info")))
+        return
+
+    pk = inspector.get_pk_constraint("stock_info").get("constrained_columns") or []
+    if pk == ["Symbol", "Fecha"]:
+        return
+
+    # SQLITE STORES pandas DATETIMES AS TEXT WITH A TIME PART: KEEP ONLY THE DATE
+    columnas = COLUMNAS_STOCK_INFO
+    if dialecto == "sqlite":
+        columnas = columnas.replace("Fecha,", "date(Fecha),", 1)
+
+    conn.execute(text(DDL_STOCK_INFO.format(tabla="stock_info_v1")))
+    conn.execute(text(
+        f"{_insert_ignore(dialecto)} stock_info_v1 ({COLUMNAS_STOCK_INFO}) "
+        f"select {columnas} from stock_info "
+        f"where Symbol is not null and Fecha is not null{_on_conflict(dialecto)}"
+    ))
+    conn.execute(text("drop table stock_info"))
+    conn.execute(text("alter table stock_info_v1 rename to stock_info"))
+
+
+# VERSION 2: WEEKLY/MONTHLY/YEARLY OHLCV ROLLUP TABLES (resampling.py), FILLED FROM THE EXISTING ROWS
+def _v2_rollups(conn):
+    import resampling
+    resampling.reconstruir(conn)
+
+
+MIGRACIONES = [
+    (1, "stock_info with typed columns and (Symbol, Fecha) primary key", _v1_stock_info),
+    (2, "weekly, monthly and yearly OHLCV rollup tables", _v2_rollups),
+]
+
+
+def _asegurar_tabla_version(conn):
+    conn.execute(text("""create table if not exists schema_version (
+        version integer not null primary key,
+        descripcion varchar(255) not null,
+        aplicada datetime not null
+    )"""))
+
+
+# RETURNS THE HIGHEST APPLIED VERSION (0 FOR A NEW DATABASE)
+def version_actual(engine):
+    with engine.begin() as conn:
+        _asegurar_tabla_version(conn)
+        version = conn.execute(text("select max(version) from schema_version")).scalar()
+    return version or 0
+
+
+# APPLIES EVERY PENDING MIGRATION IN ORDER AND RETURNS THE LIST OF APPLIED VERSIONS
+def migrar(engine, hasta=None):
+    aplicadas = []
+    actual = version_actual(engine)
+    for version, descripcion, funcion in MIGRACIONES:
+        if version <= actual or (hasta is not None and version > hasta):
+            continue
+        with engine.begin() as conn:
+            funcion(conn)
+            conn.execute(
+                text("insert into schema_version (version, descripcion, aplicada) values (:v, :d, :a)"),
+                {"v": version, "d": descripcion, "a": datetime.datetime.now()},
+            )
+        aplicadas.append(version)
+    return aplicadas
+
+
+# OPTIONAL YEARLY RANGE PARTITIONING OF stock_info (MYSQL/MARIADB ONLY)
+# THE PRIMARY KEY ALREADY CONTAINS Fecha, SO PARTITIONING BY YEAR(Fecha) IS ALLOWED.
+# RANGE SCANS OVER A FEW YEARS THEN ONLY TOUCH THE MATCHING PARTITIONS.
+def particionar_por_anio(engine, desde=1999, hasta=None):
+    if engine.dialect.name not in ("mysql", "mariadb"):
+        print(f"PARTITIONING IS ONLY SUPPORTED ON MYSQL/MARIADB, NOT ON {engine.dialect.name.upper()}.")
+        return False
+    hasta = hasta or datetime.date.today().year + 1
+    particiones = ",\n".join(
+        f"partition p{anio} values less than ({anio + 1})" for anio in range(desde, hasta + 1)
+    )
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"alter table stock_info partition by range (year(Fecha)) (\n"
+            f"partition p_old values less than ({desde}),\n{particiones},\n"
+            f"partition p_max values less than maxvalue)"
+        ))
+    return True
+
+
+if __name__ == "__main__":
+    from db import engine
+    print(f"APPLIED MIGRATIONS: {migrar(engine)}. SCHEMA VERSION: {version_actual(engine)}")
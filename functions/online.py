@@ -0,0 +1,372 @@
+# THIS MODULE KEEPS LIVE RISK METRICS PER SYMBOL WITH ONLINE ESTIMATORS
+# EVERY NEW BAR UPDATES THE STATE IN O(1): WELFORD MEAN/VARIANCE OF THE DAILY LOG RETURN,
+# RING BUFFERS FOR THE ROLLING VOLATILITY WINDOWS, RUNNING PEAK/DRAWDOWN AND EWMA VOLATILITY.
+# to_sql FEEDS THE NEW ROWS AFTER EVERY INGESTION AND SAVES A SNAPSHOT (JSON), SO THE METRICS
+# ARE READ WITHOUT QUERYING THE HISTORY. BARS OLDER THAN THE LAST ONE SEEN ARE IGNORED.
+# FINANCE_ONLINE=0 DISABLES IT; FINANCE_ONLINE_STATE CHANGES WHERE THE SNAPSHOT IS KEPT.
+import os
+import json
+import math
+import tempfile
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ACTIVO = os.getenv("FINANCE_ONLINE", "1") != "0"
+RUTA_ESTADO = Path(os.getenv("FINANCE_ONLINE_STATE", BASE_DIR / "cache" / "online_state.json"))
+
+DIAS = 252
+TASA_LIBRE = 0.0425
+VENTANAS = (20, 40, 60, 80, 100)
+VERSION = 1
+
+
+# MEAN AND VARIANCE (ddof=1) WITH WELFORD'S UPDATE; NaN VALUES ARE SKIPPED (LIKE pandas)
+class Welford:
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def actualizar(self, x):
+        if math.isnan(x):
+            return
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (x - self.media)
+
+    # MERGES THE MOMENTS OF ANOTHER ESTIMATOR (CHAN'S PAIRWISE UPDATE)
+    def combinar(self, otro):
+        n = self.n + otro.n
+        if n == 0:
+            return
+        delta = otro.media - self.media
+        self.m2 += otro.m2 + delta * delta * self.n * otro.n / n
+        self.media += delta * otro.n / n
+        self.n = n
+
+    @property
+    def varianza(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.varianza) if self.n > 1 else math.nan
+
+    def estado(self):
+        return {"n": self.n, "media": self.media, "m2": self.m2}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        w = cls()
+        w.n, w.media, w.m2 = estado["n"], estado["media"], estado["m2"]
+        return w
+
+
+# STANDARD DEVIATION (ddof=1) OF THE LAST ventana VALUES KEPT IN A RING BUFFER
+# THE SUMS ARE SHIFTED BY THE FIRST VALUE SEEN (NUMERICALLY STABLE) AND RECOMPUTED FROM THE
+# BUFFER EVERY TIME IT WRAPS, SO THEY NEVER DRIFT AND THE UPDATE STAYS O(1) AMORTIZED.
+# A WINDOW WITH ANY NaN GIVES NaN (LIKE rolling().std())
+class VentanaMovil:
+    def __init__(self, ventana):
+        self.ventana = ventana
+        self.buffer = [math.nan] * ventana
+        self.pos = 0
+        self.llenos = 0
+        self.nulos = 0
+        self.centro = None
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+
+    def actualizar(self, x):
+        if self.centro is None and not math.isnan(x):
+            self.centro = x
+        if self.llenos == self.ventana:
+            self._quitar(self.buffer[self.pos])
+        else:
+            self.llenos += 1
+        self.buffer[self.pos] = x
+        self._agregar(x)
+        self.pos = (self.pos + 1) % self.ventana
+        if self.pos == 0:
+            self._recalcular()
+
+    def _agregar(self, x):
+        if math.isnan(x):
+            self.nulos += 1
+        else:
+            d = x - self.centro
+            self.suma += d
+            self.suma_cuadrados += d * d
+
+    def _quitar(self, x):
+        if math.isnan(x):
+            self.nulos -= 1
+        else:
+            d = x - self.centro
+            self.suma -= d
+            self.suma_cuadrados -= d * d
+
+    def _recalcular(self):
+        valores = [x - self.centro for x in self.buffer if not math.isnan(x)] if self.centro is not None else []
+        self.suma = math.fsum(valores)
+        self.suma_cuadrados = math.fsum(d * d for d in valores)
+
+    @property
+    def std(self):
+        if self.ventana < 2 or self.llenos < self.ventana or self.nulos:
+            return math.nan
+        w = self.ventana
+        return math.sqrt(max((self.suma_cuadrados - self.suma * self.suma / w) / (w - 1), 0.0))
+
+    def estado(self):
+        return {"ventana": self.ventana, "buffer": self.buffer, "pos": self.pos, "llenos": self.llenos,
+                "centro": self.centro}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        v = cls(estado["ventana"])
+        v.buffer, v.pos, v.llenos, v.centro = list(estado["buffer"]), estado["pos"], estado["llenos"], estado["centro"]
+        v.nulos = sum(1 for i, x in enumerate(v.buffer) if math.isnan(x) and (v.llenos == v.ventana or i < v.llenos))
+        v._recalcular()
+        return v
+
+
+# RUNNING PEAK, CURRENT DRAWDOWN AND MAXIMUM DRAWDOWN (%) OF A PRICE SERIES
+class Drawdown:
+    def __init__(self):
+        self.pico = 0.0
+        self.actual = 0.0
+        self.maximo = 0.0
+
+    def actualizar(self, precio):
+        if math.isnan(precio):
+            return
+        self.pico = max(self.pico, precio)
+        self.actual = (precio / self.pico - 1) * 100 if self.pico > precio else 0.0
+        self.maximo = min(self.maximo, self.actual)
+
+    def estado(self):
+        return {"pico": self.pico, "actual": self.actual, "maximo": self.maximo}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        d = cls()
+        d.pico, d.actual, d.maximo = estado["pico"], estado["actual"], estado["maximo"]
+        return d
+
+
+# RISKMETRICS EWMA VARIANCE (ZERO MEAN): var = lam * var + (1 - lam) * r^2
+# THE FIRST RETURN SEEDS THE VARIANCE; NaN RETURNS LEAVE IT UNCHANGED
+class EwmaVol:
+    def __init__(self, lam=0.94):
+        self.lam = lam
+        self.varianza = math.nan
+
+    def actualizar(self, r):
+        if math.isnan(r):
+            return
+        if math.isnan(self.varianza):
+            self.varianza = r * r
+        else:
+            self.varianza = self.lam * self.varianza + (1 - self.lam) * r * r
+
+    @property
+    def std(self):
+        return math.sqrt(self.varianza)
+
+    def estado(self):
+        return {"lam": self.lam, "varianza": self.varianza}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        e = cls(estado["lam"])
+        e.varianza = estado["varianza"]
+        return e
+
+
+# ALL THE ONLINE ESTIMATORS OF ONE SYMBOL. RETURNS ARE ROUNDED TO decimales LIKE IN stats_functions
+class EstimadorSymbol:
+    def __init__(self, symbol, ventanas=VENTANAS, lam=0.94, decimales=2):
+        self.symbol = symbol
+        self.decimales = decimales
+        self.fecha = None          # ISO DATE OF THE LAST BAR
+        self.precio = math.nan
+        self.retorno = math.nan
+        self.barras = 0
+        self.retornos = Welford()
+        self.ventanas = [VentanaMovil(w) for w in ventanas]
+        self.drawdown = Drawdown()
+        self.ewma = EwmaVol(lam)
+
+    # ADDS ONE BAR. RETURNS False (AND CHANGES NOTHING) IF IT IS NOT NEWER THAN THE LAST ONE
+    def actualizar(self, fecha, precio):
+        fecha = str(fecha)[:10]
+        if self.fecha is not None and fecha <= self.fecha:
+            return False
+        precio = float(precio)
+        if self.barras:
+            r = math.log(precio / self.precio) if self.precio > 0 and precio > 0 else math.nan
+            if self.decimales is not None and not math.isnan(r):
+                r = round(r, self.decimales)
+            self.retorno = r
+            self.retornos.actualizar(r)
+            for ventana in self.ventanas:
+                ventana.actualizar(r)
+            self.ewma.actualizar(r)
+        self.drawdown.actualizar(precio)
+        self.fecha, self.precio = fecha, precio
+        self.barras += 1
+        return True
+
+    # CURRENT METRICS WITH THE COLUMN NAMES OF stats_functions
+    def metricas(self, tasa=TASA_LIBRE):
+        anual = self.retornos.media * DIAS if self.retornos.n else math.nan
+        volatilidad = self.retornos.std * math.sqrt(DIAS)
+        fila = {
+            "Empresa": self.symbol,
+            "Fecha": self.fecha,
+            "Cierre": self.precio,
+            "Retorno diario": self.retorno,
+            "Retorno anual": anual,
+            "Volatilidad anualizada": volatilidad,
+            "Ratio sharpe": (anual - tasa) / volatilidad if volatilidad else math.nan,
+            "Pico máximo": self.drawdown.pico,
+            "Drawdown actual": self.drawdown.actual,
+            "MDD %": self.drawdown.maximo,
+        }
+        for ventana in self.ventanas:
+            fila[f"Volatilidad diaria ({ventana.ventana}D)"] = ventana.std
+            fila[f"Volatilidad anualizada ({ventana.ventana}D)"] = ventana.std * math.sqrt(DIAS)
+        fila["Volatilidad EWMA anualizada"] = self.ewma.std * math.sqrt(DIAS)
+        return fila
+
+    def estado(self):
+        return {
+            "symbol": self.symbol, "decimales": self.decimales, "fecha": self.fecha, "precio": self.precio,
+            "retorno": self.retorno, "barras": self.barras, "retornos": self.retornos.estado(),
+            "ventanas": [v.estado() for v in self.ventanas], "drawdown": self.drawdown.estado(),
+            "ewma": self.ewma.estado(),
+        }
+
+    @classmethod
+    def desde_estado(cls, estado):
+        e = cls(estado["symbol"], ventanas=(), decimales=estado["decimales"])
+        e.fecha, e.precio, e.retorno, e.barras = estado["fecha"], estado["precio"], estado["retorno"], estado["barras"]
+        e.retornos = Welford.desde_estado(estado["retornos"])
+        e.ventanas = [VentanaMovil.desde_estado(v) for v in estado["ventanas"]]
+        e.drawdown = Drawdown.desde_estado(estado["drawdown"])
+        e.ewma = EwmaVol.desde_estado(estado["ewma"])
+        return e
+
+
+# THE ESTIMATORS OF EVERY SYMBOL, SHARED BY THE INGESTION PATH AND THE READERS
+class EstimadoresOnline:
+    def __init__(self, ventanas=VENTANAS, lam=0.94, decimales=2):
+        self.ventanas = tuple(ventanas)
+        self.lam = lam
+        self.decimales = decimales
+        self.symbols = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self.symbols
+
+    # FEEDS A stock_info-SHAPED FRAME (Fecha, Symbol, Close_Price). ROWS ARE APPLIED IN DATE ORDER
+    # PER SYMBOL; RETURNS HOW MANY BARS WERE NEW
+    def alimentar(self, df, columna="Close_Price"):
+        if df is None or df.empty:
+            return 0
+        df = df.sort_values(["Symbol", "Fecha"], kind="stable")
+        nuevas = 0
+        with self.lock:
+            for symbol, fecha, precio in zip(df["Symbol"], df["Fecha"], df[columna]):
+                symbol = str(symbol).upper()
+                estimador = self.symbols.get(symbol)
+                if estimador is None:
+                    estimador = EstimadorSymbol(symbol, self.ventanas, self.lam, self.decimales)
+                    self.symbols[symbol] = estimador
+                nuevas += estimador.actualizar(fecha, precio)
+        return nuevas
+
+    # CURRENT METRICS OF THE GIVEN SYMBOLS (OR OF ALL), ONE DICTIONARY PER SYMBOL
+    def metricas(self, symbols=None, tasa=TASA_LIBRE):
+        with self.lock:
+            if symbols is None:
+                symbols = sorted(self.symbols)
+            return [self.symbols[s.upper()].metricas(tasa) for s in symbols if s.upper() in self.symbols]
+
+    def olvidar(self, symbols=None):
+        with self.lock:
+            if symbols is None:
+                self.symbols.clear()
+            for symbol in symbols or ():
+                self.symbols.pop(symbol.upper(), None)
+
+    def snapshot(self):
+        with self.lock:
+            return {"version": VERSION, "ventanas": list(self.ventanas), "lam": self.lam, "decimales": self.decimales,
+                    "symbols": {s: e.estado() for s, e in self.symbols.items()}}
+
+    def restaurar(self, snapshot):
+        if snapshot.get("version") != VERSION:
+            raise ValueError(f"UNSUPPORTED SNAPSHOT VERSION {snapshot.get('version')}.")
+        with self.lock:
+            self.ventanas = tuple(snapshot["ventanas"])
+            self.lam = snapshot["lam"]
+            self.decimales = snapshot["decimales"]
+            self.symbols = {s: EstimadorSymbol.desde_estado(e) for s, e in snapshot["symbols"].items()}
+
+    # WRITES THE SNAPSHOT ATOMICALLY SO A READER NEVER SEES A HALF-WRITTEN FILE
+    def guardar(self, ruta=None):
+        ruta = Path(ruta or RUTA_ESTADO)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, ruta)
+
+    # LOADS THE SNAPSHOT IF IT EXISTS. RETURNS True IF IT WAS LOADED
+    def cargar(self, ruta=None):
+        ruta = Path(ruta or RUTA_ESTADO)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                self.restaurar(json.load(f))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+REGISTRO = EstimadoresOnline()
+_cargado = False
+_lock_carga = threading.Lock()
+
+
+# THE PROCESS-WIDE ESTIMATORS, RESTORED FROM THE SNAPSHOT THE FIRST TIME THEY ARE NEEDED
+def registro():
+    global _cargado
+    with _lock_carga:
+        if not _cargado:
+            try:
+                REGISTRO.cargar()
+            except ValueError as e:
+                print(f"WARNING: ONLINE STATE NOT RESTORED ({e}).")
+            _cargado = True
+    return REGISTRO
+
+
+# CALLED BY to_sql AFTER WRITING df: SYMBOLS WITHOUT STATE ARE FIRST REPLAYED FROM THEIR STORED
+# HISTORY (chunks OF stock_info ORDERED BY Symbol, Fecha), THEN THE NEW BARS ARE APPLIED AND THE
+# SNAPSHOT IS SAVED. RETURNS HOW MANY BARS WERE NEW
+def actualizar_desde_ingesta(df, historia=None):
+    if not ACTIVO or df is None or df.empty:
+        return 0
+    estimadores = registro()
+    sin_estado = [s for s in df["Symbol"].unique() if s not in estimadores]
+    if sin_estado and historia is not None:
+        for chunk in historia(sin_estado):
+            estimadores.alimentar(chunk)
+    nuevas = estimadores.alimentar(df)
+    estimadores.guardar()
+    return nuevas
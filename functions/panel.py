@@ -0,0 +1,182 @@
+# THIS MODULE HOLDS THE COMPACT (DATES x SYMBOLS) PANEL USED BY THE UNIVERSE-WIDE ANALYTICS
+# EVERY FIELD IS ONE DENSE 2-D ARRAY THAT SHARES A SINGLE DATE INDEX AND A SYMBOL DICTIONARY,
+# SO A SYMBOL IS STORED ONCE INSTEAD OF ON EVERY ROW AND NOTHING HAS TO BE PIVOTED.
+# PRICES ARE float64 OR float32 (FINANCE_PANEL_DTYPE), VOLUMES THE SMALLEST INT THAT FITS.
+# presente MARKS THE (DATE, SYMBOL) CELLS THAT EXIST IN stock_info; THE OTHER PRICE CELLS ARE NaN.
+import os
+import numpy as np
+import pandas as pd
+
+PRECIOS = ("Open", "High", "Low", "Close_Price")
+DTYPE = np.dtype(os.getenv("FINANCE_PANEL_DTYPE", "float64"))
+
+
+# SMALLEST SIGNED INT TYPE THAT HOLDS EVERY VOLUME (int32 UNLESS A VALUE DOESN'T FIT)
+def dtype_volumen(maximo):
+    return np.dtype(np.int32) if maximo <= np.iinfo(np.int32).max else np.dtype(np.int64)
+
+
+# RETURNS A COMPACT COPY OF A LONG-FORMAT FRAME: SYMBOL COLUMNS BECOME CATEGORICAL,
+# FLOAT COLUMNS dtype AND VOLUME COLUMNS (WITHOUT NULLS) THE SMALLEST INT THAT FITS
+def compactar(df, dtype=None):
+    dtype = DTYPE if dtype is None else np.dtype(dtype)
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in ("Symbol", "Empresa"):
+            columnas[columna] = serie.astype("category")
+        elif columna in ("Volume", "Volumen") and not serie.isna().any():
+            maximo = int(serie.max()) if len(serie) else 0
+            columnas[columna] = serie.astype(dtype_volumen(maximo))
+        elif pd.api.types.is_float_dtype(serie):
+            columnas[columna] = serie.astype(dtype)
+    return df.assign(**columnas)
+
+
+class Panel:
+    def __init__(self, fechas, symbols, campos, presente):
+        self.fechas = fechas                    # SORTED datetime64[us] ARRAY, ONE PER ROW
+        self.symbols = tuple(symbols)           # ONE PER COLUMN
+        self.indice = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.campos = campos                    # FIELD -> (DATES x SYMBOLS) ARRAY
+        self.presente = presente                # (DATES x SYMBOLS) BOOL ARRAY
+
+    # BUILDS THE PANEL FROM ONE STRUCTURED ARRAY PER SYMBOL (cache.DTYPE, SORTED BY DATE)
+    # THE ARRAYS MAY BE MEMORY-MAPPED: THEIR FIELDS ARE SCATTERED STRAIGHT INTO THE PANEL
+    # SYMBOLS WITHOUT ROWS ARE LEFT OUT; COLUMNS KEEP THE ORDER OF tramos
+    @classmethod
+    def desde_arrays(cls, tramos, dtype=None):
+        dtype = DTYPE if dtype is None else np.dtype(dtype)
+        tramos = {symbol: arr for symbol, arr in tramos.items() if len(arr)}
+        if tramos:
+            fechas = np.unique(np.concatenate([arr["Fecha"] for arr in tramos.values()]))
+        else:
+            fechas = np.empty(0, dtype="datetime64[us]")
+
+        forma = (len(fechas), len(tramos))
+        campos = {campo: np.full(forma, np.nan, dtype=dtype) for campo in PRECIOS}
+        maximo = max((int(arr["Volume"].max()) for arr in tramos.values()), default=0)
+        campos["Volume"] = np.zeros(forma, dtype=dtype_volumen(maximo))
+        presente = np.zeros(forma, dtype=bool)
+        for j, arr in enumerate(tramos.values()):
+            filas = np.searchsorted(fechas, arr["Fecha"])
+            for campo, valores in campos.items():
+                valores[filas, j] = arr[campo]
+            presente[filas, j] = True
+        return cls(fechas, tramos.keys(), campos, presente)
+
+    # BUILDS THE PANEL FROM A LONG-FORMAT FRAME (Fecha, Symbol OR Empresa AND ONE COLUMN PER FIELD)
+    # COLUMNS FOLLOW THE ORDER IN WHICH SYMBOLS FIRST APPEAR. A REPEATED (Fecha, Symbol) KEEPS THE LAST ROW
+    @classmethod
+    def desde_frame(cls, df, dtype=None, columna_symbol=None):
+        dtype = DTYPE if dtype is None else np.dtype(dtype)
+        if columna_symbol is None:
+            columna_symbol = "Symbol" if "Symbol" in df.columns else "Empresa"
+        codigos_fecha, fechas = pd.factorize(pd.to_datetime(df["Fecha"]), sort=True)
+        codigos_symbol, symbols = pd.factorize(df[columna_symbol], sort=False)
+
+        forma = (len(fechas), len(symbols))
+        campos = {}
+        for campo in df.columns.drop(["Fecha", columna_symbol]):
+            serie = df[campo]
+            if pd.api.types.is_integer_dtype(serie):
+                maximo = int(serie.max()) if len(serie) else 0
+                valores = np.zeros(forma, dtype=dtype_volumen(maximo))
+            elif pd.api.types.is_numeric_dtype(serie):
+                valores = np.full(forma, np.nan, dtype=dtype)
+            else:
+                continue
+            valores[codigos_fecha, codigos_symbol] = serie.to_numpy()
+            campos[campo] = valores
+        presente = np.zeros(forma, dtype=bool)
+        presente[codigos_fecha, codigos_symbol] = True
+        return cls(fechas.to_numpy(dtype="datetime64[us]"), list(symbols), campos, presente)
+
+    @property
+    def shape(self):
+        return self.presente.shape
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def empty(self):
+        return self.presente.size == 0
+
+    # BYTES HELD BY THE PANEL (FIELDS, MASK AND DATE INDEX)
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in self.campos.values()) + self.presente.nbytes + self.fechas.nbytes
+
+    # (DATES x SYMBOLS) ARRAY OF A FIELD. IT IS THE PANEL'S OWN ARRAY, NOT A COPY
+    def campo(self, nombre="Close_Price"):
+        return self.campos[nombre]
+
+    # COLUMN VIEW OF ONE SYMBOL (INCLUDING THE NaN CELLS OF THE DATES IT DOESN'T HAVE)
+    def serie(self, symbol, campo="Close_Price"):
+        return self.campos[campo][:, self.indice[symbol.upper()]]
+
+    # SUB-PANEL BETWEEN start_date AND end_date (BOTH INCLUSIVE) THAT SHARES MEMORY WITH THIS ONE
+    def tramo(self, start_date=None, end_date=None):
+        inicio = 0 if start_date is None else np.searchsorted(self.fechas, np.datetime64(start_date, "us"), side="left")
+        fin = len(self.fechas) if end_date is None else np.searchsorted(self.fechas, np.datetime64(end_date, "us"), side="right")
+        campos = {nombre: valores[inicio:fin] for nombre, valores in self.campos.items()}
+        return Panel(self.fechas[inicio:fin], self.symbols, campos, self.presente[inicio:fin])
+
+    # SUB-PANEL OF THE SYMBOLS IN COLUMNS [inicio, fin) THAT SHARES MEMORY WITH THIS ONE
+    def bloque(self, inicio, fin):
+        campos = {nombre: valores[:, inicio:fin] for nombre, valores in self.campos.items()}
+        return Panel(self.fechas, self.symbols[inicio:fin], campos, self.presente[:, inicio:fin])
+
+    # DAILY LOG RETURNS OF A FIELD, BETWEEN CONSECUTIVE ROWS OF EACH SYMBOL (LIKE A shift(1)
+    # INSIDE EVERY COMPANY), ROUNDED TO decimales. DATES A SYMBOL DOESN'T HAVE ARE NaN
+    def retornos(self, campo="Close_Price", decimales=2):
+        precio = self.campos[campo]
+        filas, columnas = precio.shape
+        posicion = np.where(self.presente, np.arange(filas)[:, None], -1)
+        ultima = np.maximum.accumulate(posicion, axis=0) if filas else posicion
+        anterior = np.vstack([np.full((1, columnas), -1), ultima[:-1]])
+        hay = self.presente & (anterior >= 0)
+
+        fila, columna = np.nonzero(hay)
+        actual = precio[fila, columna].astype(np.float64)
+        previo = precio[anterior[fila, columna], columna].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valores = np.log(actual / previo)
+        if decimales is not None:
+            valores = np.round(valores, decimales)
+
+        salida = np.full(precio.shape, np.nan, dtype=precio.dtype)
+        salida[fila, columna] = valores
+        return salida
+
+    # MOVES THE PRESENT CELLS OF EVERY COLUMN OF valores TO THE TOP OF ITS COLUMN, SO ROW i HOLDS THE
+    # i-TH DATE OF EACH SYMBOL AND ROLLING WINDOWS RUN OVER THE SYMBOL'S OWN DATES (NaN BELOW).
+    # RETURNS (STACKED, posicion, fila, columna): EVERY PRESENT CELL IS valores[fila, columna] AND
+    # STACKED[posicion, columna], ORDERED BY SYMBOL AND DATE
+    def apilar(self, valores):
+        columna, fila = np.nonzero(self.presente.T)
+        posicion = np.arange(len(columna)) - np.searchsorted(columna, columna)
+        apilado = np.full(self.shape, np.nan)
+        apilado[posicion, columna] = valores[fila, columna]
+        return apilado, posicion, fila, columna
+
+    # WRAPS A (DATES x SYMBOLS) ARRAY (BY DEFAULT A FIELD) IN A DATAFRAME WITHOUT COPYING IT
+    def frame(self, valores=None, campo="Close_Price"):
+        if valores is None:
+            valores = self.campos[campo]
+        return pd.DataFrame(valores, index=pd.DatetimeIndex(self.fechas, name="Fecha"),
+                            columns=pd.Index(self.symbols, name="Empresa"), copy=False)
+
+    # LONG-FORMAT FRAME OF THE CELLS THAT EXIST, ORDERED BY SYMBOL AND DATE
+    # Symbol IS CATEGORICAL (ITS CATEGORIES ARE THE PANEL'S SYMBOLS) AND THE FIELDS KEEP THEIR DTYPES
+    def largo(self, campos=None):
+        columna, fila = np.nonzero(self.presente.T)
+        datos = {
+            "Fecha": self.fechas[fila],
+            "Symbol": pd.Categorical.from_codes(columna, categories=list(self.symbols)),
+        }
+        for nombre in (self.campos if campos is None else campos):
+            datos[nombre] = self.campos[nombre][fila, columna]
+        return pd.DataFrame(datos)
@@ -1,33 +1,54 @@
 # IMPORTING REQUIRED MODULES
+# SEABORN AND PYPLOT ARE LOADED ON THE FIRST CHART, SO IMPORTING THIS MODULE STAYS CHEAP
+# AND THE MATPLOTLIB BACKEND CAN STILL BE CHOSEN AFTER IT (reports.py USES Agg)
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-from stats_functions import *
+from lazy import importar_diferido
+from instrumentation import instrumentar
+from reports import nombre_figura
+from stats_functions import (
+    GetCompaniesVolumeSpan, GetCompanyVolumeSpan, VolatilidadMovil, GetVariousAdjRet, GetCompaniesCorrInSpan,
+)
 from pathlib import Path
 
+sns = importar_diferido("seaborn")
+plt = importar_diferido("matplotlib.pyplot")
+ticker = importar_diferido("matplotlib.ticker")
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 FIGURES_DIR = BASE_DIR / "reports"
 FIGURES_DIR.mkdir(parents=True, exist_ok=True)
 
+# BUILDS THE OUTPUT PATH OF A CHART: reports.nombre_figura INSIDE FIGURES_DIR
+def RutaFigura(prefijo, companies, start, end):
+    return FIGURES_DIR / nombre_figura(prefijo, companies, start, end)
+
+# SHOWS THE FIGURES ON INTERACTIVE BACKENDS; ON HEADLESS ONES (Agg) IT ONLY FREES THEM
+def MostrarFigura():
+    if plt.get_backend().lower() == "agg":
+        plt.close("all")
+    else:
+        plt.show()
+
 # PLOTS THE MONTHLY VOLUME OF A SINGLE COMPANY IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def PlotVolumeCompany(company, start, end):
     df = GetCompanyVolumeSpan(company, start, end)
     plt.figure(figsize=(10, 6))
     sns.lineplot(x=df['Mes'], y=df['Volumen mensual'], data=df)
     plt.xlabel('Month')
     plt.ylabel('Sales Volume')
-    plt.xticks(range(1, 13))  # ENSURE ALL MONTHS ARE DISPLAYED
+    plt.xticks(rotation=45)
     plt.grid(True)
     # FORMAT Y-AXIS TO DISPLAY NUMBERS WITHOUT SCIENTIFIC NOTATION AND WITH THOUSAND SEPARATORS
     formatter = ticker.FuncFormatter(lambda x, pos: f'{int(x):,}')
     plt.gca().yaxis.set_major_formatter(formatter)
-    plt.savefig(FIGURES_DIR / f"VolumeCompany_{company}_{start}-{end}.png")
-    plt.show()
+    plt.savefig(RutaFigura("VolumeCompany", company, start, end))
+    MostrarFigura()
 
 # PLOTS THE MONTHLY VOLUME OF MULTIPLE COMPANIES IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def PlotVolumeCompanies(companies, start, end):
     df = GetCompaniesVolumeSpan(companies, start, end)
     g = sns.relplot(
@@ -46,11 +67,12 @@ def PlotVolumeCompanies(companies, start, end):
     g.axes[0][0].yaxis.set_major_formatter(formatter)
 
     plt.grid(True)
-    g.fig.savefig(FIGURES_DIR / f"VolumeCompanies_{companies}_{start}-{end}.png", bbox_inches="tight")
-    plt.show()
+    g.fig.savefig(RutaFigura("VolumeCompanies", companies, start, end), bbox_inches="tight")
+    MostrarFigura()
 
 # PLOTS DAILY MOVING VOLATILITY OF MULTIPLE COMPANIES IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def VMDailyGraphCompanies(companies, start_date, end_date):
     data_list = []
     for company in companies:
@@ -79,11 +101,12 @@ def VMDailyGraphCompanies(companies, start_date, end_date):
     plt.legend(title='Company')
     plt.grid(axis='y', linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig(FIGURES_DIR / f"VMDaily_{companies}_{start_date}-{end_date}.png", bbox_inches="tight")
-    plt.show()
+    plt.savefig(RutaFigura("VMDaily", companies, start_date, end_date), bbox_inches="tight")
+    MostrarFigura()
 
 # PLOTS YEARLY MOVING VOLATILITY OF MULTIPLE COMPANIES IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def VMYearlyGraphCompanies(companies, start_date, end_date):
     data_list = []
     for company in companies:
@@ -112,11 +135,12 @@ def VMYearlyGraphCompanies(companies, start_date, end_date):
     plt.legend(title='Company')
     plt.grid(axis='y', linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig(FIGURES_DIR / f"VMYearly_{companies}_{start_date}-{end_date}.png", bbox_inches="tight")
-    plt.show()
+    plt.savefig(RutaFigura("VMYearly", companies, start_date, end_date), bbox_inches="tight")
+    MostrarFigura()
 
 # PLOTS DAILY RETURNS OF MULTIPLE COMPANIES IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def PlotRetornoCompanies(companies, start, end):
     df = GetVariousAdjRet(companies, start, end)
 
@@ -139,11 +163,12 @@ def PlotRetornoCompanies(companies, start, end):
     g.set_ylabels('Daily Return')
     g.axes[0][0].grid(True)
 
-    g.fig.savefig(FIGURES_DIR / f"Return_{companies}_{start}-{end}.png", bbox_inches="tight")
-    plt.show()
+    g.fig.savefig(RutaFigura("Return", companies, start, end), bbox_inches="tight")
+    MostrarFigura()
 
 # PLOTS CORRELATION MATRIX OF MULTIPLE COMPANIES IN A GIVEN TIME PERIOD
 
+@instrumentar("plot")
 def PlotCorrInSpanCompanies(companies, start, end):
     df = GetCompaniesCorrInSpan(companies, start, end)
 
@@ -152,11 +177,12 @@ def PlotCorrInSpanCompanies(companies, start, end):
     plt.title(f"Correlation Between Companies [{start[0]}-{start[1]}-{start[2]} / {end[0]}-{end[1]}-{end[2]}]")
     plt.grid(False)
     plt.tight_layout()
-    plt.savefig(FIGURES_DIR / f"CorrInSpan_{companies}_{start}-{end}.png", bbox_inches="tight")
-    plt.show()
+    plt.savefig(RutaFigura("CorrInSpan", companies, start, end), bbox_inches="tight")
+    MostrarFigura()
 
 # PLOTS DAILY RETURN DISTRIBUTION (HISTOGRAM) FOR MULTIPLE COMPANIES
 
+@instrumentar("plot")
 def PlotHistRetornos(companies, start, end):
     df = GetVariousAdjRet(companies, start, end)
 
@@ -176,5 +202,5 @@ def PlotHistRetornos(companies, start, end):
     plt.xlabel('Daily Return')
     plt.grid(True)
     plt.tight_layout()
-    plt.savefig(FIGURES_DIR / f"HistRetornos_{companies}_{start}-{end}.png", bbox_inches="tight")
-    plt.show()
+    plt.savefig(RutaFigura("HistRetornos", companies, start, end), bbox_inches="tight")
+    MostrarFigura()
@@ -0,0 +1,124 @@
+# THIS MODULE IS THE BATCHED PORTFOLIO ENGINE
+# A WEIGHTS MATRIX (PORTFOLIOS x SYMBOLS) IS EVALUATED AT ONCE WITH MATRIX PRODUCTS AGAINST THE
+# MEAN VECTOR AND COVARIANCE OF THE DAILY LOG RETURNS, SO 100.000 PORTFOLIOS COST A FEW GEMMs.
+# DRAWDOWNS NEED THE DAILY PATH OF EVERY PORTFOLIO AND ARE COMPUTED IN BLOCKS OF PORTFOLIOS.
+# THE MONTE CARLO FRONTIER DRAWS RANDOM LONG-ONLY WEIGHTS IN CHUNKS AND ONLY KEEPS THE BEST
+# PORTFOLIO OF EVERY RETURN BUCKET, SO ITS MEMORY DOESN'T GROW WITH THE NUMBER OF DRAWS.
+import numpy as np
+import pandas as pd
+
+DIAS = 252
+TASA_LIBRE = 0.0425
+
+
+# MEAN VECTOR AND COVARIANCE MATRIX OF A (DATES x SYMBOLS) RETURNS ARRAY
+# ONLY DATES WHERE EVERY SYMBOL HAS A RETURN ARE USED, SO THE COVARIANCE IS ALWAYS POSITIVE SEMI-DEFINITE
+def momentos(retornos):
+    x = np.asarray(retornos, dtype=np.float64)
+    x = x[~np.isnan(x).any(axis=1)]
+    if len(x) < 2:
+        raise ValueError("AT LEAST 2 DATES WITH RETURNS FOR EVERY SYMBOL ARE NEEDED.")
+    media = x.mean(axis=0)
+    centrado = x - media
+    covarianza = centrado.T @ centrado / (len(x) - 1)
+    return media, covarianza
+
+
+# NORMALIZES A WEIGHTS MATRIX: ONE PORTFOLIO PER ROW, ONE COLUMN PER SYMBOL
+def _pesos(pesos, n_symbols):
+    w = np.atleast_2d(np.asarray(pesos, dtype=np.float64))
+    if w.shape[1] != n_symbols:
+        raise ValueError(f"THE WEIGHTS HAVE {w.shape[1]} COLUMNS BUT THERE ARE {n_symbols} SYMBOLS.")
+    return w
+
+
+# ANNUALIZED RETURN, VOLATILITY AND SHARPE OF EVERY PORTFOLIO (ROWS OF pesos)
+# VARIANCES ARE THE ROW-WISE QUADRATIC FORMS w' COV w, COMPUTED AS ONE MATRIX PRODUCT
+def estadisticas(pesos, media, covarianza, tasa=TASA_LIBRE):
+    w = _pesos(pesos, len(media))
+    retorno = w @ media * DIAS
+    varianza = np.einsum("ij,ij->i", w @ covarianza, w)
+    volatilidad = np.sqrt(np.maximum(varianza, 0.0) * DIAS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (retorno - tasa) / volatilidad
+    return retorno, volatilidad, sharpe
+
+
+# MAXIMUM DRAWDOWN (%) OF EVERY PORTFOLIO, REBALANCED DAILY TO ITS WEIGHTS
+# THE (PORTFOLIOS x DATES) LOG-WEALTH PATHS ARE BUILT bloque PORTFOLIOS AT A TIME, ONE PATH PER
+# CONTIGUOUS ROW SO THE RUNNING SUM AND MAXIMUM WALK MEMORY IN ORDER. A MISSING RETURN COUNTS AS 0
+def max_drawdown(pesos, retornos, bloque=4096):
+    w = _pesos(pesos, np.shape(retornos)[1])
+    simples = np.expm1(np.nan_to_num(np.asarray(retornos, dtype=np.float64))).T.copy()
+    salida = np.empty(len(w))
+    for inicio in range(0, len(w), bloque):
+        diario = w[inicio:inicio + bloque] @ simples
+        with np.errstate(divide='ignore', invalid='ignore'):
+            riqueza = np.cumsum(np.log1p(diario), axis=1)
+        pico = np.maximum(np.maximum.accumulate(riqueza, axis=1), 0.0)
+        salida[inicio:inicio + bloque] = np.expm1((riqueza - pico).min(axis=1, initial=0.0)) * 100
+    return salida
+
+
+# RETURN, VOLATILITY, SHARPE AND MAXIMUM DRAWDOWN OF EVERY PORTFOLIO, ONE ROW PER PORTFOLIO
+def AnalizarPortafolios(pesos, retornos, tasa=TASA_LIBRE, bloque=4096):
+    media, covarianza = momentos(retornos)
+    retorno, volatilidad, sharpe = estadisticas(pesos, media, covarianza, tasa)
+    return pd.DataFrame({
+        "Retorno anual": retorno,
+        "Volatilidad anualizada": volatilidad,
+        "Ratio sharpe": sharpe,
+        "MDD %": max_drawdown(pesos, retornos, bloque),
+    })
+
+
+# RANDOM LONG-ONLY PORTFOLIOS IN CHUNKS: YIELDS (WEIGHTS, RETURN, VOLATILITY, SHARPE) bloque AT A TIME
+# WEIGHTS ARE UNIFORM ON THE SIMPLEX (DIRICHLET(1)), SO EVERY ROW SUMS TO 1
+def MonteCarloStream(media, covarianza, n_portafolios, bloque=20_000, seed=0, tasa=TASA_LIBRE):
+    rng = np.random.default_rng(seed)
+    for inicio in range(0, n_portafolios, bloque):
+        n = min(bloque, n_portafolios - inicio)
+        w = rng.dirichlet(np.ones(len(media)), size=n)
+        yield (w, *estadisticas(w, media, covarianza, tasa))
+
+
+# MONTE CARLO EFFICIENT FRONTIER: THE ANNUALIZED RETURN RANGE IS SPLIT IN puntos BUCKETS AND ONLY
+# THE MINIMUM-VOLATILITY PORTFOLIO OF EACH BUCKET (PLUS THE MAXIMUM SHARPE ONE) IS KEPT WHILE
+# THE CHUNKS ARE CONSUMED. RETURNS ONE ROW PER NON-EMPTY BUCKET ORDERED BY RETURN AND THE
+# MAXIMUM SHARPE PORTFOLIO, BOTH WITH ONE WEIGHT COLUMN PER SYMBOL
+def FronteraEficiente(media, covarianza, symbols, n_portafolios=100_000, bloque=20_000, puntos=50,
+                      seed=0, tasa=TASA_LIBRE):
+    n_symbols = len(media)
+    bordes = np.linspace(media.min() * DIAS, media.max() * DIAS, puntos + 1)
+    mejor_vol = np.full(puntos, np.inf)
+    mejor = np.full((puntos, n_symbols + 3), np.nan)   # PESOS, RETORNO, VOLATILIDAD, SHARPE
+    maximo = np.full(n_symbols + 3, np.nan)
+    maximo_sharpe = -np.inf
+
+    for w, retorno, volatilidad, sharpe in MonteCarloStream(media, covarianza, n_portafolios, bloque, seed, tasa):
+        filas = np.column_stack([w, retorno, volatilidad, sharpe])
+        cubeta = np.clip(np.searchsorted(bordes, retorno, side="right") - 1, 0, puntos - 1)
+
+        #EL PRIMERO DE CADA CUBETA TRAS ORDENAR POR (CUBETA, VOLATILIDAD) ES EL DE MENOR VOLATILIDAD
+        orden = np.lexsort((volatilidad, cubeta))
+        primeros = orden[np.r_[True, cubeta[orden][1:] != cubeta[orden][:-1]]]
+        mejores = primeros[volatilidad[primeros] < mejor_vol[cubeta[primeros]]]
+        mejor_vol[cubeta[mejores]] = volatilidad[mejores]
+        mejor[cubeta[mejores]] = filas[mejores]
+
+        k = np.nanargmax(sharpe) if np.isfinite(sharpe).any() else None
+        if k is not None and sharpe[k] > maximo_sharpe:
+            maximo_sharpe = sharpe[k]
+            maximo = filas[k]
+
+    columnas = list(symbols) + ["Retorno anual", "Volatilidad anualizada", "Ratio sharpe"]
+    frontera = pd.DataFrame(mejor[np.isfinite(mejor_vol)], columns=columnas)
+    frontera = frontera[columnas[-3:] + list(symbols)]
+
+    #SOLO LA PARTE EFICIENTE: CADA PUNTO DEBE TENER MENOS VOLATILIDAD QUE TODOS LOS DE MAYOR RETORNO
+    posterior = np.minimum.accumulate(frontera["Volatilidad anualizada"].to_numpy()[::-1])[::-1]
+    eficiente = frontera["Volatilidad anualizada"].to_numpy() <= posterior
+    frontera = frontera[eficiente].reset_index(drop=True)
+
+    sharpe_maximo = pd.DataFrame([maximo], columns=columnas)[columnas[-3:] + list(symbols)]
+    return frontera, sharpe_maximo
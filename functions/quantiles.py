@@ -0,0 +1,221 @@
+# THIS MODULE IS THE ROLLING VaR / EXPECTED SHORTFALL ENGINE OVER (DATES x SYMBOLS) RETURNS
+# EXACT MODE: THE RETURNS OF EVERY SYMBOL ARE INDEXED ONCE IN AN ORDER-STATISTIC STRUCTURE (A WAVELET
+# MATRIX OVER THEIR RANKS, WITH PREFIX SUMS PER LEVEL). THE k-TH SMALLEST RETURN OF ANY WINDOW AND
+# THE SUM OF THE k SMALLEST ARE THEN FOUND IN O(log n) WITHOUT SORTING THE WINDOW, AND ALL THE
+# WINDOWS OF A BLOCK OF SYMBOLS ARE ANSWERED TOGETHER WITH NUMPY (NO LOOP OVER DAYS).
+# APPROXIMATE MODE: P-SQUARE (JAIN & CHLAMTAC) MARKERS PER SYMBOL AND LEVEL, O(1) MEMORY AND TIME
+# PER DAY; IT ESTIMATES THE QUANTILE OF THE WHOLE HISTORY SEEN SO FAR (EXPANDING, NOT ROLLING).
+# VaR IS THE LOSS AT THE GIVEN LEVEL (-QUANTILE) AND ES THE AVERAGE LOSS OF THE WORST ceil(q * n) DAYS.
+import math
+import numpy as np
+
+NIVELES = (0.01, 0.05)
+
+
+# WAVELET MATRIX OF THE RANKS OF SEVERAL SERIES (ONE PER ROW). EVERY LEVEL SPLITS THE SEQUENCE
+# BY ONE BIT OF THE RANK (ZEROS FIRST, STABLE) AND KEEPS THE PREFIX COUNT OF ZEROS AND THE
+# PREFIX SUM OF THE VALUES THAT GO TO THE ZEROS
+class _MatrizOrden:
+    def __init__(self, rango, valores):
+        series, n = rango.shape
+        self.bits = max(1, (n - 1).bit_length())
+        self.ceros, self.sumas, self.total_ceros = [], [], []
+        posiciones = np.arange(n)[None, :]
+        for nivel in range(self.bits):
+            cero = ((rango >> (self.bits - 1 - nivel)) & 1) == 0
+            ceros = np.zeros((series, n + 1), dtype=np.int32)
+            np.cumsum(cero, axis=1, out=ceros[:, 1:])
+            sumas = np.zeros((series, n + 1))
+            np.cumsum(np.where(cero, valores, 0.0), axis=1, out=sumas[:, 1:])
+            total = ceros[:, -1:]
+            destino = np.where(cero, ceros[:, :-1], total + posiciones - ceros[:, :-1])
+            siguiente_rango = np.empty_like(rango)
+            siguiente_valor = np.empty_like(valores)
+            np.put_along_axis(siguiente_rango, destino, rango, axis=1)
+            np.put_along_axis(siguiente_valor, destino, valores, axis=1)
+            rango, valores = siguiente_rango, siguiente_valor
+            self.ceros.append(ceros)
+            self.sumas.append(sumas)
+            self.total_ceros.append(total)
+
+    # RANK OF THE k-TH SMALLEST (k 0-INDEXED) IN THE RANGES [inicio, fin) OF EVERY ROW AND THE SUM
+    # OF THE VALUES SMALLER THAN IT (ONLY IF con_suma). inicio, fin AND k ARE (SERIES x QUERIES) ARRAYS
+    def k_esimo(self, inicio, fin, k, con_suma=True):
+        series, n = self.ceros[0].shape
+        desplazamiento = (np.arange(series) * n)[:, None]
+        inicio = inicio + desplazamiento
+        fin = fin + desplazamiento
+        rango = np.zeros(inicio.shape, dtype=np.int64)
+        acumulado = np.zeros(inicio.shape) if con_suma else None
+        for nivel in range(self.bits):
+            ceros = self.ceros[nivel].ravel()
+            ci = ceros.take(inicio)
+            cf = ceros.take(fin)
+            en_ceros = cf - ci
+            izquierda = k < en_ceros
+            if con_suma:
+                sumas = self.sumas[nivel].ravel()
+                acumulado += np.where(izquierda, 0.0, sumas.take(fin) - sumas.take(inicio))
+            k = np.where(izquierda, k, k - en_ceros)
+            total = self.total_ceros[nivel]
+            inicio = np.where(izquierda, ci + desplazamiento, total + inicio - ci)
+            fin = np.where(izquierda, cf + desplazamiento, total + fin - cf)
+            rango = (rango << 1) | ~izquierda
+        return rango, acumulado
+
+
+# ROLLING VaR AND ES OF EVERY COLUMN OVER WINDOWS OF ventana DAYS (EXACT, LINEAR INTERPOLATION
+# BETWEEN ORDER STATISTICS LIKE rolling().quantile()). A WINDOW WITH ANY MISSING RETURN IS NaN.
+# SYMBOLS ARE INDEXED bloque AT A TIME TO BOUND MEMORY (~12 BYTES x DATES x log2(DATES) EACH).
+# RETURNS {LEVEL: (VaR, ES)} WITH TWO (DATES x SYMBOLS) ARRAYS PER LEVEL
+def VaRVentana(retornos, ventana, niveles=NIVELES, bloque=64):
+    x = np.asarray(retornos, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    filas, columnas = x.shape
+    salida = {q: (np.full(x.shape, np.nan), np.full(x.shape, np.nan)) for q in niveles}
+    if ventana < 1 or filas < ventana:
+        return salida
+
+    #ESTADÍSTICAS DE ORDEN QUE NECESITA CADA NIVEL (0-INDEXADAS): DOS PARA INTERPOLAR Y LA COLA DEL ES
+    planes = {}
+    for q in niveles:
+        posicion = q * (ventana - 1)
+        bajo = int(math.floor(posicion))
+        planes[q] = (bajo, min(bajo + 1, ventana - 1), posicion - bajo, max(1, math.ceil(q * ventana)))
+    necesarios = sorted({k for k1, k2, _, m in planes.values() for k in (k1, k2, m - 1)})
+    fin = np.arange(ventana, filas + 1)
+
+    for desde in range(0, columnas, bloque):
+        xb = x[:, desde:desde + bloque].T
+        series = len(xb)
+        valido = ~np.isnan(xb)
+
+        #RANGO DE CADA RETORNO DENTRO DE SU SERIE (LOS NaN QUEDAN AL FINAL)
+        orden = np.argsort(np.where(valido, xb, np.inf), axis=1, kind="stable")
+        rango = np.empty_like(orden)
+        np.put_along_axis(rango, orden, np.broadcast_to(np.arange(filas), orden.shape), axis=1)
+        ordenados = np.take_along_axis(xb, orden, axis=1)
+        matriz = _MatrizOrden(rango, np.where(valido, xb, 0.0))
+
+        conteo = np.zeros((series, filas + 1), dtype=np.int64)
+        np.cumsum(valido, axis=1, out=conteo[:, 1:])
+        completo = (conteo[:, fin] - conteo[:, fin - ventana]) == ventana
+
+        inicio = np.broadcast_to(fin - ventana, (series, len(fin)))
+        final = np.broadcast_to(fin, (series, len(fin)))
+        colas_necesarias = {m - 1 for _, _, _, m in planes.values()}
+        valores, colas = {}, {}
+        for k in necesarios:
+            r, acumulado = matriz.k_esimo(inicio, final, np.full((series, len(fin)), k), k in colas_necesarias)
+            valores[k] = np.take_along_axis(ordenados, np.minimum(r, filas - 1), axis=1)
+            if k in colas_necesarias:
+                colas[k] = acumulado + valores[k]
+
+        for q, (k1, k2, fraccion, m) in planes.items():
+            cuantil = valores[k1] + (valores[k2] - valores[k1]) * fraccion
+            salida[q][0][ventana - 1:, desde:desde + bloque] = np.where(completo, -cuantil, np.nan).T
+            salida[q][1][ventana - 1:, desde:desde + bloque] = np.where(completo, -colas[m - 1] / m, np.nan).T
+    return salida
+
+
+# P-SQUARE ESTIMATORS FOR MANY SERIES AT ONCE. q HOLDS THE QUANTILE OF EVERY SERIES, SO SEVERAL
+# QUANTILES OF THE SAME SYMBOLS SHARE ONE UPDATE. THE 5 MARKERS ARE THE ROWS OF (5 x SERIES) ARRAYS,
+# SO EVERY STEP WORKS ON CONTIGUOUS ROWS. THE FIRST 5 VALUES OF A SERIES ARE KEPT AS ITS MARKERS;
+# NaN VALUES ARE SKIPPED
+class P2Cuantil:
+    def __init__(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        self.q = q
+        self.alturas = np.full((5, len(q)), np.nan)
+        self.posiciones = np.tile(np.arange(1.0, 6.0)[:, None], (1, len(q)))
+        self.incremento = np.vstack([np.zeros_like(q), q / 2, q, (1 + q) / 2, np.ones_like(q)])
+        self.deseadas = 1 + 4 * self.incremento
+        self.n = np.zeros(len(q), dtype=np.int64)
+
+    def actualizar(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        valido = ~np.isnan(x)
+
+        #ARRANQUE: LOS PRIMEROS 5 VALORES SE GUARDAN TAL CUAL Y SE ORDENAN AL COMPLETARSE
+        inicio = valido & (self.n < 5)
+        if inicio.any():
+            series = np.flatnonzero(inicio)
+            self.alturas[self.n[series], series] = x[series]
+            listos = inicio & (self.n == 4)
+            self.alturas[:, listos] = np.sort(self.alturas[:, listos], axis=0)
+
+        m = valido & (self.n >= 5)
+        self.n += valido
+        if not m.any():
+            return
+        todas = m.all()
+        if todas:
+            h, n, d, xm, inc = self.alturas, self.posiciones, self.deseadas, x, self.incremento
+        else:
+            h, n, d = self.alturas[:, m], self.posiciones[:, m], self.deseadas[:, m]
+            xm, inc = x[m], self.incremento[:, m]
+
+        #CELDA DEL NUEVO VALOR, AMPLIANDO LOS EXTREMOS SI CAE FUERA
+        np.minimum(h[0], xm, out=h[0])
+        np.maximum(h[4], xm, out=h[4])
+        for i in (1, 2, 3):
+            n[i] += xm < h[i]
+        n[4] += 1
+        d += inc
+
+        #AJUSTE PARABÓLICO (O LINEAL SI SE SALE DEL ORDEN) DE LOS 3 MARCADORES CENTRALES
+        for i in (1, 2, 3):
+            delta = d[i] - n[i]
+            adelante = n[i + 1] - n[i]
+            atras = n[i - 1] - n[i]
+            mover = ((delta >= 1) & (adelante > 1)) | ((delta <= -1) & (atras < -1))
+            if not mover.any():
+                continue
+            s = np.where(delta > 0, 1.0, -1.0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolico = h[i] + s / (adelante - atras) * (
+                    (s - atras) * (h[i + 1] - h[i]) / adelante + (adelante - s) * (h[i] - h[i - 1]) / -atras)
+                lineal = np.where(s > 0, h[i] + (h[i + 1] - h[i]) / adelante, h[i] - (h[i - 1] - h[i]) / atras)
+            nuevo = np.where((h[i - 1] < parabolico) & (parabolico < h[i + 1]), parabolico, lineal)
+            h[i] = np.where(mover, nuevo, h[i])
+            n[i] += np.where(mover, s, 0.0)
+
+        if not todas:
+            self.alturas[:, m], self.posiciones[:, m], self.deseadas[:, m] = h, n, d
+
+    # CURRENT ESTIMATE (THE MIDDLE MARKER); WITH FEWER THAN 5 VALUES, THE EXACT QUANTILE OF THE ONES SEEN
+    @property
+    def valor(self):
+        salida = self.alturas[2].copy()
+        for serie in np.flatnonzero(self.n < 5):
+            salida[serie] = np.quantile(self.alturas[:self.n[serie], serie], self.q[serie]) if self.n[serie] else np.nan
+        return salida
+
+
+# APPROXIMATE VaR AND ES OF EVERY COLUMN OVER ALL THE DAYS SEEN SO FAR, IN O(1) PER DAY.
+# ES = (1/q) * INTEGRAL OF THE QUANTILE FUNCTION FROM 0 TO q, BY THE MIDPOINT RULE OVER nodos
+# EXTRA P-SQUARE QUANTILES INSIDE THE TAIL (q/8, 3q/8, 5q/8, 7q/8 WITH 4 NODES).
+# RETURNS {LEVEL: (VaR, ES)} LIKE VaRVentana; THE FIRST minimo DAYS OF EVERY SERIES ARE NaN
+def VaRAproximado(retornos, niveles=NIVELES, minimo=20, nodos=4):
+    x = np.asarray(retornos, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    filas, columnas = x.shape
+    niveles = list(niveles)
+    var = np.full((len(niveles), filas, columnas), np.nan)
+    es = np.full((len(niveles), filas, columnas), np.nan)
+
+    #UNA SERIE POR (NIVEL, CUANTIL, SÍMBOLO): EL CUANTIL DEL NIVEL Y LOS NODOS DE SU COLA SE ACTUALIZAN JUNTOS
+    cuantiles = [[q] + [q * (i + 0.5) / nodos for i in range(nodos)] for q in niveles]
+    estimador = P2Cuantil(np.repeat(np.ravel(cuantiles), columnas))
+    forma = (len(niveles), nodos + 1, columnas)
+    for t in range(filas):
+        estimador.actualizar(np.tile(x[t], len(niveles) * (nodos + 1)))
+        listo = estimador.n[:columnas] >= minimo
+        if not listo.any():
+            continue
+        h = estimador.alturas[2].reshape(forma)
+        var[:, t] = np.where(listo, -h[:, 0], np.nan)
+        es[:, t] = np.where(listo, -h[:, 1:].mean(axis=1), np.nan)
+    return {q: (var[j], es[j]) for j, q in enumerate(niveles)}
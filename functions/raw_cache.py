@@ -0,0 +1,244 @@
+# THIS MODULE KEEPS THE RAW ALPHAVANTAGE RESPONSES ON DISK, COMPRESSED AND CONTENT-ADDRESSED
+# EVERY RESPONSE IS STORED ONCE UNDER THE SHA-256 OF ITS BYTES (objetos/ab/abcd...z, zlib) AND AN
+# INDEX MAPS (FUNCTION, SYMBOL, OUTPUTSIZE, TRADING DATE OF THE DATA) TO ITS DIGEST, SO A RERUN ON THE
+# SAME TRADING DATE IS SERVED FROM DISK INSTEAD OF SPENDING THE API QUOTA AGAIN, AND stock_info CAN BE
+# REBUILT OFFLINE FROM THE STORED PAYLOADS (reproducir). ENTRIES OLDER THAN THE TTL ARE DROPPED AND
+# THE LEAST RECENTLY USED ONES ARE EVICTED WHEN THE OBJECTS EXCEED THE SIZE LIMIT.
+# FINANCE_RAW_CACHE=0 DISABLES LOOKUPS AND WRITES DURING DOWNLOADS (REPLAY STILL READS THE STORE).
+import os
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+import datetime
+import threading
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ACTIVO = os.getenv("FINANCE_RAW_CACHE", "1") != "0"
+RAW_DIR = Path(os.getenv("FINANCE_RAW_CACHE_DIR", BASE_DIR / "cache" / "raw"))
+TTL_DIAS = float(os.getenv("FINANCE_RAW_CACHE_TTL_DAYS", "90"))
+MAX_BYTES = int(float(os.getenv("FINANCE_RAW_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+WORKERS = int(os.getenv("FINANCE_RAW_CACHE_WORKERS", "0")) or os.cpu_count() or 1
+NIVEL = 6
+VERSION = 1
+
+
+# TRADING DATE A REQUEST MADE ON hoy BELONGS TO: THE LAST BUSINESS DAY ON OR BEFORE IT
+def fecha_operacion(hoy=None):
+    hoy = np.datetime64(hoy or datetime.date.today(), "D")
+    return str(np.busday_offset(hoy, 0, roll="backward"))
+
+
+# TRADING DATE THE DATA OF A DAILY PAYLOAD REACHES: ITS NEWEST ROW, OR "3. Last Refreshed" WITHOUT ROWS
+# None IF IT HAS NEITHER. A RESPONSE IS STORED UNDER THIS DATE, NOT UNDER fecha_operacion(): BEFORE
+# THE DAY'S CLOSE IS PUBLISHED THE API STILL ANSWERS WITH THE PREVIOUS SESSION, AND FILING THAT
+# UNDER TODAY WOULD SERVE IT FOR THE REST OF THE DAY
+def fecha_datos(info):
+    serie = info.get("Time Series (Daily)") or {}
+    if serie:
+        return max(serie)[:10]
+    refrescado = (info.get("Meta Data") or {}).get("3. Last Refreshed")
+    return str(refrescado)[:10] if refrescado else None
+
+
+def clave(funcion, symbol, outputsize, fecha):
+    return f"{funcion}|{symbol.upper()}|{outputsize}|{fecha}"
+
+
+class Almacen:
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.lock = threading.Lock()
+        self.entradas = None                    # CLAVE -> {digest, bytes, creado, usado}
+        self.cambios = False
+
+    def _ruta_indice(self):
+        return self.directorio / "indice.json"
+
+    def ruta_objeto(self, digest):
+        return self.directorio / "objetos" / digest[:2] / f"{digest}.z"
+
+    # THE INDEX IS READ ON FIRST USE; A MISSING OR UNREADABLE INDEX STARTS EMPTY
+    def _indice(self):
+        if self.entradas is None:
+            try:
+                with open(self._ruta_indice(), "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                self.entradas = datos["entradas"] if datos.get("version") == VERSION else {}
+            except (FileNotFoundError, ValueError, KeyError):
+                self.entradas = {}
+        return self.entradas
+
+    # RAW BYTES STORED FOR THE REQUEST, OR None ON A MISS OR AN EXPIRED ENTRY
+    def buscar(self, funcion, symbol, outputsize, fecha, ttl_dias=None):
+        ttl = TTL_DIAS if ttl_dias is None else ttl_dias
+        with self.lock:
+            entrada = self._indice().get(clave(funcion, symbol, outputsize, fecha))
+            if entrada is None or (ttl and time.time() - entrada["creado"] > ttl * 86400):
+                return None
+            entrada["usado"] = time.time()
+            self.cambios = True
+        try:
+            return self.leer(entrada["digest"])
+        except (OSError, zlib.error):
+            return None
+
+    # DECOMPRESSED BYTES OF AN OBJECT
+    def leer(self, digest):
+        with open(self.ruta_objeto(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    # STORES THE RAW BYTES OF A RESPONSE. IDENTICAL BYTES ARE WRITTEN ONCE; RETURNS THEIR DIGEST
+    def guardar(self, funcion, symbol, outputsize, fecha, contenido):
+        digest = hashlib.sha256(contenido).hexdigest()
+        ruta = self.ruta_objeto(digest)
+        if ruta.exists():
+            tamanio = ruta.stat().st_size
+        else:
+            comprimido = zlib.compress(contenido, NIVEL)
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(comprimido)
+            os.replace(tmp, ruta)
+            tamanio = len(comprimido)
+        ahora = time.time()
+        with self.lock:
+            self._indice()[clave(funcion, symbol, outputsize, fecha)] = {
+                "digest": digest, "bytes": tamanio, "creado": ahora, "usado": ahora,
+            }
+            self.cambios = True
+        return digest
+
+    # STORED ENTRIES AS (FUNCTION, SYMBOL, OUTPUTSIZE, TRADING DATE, DIGEST), OLDEST TRADING DATE FIRST
+    def listar(self, symbols=None, funcion=None):
+        buscados = None if symbols is None else {s.upper() for s in symbols}
+        with self.lock:
+            filas = [tuple(k.split("|")) + (e["digest"],) for k, e in self._indice().items()]
+        filas = [f for f in filas if (buscados is None or f[1] in buscados) and (funcion is None or f[0] == funcion)]
+        return sorted(filas, key=lambda f: (f[3], f[2] != "full"))
+
+    # DROPS EXPIRED ENTRIES, THEN THE LEAST RECENTLY USED ONES UNTIL THE OBJECTS FIT IN max_bytes,
+    # AND DELETES THE OBJECTS NO ENTRY POINTS TO. RETURNS (ENTRIES DROPPED, BYTES FREED)
+    def podar(self, ttl_dias=None, max_bytes=None):
+        ttl = TTL_DIAS if ttl_dias is None else ttl_dias
+        maximo = MAX_BYTES if max_bytes is None else max_bytes
+        ahora = time.time()
+        with self.lock:
+            entradas = self._indice()
+            quitar = [k for k, e in entradas.items() if ttl and ahora - e["creado"] > ttl * 86400]
+            for k in quitar:
+                del entradas[k]
+
+            #LOS OBJETOS COMPARTIDOS CUENTAN UNA VEZ; SE DESALOJA POR ÚLTIMO USO
+            tamanios = {e["digest"]: e["bytes"] for e in entradas.values()}
+            referencias = Counter(e["digest"] for e in entradas.values())
+            total = sum(tamanios.values())
+            for k in sorted(entradas, key=lambda k: entradas[k]["usado"]):
+                if total <= maximo:
+                    break
+                digest = entradas.pop(k)["digest"]
+                quitar.append(k)
+                referencias[digest] -= 1
+                if not referencias[digest]:
+                    total -= tamanios[digest]
+
+            vivos = {e["digest"] for e in entradas.values()}
+            self.cambios = self.cambios or bool(quitar)
+
+        liberado = 0
+        for ruta in (self.directorio / "objetos").glob("*/*.z"):
+            if ruta.stem not in vivos:
+                liberado += ruta.stat().st_size
+                ruta.unlink(missing_ok=True)
+        return len(quitar), liberado
+
+    # WRITES THE INDEX ATOMICALLY IF IT CHANGED
+    def escribir_indice(self):
+        with self.lock:
+            if not self.cambios:
+                return
+            datos = {"version": VERSION, "entradas": dict(self._indice())}
+            self.cambios = False
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(tmp, self._ruta_indice())
+
+    # TOTAL COMPRESSED BYTES AND NUMBER OF ENTRIES AND OBJECTS
+    def resumen(self):
+        with self.lock:
+            entradas = self._indice()
+            tamanios = {e["digest"]: e["bytes"] for e in entradas.values()}
+        return {"entradas": len(entradas), "objetos": len(tamanios), "bytes": sum(tamanios.values())}
+
+
+_ALMACENES = {}
+_LOCK_ALMACENES = threading.Lock()
+
+
+# STORE OF THE CURRENT RAW_DIR (ONE INSTANCE PER DIRECTORY, SO RAW_DIR CAN BE POINTED ELSEWHERE)
+def almacen(directorio=None):
+    directorio = Path(directorio or RAW_DIR)
+    with _LOCK_ALMACENES:
+        if directorio not in _ALMACENES:
+            _ALMACENES[directorio] = Almacen(directorio)
+        return _ALMACENES[directorio]
+
+
+# PARSES THE PAYLOADS OF A GROUP OF SYMBOLS INSIDE A WORKER PROCESS
+# EVERY TASK IS (SYMBOL, [DIGESTS OLDEST FIRST]): A DATE PRESENT IN SEVERAL PAYLOADS KEEPS THE NEWEST ONE
+def _reproducir_grupo(directorio, tareas):
+    import pandas as pd
+    from main import parse_daily_payload
+
+    tienda = Almacen(directorio)
+    partes = []
+    for symbol, digests in tareas:
+        frames = []
+        for digest in digests:
+            try:
+                info = json.loads(tienda.leer(digest))
+            except (OSError, zlib.error, ValueError) as e:
+                print(f"WARNING: CACHED PAYLOAD {digest[:12]} OF {symbol} IS UNREADABLE ({e}).")
+                continue
+            if isinstance(info, dict) and "Time Series (Daily)" in info:
+                frames.append(parse_daily_payload(symbol, info["Time Series (Daily)"]))
+        frames = [f for f in frames if not f.empty]
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+            partes.append(df.drop_duplicates(subset=["Fecha"], keep="last"))
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+
+# REBUILDS THE get_data_daily FRAME FROM THE STORED PAYLOADS, WITHOUT NETWORK ACCESS
+# symbols=None REPLAYS EVERY CACHED SYMBOL. GROUPS OF grupo SYMBOLS ARE DECOMPRESSED AND PARSED IN
+# workers PROCESSES (workers=1 PARSES IN THIS PROCESS)
+def reproducir(symbols=None, funcion=None, workers=None, grupo=32):
+    import pandas as pd
+
+    tienda = almacen()
+    porsymbol = {}
+    for _, symbol, _, _, digest in tienda.listar(symbols, funcion):
+        porsymbol.setdefault(symbol, []).append(digest)
+    tareas = list(porsymbol.items())
+    grupos = [tareas[i:i + grupo] for i in range(0, len(tareas), grupo)]
+
+    workers = min(WORKERS if workers is None else workers, len(grupos))
+    if workers <= 1:
+        partes = [_reproducir_grupo(tienda.directorio, g) for g in grupos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partes = list(pool.map(_reproducir_grupo, [tienda.directorio] * len(grupos), grupos))
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,178 @@
+# THIS MODULE GENERATES THE CHARTS OF plot_functions IN BATCH, WITHOUT A DISPLAY
+# A JOB SPEC (report_jobs.yaml) LISTS (CHARTS, SYMBOLS, SPAN). EVERY SPEC IS RENDERED BY ONE
+# WORKER OF A PROCESS POOL ON THE Agg BACKEND, SO ITS DATA IS FETCHED ONCE (THE MEMO IN
+# stats_functions SHARES IT BETWEEN CHARTS) AND FIGURES ARE FREED AFTER EACH CHART.
+# CHARTS WHOSE FILE EXISTS AND WHOSE INPUTS DID NOT CHANGE ARE SKIPPED.
+# RUN IT WITH: python reports.py [report_jobs.yaml]
+import os
+import sys
+import json
+import time
+import hashlib
+import datetime
+import warnings
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+# CHART NAME -> (plot_functions FUNCTION, FILE PREFIX)
+CHARTS = {
+    "VolumeCompany": ("PlotVolumeCompany", "VolumeCompany"),
+    "VolumeCompanies": ("PlotVolumeCompanies", "VolumeCompanies"),
+    "VMDaily": ("VMDailyGraphCompanies", "VMDaily"),
+    "VMYearly": ("VMYearlyGraphCompanies", "VMYearly"),
+    "Return": ("PlotRetornoCompanies", "Return"),
+    "CorrInSpan": ("PlotCorrInSpanCompanies", "CorrInSpan"),
+    "HistRetornos": ("PlotHistRetornos", "HistRetornos"),
+}
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MANIFIESTO = ".manifest.json"
+
+
+# FILE NAME OF A CHART: <PREFIX>_<COMPANIES>_<START>-<END>.png (plot_functions.RutaFigura PUTS IT IN FIGURES_DIR)
+def nombre_figura(prefijo, companies, start, end):
+    return f"{prefijo}_{companies}_{start}-{end}.png"
+
+
+# LOADS THE JOB SPECS FROM YAML AND NORMALIZES THEM
+# SYMBOLS AND DATES BECOME TUPLES SO FILE NAMES MATCH THE ONES plot_functions ALWAYS PRODUCED
+def cargar_jobs(ruta_archivo):
+    with open(ruta_archivo, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    jobs = []
+    for job in config.get("jobs", []):
+        symbols = job["symbols"]
+        jobs.append({
+            "charts": list(job.get("charts", CHARTS)),
+            "symbols": symbols if isinstance(symbols, str) else tuple(symbols),
+            "start": tuple(job["start"]),
+            "end": tuple(job["end"]),
+        })
+    return jobs
+
+
+def _lista(symbols):
+    return [symbols] if isinstance(symbols, str) else list(symbols)
+
+
+# FINGERPRINT OF THE INPUT DATA OF A SPEC: ROW COUNT, FIRST AND LAST DATE AND THE SUMS OF EVERY PRICE
+# AND THE VOLUME OF EVERY SYMBOL IN THE SPAN. THE SUMS CATCH ROWS THE UPSERT CORRECTED IN PLACE
+# (SAME COUNT AND DATES, NEW VALUES). RETURNS NONE IF THE DATABASE CAN'T BE QUERIED (THEN NOTHING IS SKIPPED)
+def huella_datos(spec, engine):
+    from sqlalchemy import text, bindparam
+    try:
+        query = text("""select Symbol, count(*), min(Fecha), max(Fecha), sum(Open), sum(High), sum(Low),
+                    sum(Close_Price), sum(Volume) from `stock_info`
+                    where (Symbol in :companies) and (Fecha between :start_date and :end_date)
+                    group by Symbol order by Symbol;""").bindparams(bindparam("companies", expanding=True))
+        with engine.connect() as conn:
+            filas = conn.execute(query, {
+                "companies": [s.upper() for s in _lista(spec["symbols"])],
+                "start_date": datetime.date(*spec["start"]),
+                "end_date": datetime.date(*spec["end"]),
+            }).fetchall()
+        return hashlib.sha1(json.dumps([list(map(str, f)) for f in filas]).encode()).hexdigest()
+    except Exception:
+        return None
+
+
+def _leer_manifiesto(figures_dir):
+    try:
+        with open(Path(figures_dir) / MANIFIESTO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _guardar_manifiesto(figures_dir, manifiesto):
+    with open(Path(figures_dir) / MANIFIESTO, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+
+
+# RUNS ONCE IN EVERY WORKER: HEADLESS BACKEND AND OUTPUT DIRECTORY
+def _iniciar_worker(figures_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    warnings.filterwarnings("ignore", category=UserWarning)
+    import plot_functions
+    plot_functions.FIGURES_DIR = Path(figures_dir)
+
+
+# RENDERS EVERY CHART OF ONE SPEC INSIDE A WORKER
+# RETURNS ONE RESULT PER CHART WITH ITS PATH, TIME AND ERROR (IF ANY)
+def _render_spec(spec, charts):
+    import matplotlib.pyplot as plt
+    import plot_functions
+
+    resultados = []
+    for chart in charts:
+        nombre_funcion, prefijo = CHARTS[chart]
+        inicio = time.perf_counter()
+        error = None
+        try:
+            getattr(plot_functions, nombre_funcion)(spec["symbols"], spec["start"], spec["end"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            plt.close("all")
+        ruta = plot_functions.RutaFigura(prefijo, spec["symbols"], spec["start"], spec["end"])
+        resultados.append({"chart": chart, "ruta": str(ruta), "segundos": time.perf_counter() - inicio,
+                           "error": error})
+    return resultados
+
+
+# GENERATES ALL THE CHARTS OF THE JOB SPECS IN A PROCESS POOL AND RETURNS ONE RESULT PER CHART
+# forzar=True RENDERS EVERYTHING EVEN IF THE OUTPUT IS UP TO DATE
+def generar_reportes(jobs, max_workers=None, figures_dir=None, forzar=False, engine=None):
+    if figures_dir is None:
+        figures_dir = BASE_DIR / "reports"
+    Path(figures_dir).mkdir(parents=True, exist_ok=True)
+    if engine is None:
+        from db import engine
+
+    manifiesto = _leer_manifiesto(figures_dir)
+    tareas = []
+    omitidos = []
+    for spec in jobs:
+        huella = huella_datos(spec, engine)
+        pendientes = []
+        for chart in spec["charts"]:
+            if chart not in CHARTS:
+                print(f"UNKNOWN CHART '{chart}'. USE ONE OF {list(CHARTS)}.")
+                continue
+            ruta = Path(figures_dir) / nombre_figura(CHARTS[chart][1], spec["symbols"], spec["start"], spec["end"])
+            if not forzar and huella is not None and ruta.exists() and manifiesto.get(ruta.name) == huella:
+                omitidos.append({"chart": chart, "ruta": str(ruta), "segundos": 0.0, "error": None, "omitido": True})
+            else:
+                pendientes.append(chart)
+        if pendientes:
+            tareas.append((spec, pendientes, huella))
+
+    resultados = list(omitidos)
+    # SPAWN: WORKERS MUST NOT INHERIT THE PARENT'S DATABASE CONNECTIONS
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto,
+                             initializer=_iniciar_worker, initargs=(str(figures_dir),)) as pool:
+        futuros = [(pool.submit(_render_spec, spec, charts), huella) for spec, charts, huella in tareas]
+        for futuro, huella in futuros:
+            for resultado in futuro.result():
+                resultado["omitido"] = False
+                if resultado["error"] is None and huella is not None and Path(resultado["ruta"]).exists():
+                    manifiesto[Path(resultado["ruta"]).name] = huella
+                resultados.append(resultado)
+
+    _guardar_manifiesto(figures_dir, manifiesto)
+    return resultados
+
+
+if __name__ == "__main__":
+    ruta_jobs = sys.argv[1] if len(sys.argv) > 1 else "report_jobs.yaml"
+    inicio = time.perf_counter()
+    resultados = generar_reportes(cargar_jobs(ruta_jobs), max_workers=os.cpu_count())
+    for r in resultados:
+        estado = "SKIPPED" if r["omitido"] else ("ERROR " + r["error"] if r["error"] else f"{r['segundos']:.2f}s")
+        print(f"{r['chart']:<16} {estado}  {Path(r['ruta']).name}")
+    print(f"{len(resultados)} CHARTS IN {time.perf_counter() - inicio:.2f}s")
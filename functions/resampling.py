@@ -0,0 +1,201 @@
+# THIS MODULE BUILDS WEEKLY, MONTHLY AND YEARLY OHLCV BARS FROM THE DAILY ROWS OF stock_info
+# A BAR IS THE FIRST OPEN, MAXIMUM HIGH, MINIMUM LOW, LAST CLOSE AND TOTAL VOLUME OF ONE SYMBOL
+# IN ONE CALENDAR PERIOD (WEEKS START ON MONDAY); THE ROWS OF A (SYMBOL, PERIOD) ARE CONTIGUOUS
+# ONCE SORTED, SO EVERY AGGREGATE IS ONE reduceat OVER THE WHOLE FRAME.
+# THE BARS ARE MATERIALIZED IN ONE ROLLUP TABLE PER FREQUENCY (migrations.py VERSION 2). to_sql
+# REBUILDS ONLY THE PERIODS ITS NEW ROWS TOUCH, SO A MULTI-YEAR CHART READS A FEW ROWS PER SYMBOL.
+# RUN IT WITH: python resampling.py   (REBUILDS EVERY ROLLUP FROM stock_info)
+import numpy as np
+import pandas as pd
+from lazy import importar_diferido
+
+# SQLALCHEMY IS ONLY NEEDED BY THE ROLLUP TABLES; RESAMPLING A FRAME NEVER LOADS IT
+sql = importar_diferido("sqlalchemy")
+
+TABLAS = {"W": "stock_info_weekly", "M": "stock_info_monthly", "Y": "stock_info_yearly"}
+COLUMNAS = ["Symbol", "Periodo", "Open", "High", "Low", "Close_Price", "Volume", "Dias", "Ultima"]
+
+DDL_ROLLUP = """create table {tabla} (
+    Symbol varchar(16) not null,
+    Periodo date not null,
+    Open double,
+    High double,
+    Low double,
+    Close_Price double,
+    Volume bigint,
+    Dias integer,
+    Ultima date,
+    primary key (Symbol, Periodo)
+)"""
+
+
+def _validar(frecuencia):
+    if frecuencia not in TABLAS:
+        raise ValueError(f"UNKNOWN FREQUENCY '{frecuencia}'. USE 'W', 'M' OR 'Y'.")
+    return TABLAS[frecuencia]
+
+
+# FIRST DAY OF THE PERIOD OF EVERY DATE (datetime64[D])
+def periodo(fechas, frecuencia):
+    _validar(frecuencia)
+    dias = np.asarray(fechas, dtype="datetime64[D]")
+    if frecuencia == "W":
+        # 1970-01-01 WAS A THURSDAY: (DAYS + 3) % 7 IS THE WEEKDAY WITH MONDAY = 0
+        return dias - ((dias.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    unidad = "datetime64[M]" if frecuencia == "M" else "datetime64[Y]"
+    return dias.astype(unidad).astype("datetime64[D]")
+
+
+# LAST DAY OF THE PERIOD OF EVERY DATE (datetime64[D])
+def fin_periodo(fechas, frecuencia):
+    inicio = periodo(fechas, frecuencia)
+    if frecuencia == "W":
+        return inicio + np.timedelta64(6, "D")
+    unidad = "datetime64[M]" if frecuencia == "M" else "datetime64[Y]"
+    return ((inicio.astype(unidad) + 1).astype("datetime64[D]") - np.timedelta64(1, "D"))
+
+
+# BARS OF A stock_info-SHAPED FRAME (Fecha, Symbol, Open, High, Low, Close_Price, Volume)
+# ONE ROW PER (Symbol, Periodo) ORDERED BY SYMBOL AND PERIOD, WITH THE NUMBER OF TRADING DAYS (Dias)
+# AND THE LAST TRADING DATE (Ultima) OF THE BAR. HIGH/LOW SKIP NaN PRICES
+def resamplear(df, frecuencia="M"):
+    _validar(frecuencia)
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS)
+    df = df.assign(Fecha=pd.to_datetime(df["Fecha"])).sort_values(["Symbol", "Fecha"], kind="stable")
+    fechas = df["Fecha"].to_numpy(dtype="datetime64[D]")
+    codigos, symbols = pd.factorize(df["Symbol"], sort=False)
+    periodos = periodo(fechas, frecuencia)
+
+    nuevo = np.r_[True, (codigos[1:] != codigos[:-1]) | (periodos[1:] != periodos[:-1])]
+    inicios = np.flatnonzero(nuevo)
+    finales = np.r_[inicios[1:], len(df)] - 1
+
+    return pd.DataFrame({
+        "Symbol": np.asarray(symbols, dtype=object)[codigos[inicios]],
+        "Periodo": pd.to_datetime(periodos[inicios]),
+        "Open": df["Open"].to_numpy(dtype=np.float64)[inicios],
+        "High": np.fmax.reduceat(df["High"].to_numpy(dtype=np.float64), inicios),
+        "Low": np.fmin.reduceat(df["Low"].to_numpy(dtype=np.float64), inicios),
+        "Close_Price": df["Close_Price"].to_numpy(dtype=np.float64)[finales],
+        "Volume": np.add.reduceat(df["Volume"].fillna(0).to_numpy(dtype=np.int64), inicios),
+        "Dias": finales - inicios + 1,
+        "Ultima": pd.to_datetime(fechas[finales]),
+    })
+
+
+def crear_tablas(conn):
+    inspector = sql.inspect(conn)
+    for tabla in TABLAS.values():
+        if not inspector.has_table(tabla):
+            conn.execute(sql.text(DDL_ROLLUP.format(tabla=tabla)))
+
+
+# TRUE IF THE ROLLUP TABLE OF frecuencia EXISTS
+def hay_rollup(engine, frecuencia="M"):
+    return sql.inspect(engine).has_table(_validar(frecuencia))
+
+
+# TRUE IF THE ROLLUP OF frecuencia EXISTS AND COVERS stock_info FOR EVERY SYMBOL: ITS FIRST PERIOD
+# AND LAST TRADING DATE MATCH THE FIRST AND LAST Fecha. ROWS WRITTEN OUTSIDE to_sql (bulk_write,
+# MANUAL LOADS) LEAVE IT BEHIND UNTIL actualizar OR reconstruir RUNS
+def al_dia(engine, frecuencia, symbols):
+    if not hay_rollup(engine, frecuencia):
+        return False
+    tabla = TABLAS[frecuencia]
+    params = {"symbols": list(symbols)}
+    with engine.connect() as conn:
+        diarios = pd.read_sql(sql.text("""select Symbol, min(Fecha) as inicio, max(Fecha) as fin from stock_info
+                        where Symbol in :symbols group by Symbol""").bindparams(sql.bindparam("symbols", expanding=True)),
+                              conn, params=params)
+        barras = pd.read_sql(sql.text(f"""select Symbol, min(Periodo) as inicio, max(Ultima) as fin from {tabla}
+                        where Symbol in :symbols group by Symbol""").bindparams(sql.bindparam("symbols", expanding=True)),
+                             conn, params=params)
+    diarios = diarios.set_index("Symbol").sort_index()
+    barras = barras.set_index("Symbol").reindex(diarios.index)
+    esperado_inicio = periodo(pd.to_datetime(diarios["inicio"]).to_numpy(), frecuencia)
+    cubre = bool((pd.to_datetime(barras["inicio"]).to_numpy(dtype="datetime64[D]") == esperado_inicio).all()
+                 and (pd.to_datetime(barras["fin"]).to_numpy(dtype="datetime64[D]")
+                      == pd.to_datetime(diarios["fin"]).to_numpy(dtype="datetime64[D]")).all())
+    if not cubre:
+        print(f"WARNING: {tabla} IS BEHIND stock_info, RESAMPLING THE DAILY ROWS. REBUILD IT WITH python resampling.py")
+    return cubre
+
+
+# ROW DICTIONARIES WITH PLAIN PYTHON VALUES (DATES AS date, NaN AS None) FOR THE DB DRIVER
+def _registros(barras):
+    columnas = {}
+    for c in COLUMNAS:
+        serie = barras[c]
+        if c in ("Periodo", "Ultima"):
+            columnas[c] = [v.date() for v in serie]
+        else:
+            columnas[c] = serie.astype(object).where(serie.notna(), None).tolist()
+    return [dict(zip(COLUMNAS, fila)) for fila in zip(*columnas.values())]
+
+
+# REPLACES THE BARS OF EVERY SYMBOL FROM desde[SYMBOL] ON (desde: {SYMBOL: FIRST PERIOD}) WITH barras
+def escribir_barras(conn, frecuencia, barras, desde):
+    tabla = _validar(frecuencia)
+    borrar = [{"Symbol": symbol, "Periodo": pd.Timestamp(inicio).date()} for symbol, inicio in desde.items()]
+    if borrar:
+        conn.execute(sql.text(f"delete from {tabla} where Symbol = :Symbol and Periodo >= :Periodo"), borrar)
+    filas = _registros(barras)
+    if filas:
+        conn.execute(sql.text(f"insert into {tabla} ({', '.join(COLUMNAS)}) values "
+                          f"({', '.join(':' + c for c in COLUMNAS)})"), filas)
+    return len(filas)
+
+
+def _diarios(conn, symbols, desde=None):
+    filtro = "" if desde is None else " and Fecha >= :desde"
+    query = sql.text(f"""select Fecha, Symbol, Open, High, Low, Close_Price, Volume from stock_info
+                where Symbol in :symbols{filtro} order by Symbol, Fecha;""").bindparams(sql.bindparam("symbols", expanding=True))
+    params = {"symbols": list(symbols)}
+    if desde is not None:
+        params["desde"] = pd.Timestamp(desde).date()
+    return pd.read_sql(query, conn, params=params)
+
+
+# REBUILDS EVERY BAR OF THE GIVEN SYMBOLS (ALL SYMBOLS IF NONE) FROM stock_info, lote SYMBOLS AT A TIME
+# RETURNS THE NUMBER OF BARS WRITTEN
+def reconstruir(conn, symbols=None, lote=100):
+    crear_tablas(conn)
+    if symbols is None:
+        symbols = [fila[0] for fila in conn.execute(sql.text("select distinct Symbol from stock_info"))]
+    escritas = 0
+    for i in range(0, len(symbols), lote):
+        grupo = list(symbols[i:i + lote])
+        diarios = _diarios(conn, grupo)
+        for frecuencia in TABLAS:
+            conn.execute(sql.text(f"delete from {TABLAS[frecuencia]} where Symbol in :symbols")
+                         .bindparams(sql.bindparam("symbols", expanding=True)), {"symbols": grupo})
+            escritas += escribir_barras(conn, frecuencia, resamplear(diarios, frecuencia), {})
+    return escritas
+
+
+# INCREMENTAL UPDATE AFTER AN INGESTION: df HOLDS THE NEW DAILY ROWS (ALREADY IN stock_info)
+# ONLY THE PERIODS FROM THE EARLIEST NEW DATE OF EACH SYMBOL ON ARE REBUILT, READING THE DAILY
+# ROWS SINCE THE EARLIEST OF THOSE PERIOD STARTS (A WEEK CAN START IN THE PREVIOUS YEAR).
+# RETURNS THE NUMBER OF BARS WRITTEN
+def actualizar(engine, df):
+    if df.empty:
+        return 0
+    primeras = pd.to_datetime(df["Fecha"]).groupby(df["Symbol"]).min()
+    escritas = 0
+    with engine.begin() as conn:
+        crear_tablas(conn)
+        inicio = min(periodo(primeras.to_numpy(), frecuencia).min() for frecuencia in TABLAS)
+        diarios = _diarios(conn, primeras.index, inicio)
+        diarios["Fecha"] = pd.to_datetime(diarios["Fecha"])
+        for frecuencia in TABLAS:
+            desde = pd.Series(pd.to_datetime(periodo(primeras.to_numpy(), frecuencia)), index=primeras.index)
+            afectados = diarios[diarios["Fecha"] >= diarios["Symbol"].map(desde)]
+            escritas += escribir_barras(conn, frecuencia, resamplear(afectados, frecuencia), desde.to_dict())
+    return escritas
+
+
+if __name__ == "__main__":
+    from db import engine
+    with engine.begin() as conn:
+        print(f"ROLLUPS REBUILT: {reconstruir(conn)} BARS.")
@@ -0,0 +1,298 @@
+# THIS MODULE IS A LONG-LIVED, LOCAL HTTP/JSON SERVICE OVER stats_functions AND plot_functions
+# ONE PROCESS KEEPS THE ENGINE'S CONNECTION POOL, THE LOCAL COLUMNAR CACHE AND THE MEMOIZED
+# ANALYTICS WARM BETWEEN REQUESTS, SO A DASHBOARD REFRESH DOESN'T PAY IMPORTS, CONNECTIONS OR
+# COLD QUERIES AGAIN. THE asyncio LOOP ONLY PARSES HTTP: ANALYTICS RUN IN A THREAD POOL AND CHARTS
+# IN ONE THREAD (PYPLOT IS NOT THREAD-SAFE). IDENTICAL REQUESTS IN FLIGHT SHARE ONE COMPUTATION AND
+# ENCODED ANSWERS ARE REUSED FOR A WHILE. to_sql RUNS IN ANOTHER PROCESS AND CAN'T CLEAR THIS
+# PROCESS'S MEMOIZED ANALYTICS, SO THE ENCODED ANSWERS AND THE MEMOIZED RESULTS BOTH EXPIRE AFTER
+# HALF OF FINANCE_SERVICE_TTL: NEW ROWS ARE SERVED WITHIN TTL SECONDS, OR AT ONCE AFTER /invalidate.
+# ENDPOINTS (GET, companies=IBM,MSFT&start=2020-01-01&end=2020-12-31):
+#   /returns  /volatility (&ventanas=20,60)  /drawdowns  /correlation  /chart/<CHART>  (PNG, reports.CHARTS)
+#   /invalidate (&companies= OPTIONAL)  /health  /stats
+# RUN IT WITH: python service.py [--port 8765] [--workers 8] [--sqlite stock_info.db] [--calentar IBM,MSFT]
+#   (--sqlite SERVES A SQLITE stock_info FILE INSTEAD OF DATABASE_FINANCE, E.G. THE ONE load_test.py BUILDS)
+import os
+import json
+import time
+import asyncio
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import cache
+import memo
+from instrumentation import registrar_error
+
+HOST = os.getenv("FINANCE_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.getenv("FINANCE_SERVICE_PORT", "8765"))
+WORKERS = int(os.getenv("FINANCE_SERVICE_WORKERS", "0")) or min(32, (os.cpu_count() or 1) + 4)
+TTL = float(os.getenv("FINANCE_SERVICE_TTL", "60"))
+RESPUESTAS = int(os.getenv("FINANCE_SERVICE_CACHE_SIZE", "256"))
+GRAFICOS = int(os.getenv("FINANCE_SERVICE_CHART_CACHE_SIZE", "64"))
+
+ESTADOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+# INVALID PARAMETERS OF A REQUEST (ANSWERED WITH A 400)
+class ErrorPeticion(ValueError):
+    pass
+
+
+def _fecha(texto, nombre):
+    try:
+        fecha = datetime.date.fromisoformat(texto)
+    except (TypeError, ValueError):
+        raise ErrorPeticion(f"'{nombre}' MUST BE A YYYY-MM-DD DATE.")
+    return (fecha.year, fecha.month, fecha.day)
+
+
+# COMPANIES AND SPAN OF A QUERY STRING AS (TUPLE OF SYMBOLS, START TUPLE, END TUPLE)
+def parametros(query):
+    companies = tuple(dict.fromkeys(s.strip().upper() for s in query.get("companies", "").split(",") if s.strip()))
+    if not companies:
+        raise ErrorPeticion("'companies' IS REQUIRED (COMMA-SEPARATED SYMBOLS).")
+    return companies, _fecha(query.get("start"), "start"), _fecha(query.get("end"), "end")
+
+
+def _json(valor):
+    return json.dumps(valor, default=str).encode("utf-8")
+
+
+# LONG FRAMES ARE ANSWERED AS A LIST OF RECORDS (NaN AS null, DATES IN ISO FORMAT)
+def _registros(df):
+    import pandas as pd
+    if not isinstance(df, pd.DataFrame):
+        return _json({"mensaje": df})
+    return df.to_json(orient="records", date_format="iso").encode("utf-8")
+
+
+def _returns(query):
+    import stats_functions as sf
+    return _registros(sf.GetVariousAdjRet(*parametros(query)))
+
+
+def _volatility(query):
+    import stats_functions as sf
+    try:
+        ventanas = tuple(int(v) for v in query.get("ventanas", "20,40,60,80,100,252").split(","))
+    except ValueError:
+        raise ErrorPeticion("'ventanas' MUST BE COMMA-SEPARATED INTEGERS.")
+    return _registros(sf.GetVolatilityTermStructure(*parametros(query), ventanas=ventanas))
+
+
+def _drawdowns(query):
+    import stats_functions as sf
+    return _registros(sf.GetDrawdownEpisodes(*parametros(query)))
+
+
+# THE CORRELATION MATRIX KEEPS ITS SHAPE: {"columns": [...], "index": [...], "data": [[...]]}
+def _correlation(query):
+    import stats_functions as sf
+    return sf.GetCompaniesCorrInSpan(*parametros(query)).to_json(orient="split").encode("utf-8")
+
+
+OPERACIONES = {
+    "/returns": _returns,
+    "/volatility": _volatility,
+    "/drawdowns": _drawdowns,
+    "/correlation": _correlation,
+}
+
+
+class Servicio:
+    def __init__(self, workers=None):
+        self.analitica = ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix="analitica")
+        self.graficos = ThreadPoolExecutor(max_workers=1, thread_name_prefix="graficos")
+        self.en_curso = {}                     # KEY -> asyncio.Future OF THE REQUEST BEING COMPUTED
+        self.png = memo.MemoLRU(GRAFICOS)      # CHART FILE -> (DATA FINGERPRINT, PNG BYTES)
+        self.respuestas = memo.MemoLRU(RESPUESTAS, max_edad=TTL / 2)   # KEY -> ENCODED ANSWER
+        memo.CACHE.max_edad = TTL / 2
+        self.contadores = {"peticiones": 0, "coalescidas": 0, "errores": 0}
+        self.inicio = time.time()
+        self.servidor = None
+
+    # LOADS THE HEAVY MODULES, OPENS A POOLED CONNECTION AND READS THE GIVEN SYMBOLS INTO THE LOCAL CACHE
+    def calentar(self, symbols=()):
+        import matplotlib
+        matplotlib.use("Agg")
+        import plot_functions
+        from db import get_engine
+
+        # THE DEFERRED MODULES ARE LOADED ON THEIR FIRST ATTRIBUTE ACCESS
+        plot_functions.plt.get_backend()
+        plot_functions.sns.__version__
+        engine = get_engine()
+        with engine.connect():
+            pass
+        for symbol in symbols:
+            cache.leer_symbol(symbol.upper(), engine)
+
+    # RENDERS A CHART (IN THE CHART THREAD) OR RETURNS THE PNG OF THE LAST RENDER IF ITS DATA DIDN'T CHANGE
+    def _grafico(self, nombre, query):
+        import reports
+        import plot_functions
+        from db import get_engine
+
+        if nombre not in reports.CHARTS:
+            raise ErrorPeticion(f"UNKNOWN CHART '{nombre}'. USE ONE OF {list(reports.CHARTS)}.")
+        companies, start, end = parametros(query)
+        funcion, prefijo = reports.CHARTS[nombre]
+        symbols = companies[0] if nombre == "VolumeCompany" else companies
+        spec = {"symbols": symbols, "start": start, "end": end}
+
+        ruta = plot_functions.RutaFigura(prefijo, symbols, start, end)
+        huella = reports.huella_datos(spec, get_engine())
+        encontrado, guardado = self.png.get(ruta)
+        if huella is not None and encontrado and guardado[0] == huella:
+            return guardado[1]
+        try:
+            getattr(plot_functions, funcion)(symbols, start, end)
+        finally:
+            plot_functions.plt.close("all")
+        contenido = ruta.read_bytes()
+        grupo = [symbols] if isinstance(symbols, str) else symbols
+        self.png.put(ruta, frozenset(s.upper() for s in grupo), (huella, contenido))
+        return contenido
+
+    def _invalidar(self, query):
+        symbols = [s.strip().upper() for s in query.get("companies", "").split(",") if s.strip()] or None
+        memo.CACHE.invalidar(symbols)
+        cache.invalidar(symbols)
+        self.respuestas.invalidar(symbols)
+        self.png.invalidar(symbols)
+        return _json({"invalidados": symbols or "ALL"})
+
+    def _stats(self):
+        return _json({
+            **self.contadores,
+            "en_curso": len(self.en_curso),
+            "memo": memo.CACHE.stats(),
+            "respuestas": self.respuestas.stats(),
+            "graficos": self.png.stats(),
+            "segundos_activo": round(time.time() - self.inicio, 1),
+        })
+
+    # RUNS funcion IN executor ONCE FOR ALL THE CONCURRENT REQUESTS WITH THE SAME KEY
+    async def _coalescer(self, clave, executor, funcion, *args):
+        futuro = self.en_curso.get(clave)
+        if futuro is None:
+            futuro = asyncio.get_running_loop().run_in_executor(executor, funcion, *args)
+            self.en_curso[clave] = futuro
+            futuro.add_done_callback(lambda _: self.en_curso.pop(clave, None))
+        else:
+            self.contadores["coalescidas"] += 1
+        return await asyncio.shield(futuro)
+
+    # RETURNS (STATUS, CONTENT TYPE, BODY) FOR A REQUEST
+    async def despachar(self, metodo, objetivo):
+        if metodo != "GET":
+            return 405, "application/json", _json({"error": "ONLY GET IS SUPPORTED."})
+        partes = urlsplit(objetivo)
+        ruta = partes.path.rstrip("/") or "/"
+        query = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        clave = (ruta, tuple(sorted(query.items())))
+        try:
+            if ruta == "/health":
+                return 200, "application/json", _json({"estado": "ok"})
+            if ruta == "/stats":
+                return 200, "application/json", self._stats()
+            if ruta == "/invalidate":
+                return 200, "application/json", self._invalidar(query)
+            if ruta in OPERACIONES:
+                encontrado, cuerpo = self.respuestas.get(clave)
+                if encontrado:
+                    return 200, "application/json", cuerpo
+                cuerpo = await self._coalescer(clave, self.analitica, OPERACIONES[ruta], query)
+                self.respuestas.put(clave, frozenset(parametros(query)[0]), cuerpo)
+                return 200, "application/json", cuerpo
+            if ruta.startswith("/chart/"):
+                cuerpo = await self._coalescer(clave, self.graficos, self._grafico, ruta[len("/chart/"):], query)
+                return 200, "image/png", cuerpo
+            return 404, "application/json", _json({"error": f"UNKNOWN PATH '{ruta}'."})
+        except ErrorPeticion as e:
+            return 400, "application/json", _json({"error": str(e)})
+        except Exception as e:
+            registrar_error(e)
+            self.contadores["errores"] += 1
+            return 500, "application/json", _json({"error": f"{type(e).__name__}: {e}"})
+
+    # ONE KEEP-ALIVE CONNECTION: READS REQUESTS AND WRITES THE ANSWERS IN ORDER
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                metodo, objetivo, version = linea.decode("latin-1").split()
+                cabeceras = {}
+                while True:
+                    cabecera = await reader.readline()
+                    if cabecera in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                if cabeceras.get("content-length"):
+                    await reader.readexactly(int(cabeceras["content-length"]))
+
+                self.contadores["peticiones"] += 1
+                estado, tipo, cuerpo = await self.despachar(metodo, objetivo)
+                seguir = version == "HTTP/1.1" and cabeceras.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {estado} {ESTADOS[estado]}\r\nContent-Type: {tipo}\r\n"
+                    f"Content-Length: {len(cuerpo)}\r\nConnection: {'keep-alive' if seguir else 'close'}\r\n\r\n"
+                    .encode("latin-1") + cuerpo
+                )
+                await writer.drain()
+                if not seguir:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def iniciar(self, host=HOST, port=PORT):
+        self.servidor = await asyncio.start_server(self._atender, host, port)
+        return self.servidor.sockets[0].getsockname()[1]
+
+    async def servir(self, host=HOST, port=PORT):
+        puerto = await self.iniciar(host, port)
+        print(f"SERVING ON http://{host}:{puerto} ({self.analitica._max_workers} ANALYTICS THREADS)", flush=True)
+        async with self.servidor:
+            await self.servidor.serve_forever()
+
+    def cerrar(self):
+        if self.servidor is not None:
+            self.servidor.close()
+        self.analitica.shutdown(wait=False, cancel_futures=True)
+        self.graficos.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local analytics HTTP/JSON service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None, help="analytics threads")
+    parser.add_argument("--sqlite", default=None, help="SQLite stock_info file to serve instead of DATABASE_FINANCE")
+    parser.add_argument("--calentar", default="", help="comma-separated symbols to load into the cache at startup")
+    parser.add_argument("--figuras", default=None, help="directory for the rendered charts")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        import db
+        from sqlalchemy import create_engine
+        db.set_engine(create_engine(f"sqlite:///{args.sqlite}"))
+    if args.figuras:
+        import plot_functions
+        from pathlib import Path
+        plot_functions.FIGURES_DIR = Path(args.figuras)
+        plot_functions.FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+
+    servicio = Servicio(args.workers)
+    servicio.calentar([s for s in args.calentar.split(",") if s.strip()])
+    try:
+        asyncio.run(servicio.servir(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servicio.cerrar()
@@ -0,0 +1,103 @@
+# THIS MODULE RUNS PER-SYMBOL ANALYTICS OF A PANEL ACROSS A PROCESS POOL
+# THE PANEL (DATE INDEX, PRESENCE MASK AND EVERY FIELD) IS COPIED ONCE INTO A SINGLE
+# multiprocessing.shared_memory BLOCK; EVERY WORKER ATTACHES TO IT WHEN IT STARTS AND REBUILDS
+# THE PANEL AS VIEWS OVER THE SHARED BUFFER, SO NO FRAME IS PICKLED TO THE WORKERS.
+# THE SYMBOLS ARE SPLIT IN CONTIGUOUS SHARDS OF SIMILAR SIZE (PRESENT CELLS); A SHARD IS
+# (KERNEL, FIRST COLUMN, LAST COLUMN) AND ONLY ITS RESULT FRAME TRAVELS BACK.
+# A KERNEL IS A MODULE-LEVEL FUNCTION kernel(panel, **kwargs) -> DataFrame OVER A SUB-PANEL.
+# FINANCE_SHARD_WORKERS SETS THE DEFAULT NUMBER OF PROCESSES (ONE PER CPU); 1 RUNS IN THIS PROCESS.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from panel import Panel
+
+WORKERS = int(os.getenv("FINANCE_SHARD_WORKERS", "0")) or os.cpu_count() or 1
+SHARDS_POR_WORKER = 4
+ALINEACION = 64
+
+
+# COPIES A PANEL INTO ONE SHARED MEMORY BLOCK. USE IT AS A CONTEXT MANAGER: THE BLOCK IS
+# RELEASED ON EXIT. descriptor IS WHAT A WORKER NEEDS TO ATTACH (NAME, SYMBOLS AND ARRAY LAYOUT)
+class PanelCompartido:
+    def __init__(self, panel):
+        arrays = {"fechas": panel.fechas, "presente": panel.presente}
+        arrays.update({f"campo:{nombre}": valores for nombre, valores in panel.campos.items()})
+
+        disposicion, total = [], 0
+        for clave, arr in arrays.items():
+            disposicion.append((clave, arr.dtype.str, arr.shape, total))
+            total += -(-arr.nbytes // ALINEACION) * ALINEACION
+        self.shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        for (clave, dtype, forma, offset), arr in zip(disposicion, arrays.values()):
+            np.ndarray(forma, dtype=dtype, buffer=self.shm.buf, offset=offset)[...] = arr
+        self.nbytes = total
+        self.descriptor = {"nombre": self.shm.name, "symbols": panel.symbols, "arrays": disposicion}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# REBUILDS THE PANEL FROM A DESCRIPTOR AS VIEWS OVER THE SHARED BLOCK
+# RETURNS (PANEL, SHARED MEMORY); THE BLOCK MUST STAY OPEN WHILE THE PANEL IS USED
+def adjuntar(descriptor):
+    shm = shared_memory.SharedMemory(name=descriptor["nombre"])
+    arrays = {clave: np.ndarray(forma, dtype=dtype, buffer=shm.buf, offset=offset)
+              for clave, dtype, forma, offset in descriptor["arrays"]}
+    campos = {clave.split(":", 1)[1]: arr for clave, arr in arrays.items() if clave.startswith("campo:")}
+    return Panel(arrays["fechas"], descriptor["symbols"], campos, arrays["presente"]), shm
+
+
+# PANEL OF THIS WORKER PROCESS, ATTACHED ONCE BY THE POOL INITIALIZER
+_PANEL = None
+_SHM = None
+
+
+def _iniciar(descriptor):
+    global _PANEL, _SHM
+    _PANEL, _SHM = adjuntar(descriptor)
+
+
+def _tarea(kernel, inicio, fin, kwargs):
+    return kernel(_PANEL.bloque(inicio, fin), **kwargs)
+
+
+# SPLITS THE COLUMNS IN n CONTIGUOUS [inicio, fin) RANGES WITH A SIMILAR NUMBER OF PRESENT CELLS
+def particionar(panel, n):
+    columnas = panel.shape[1]
+    if columnas == 0:
+        return []
+    acumulado = np.cumsum(panel.presente.sum(axis=0))
+    objetivos = acumulado[-1] * np.arange(1, n) / n
+    cortes = np.unique(np.r_[0, np.searchsorted(acumulado, objetivos, side="right"), columnas])
+    return [(int(a), int(b)) for a, b in zip(cortes[:-1], cortes[1:]) if b > a]
+
+
+# RUNS kernel OVER EVERY SHARD OF THE PANEL AND CONCATENATES THE RESULTS IN COLUMN ORDER
+# workers=1 (OR A SINGLE SHARD) RUNS IN THIS PROCESS WITHOUT SHARED MEMORY
+def ejecutar(panel, kernel, workers=None, shards=None, **kwargs):
+    workers = max(1, WORKERS if workers is None else workers)
+    rangos = particionar(panel, shards or workers * SHARDS_POR_WORKER)
+    if workers == 1 or len(rangos) <= 1:
+        partes = [kernel(panel.bloque(inicio, fin), **kwargs) for inicio, fin in rangos]
+    else:
+        with PanelCompartido(panel) as compartido:
+            with ProcessPoolExecutor(max_workers=min(workers, len(rangos)), initializer=_iniciar,
+                                     initargs=(compartido.descriptor,)) as pool:
+                futuros = [pool.submit(_tarea, kernel, inicio, fin, kwargs) for inicio, fin in rangos]
+                partes = [f.result() for f in futuros]
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
@@ -1,311 +1,981 @@
 #IMPORTANDO MÓDULOS A USAR
 import pandas as pd
-from sqlalchemy import text, bindparam
 import datetime
 import numpy as np
-from db import engine
+from db import get_engine
+import cache
+from memo import memoizar
+from panel import Panel
+import portfolio
+import online
+import quantiles
+import sharding
+import resampling
+from lazy import importar_diferido
+from instrumentation import instrumentar, registrar_error
+
+# SQLALCHEMY IS LOADED ON THE FIRST QUERY: READS SERVED BY THE LOCAL CACHE NEVER NEED IT
+sql = importar_diferido("sqlalchemy")
 
     
 #FUNCTION TO OBTAIN ALL THE HISTORICAL DATA OF A SPECIFIC COMPANY
-def GetHistoricalData(company):
+#WITH chunksize IT RETURNS A GENERATOR OF CHUNKS INSTEAD (SEE StockInfoStream)
+@instrumentar("stats")
+def GetHistoricalData(company, chunksize=None):
+    if chunksize:
+        return StockInfoStream(company, chunksize=chunksize)
     try:
         company_check = company.upper()
-        query = text("select * from `stock_info` where Symbol = :company_check;")
-        df= pd.read_sql(query, engine, params={"company_check":company_check})
+        if cache.ACTIVO:
+            return cache.leer_span(company_check, get_engine)
+        query = sql.text("select * from `stock_info` where Symbol = :company_check;")
+        df= pd.read_sql(query, get_engine(), params={"company_check":company_check})
         return df
         
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
     
 #WE OBTAIN ALL THE INFORMATION ABOUT A COMPANY BUT WITHIN A SPECIFIED PERIOD
+@instrumentar("stats")
 def GetDataPeriodically(start, end, company):
     try:
         company_check = company.upper()
         start_date = datetime.datetime(start[0], start[1], start[2])
         end_date = datetime.datetime(end[0], end[1], end[2])
-        query = text("select * from `stock_info` where Symbol = :company_check and Fecha between :start_date and :end_date order by Fecha asc;")
-        df = pd.read_sql(query, engine, params={"company_check":company_check, "start_date":start_date, "end_date":end_date})
+        if cache.ACTIVO:
+            return cache.leer_span(company_check, get_engine, start_date, end_date)
+        query = sql.text("select * from `stock_info` where Symbol = :company_check and Fecha between :start_date and :end_date order by Fecha asc;")
+        df = pd.read_sql(query, get_engine(), params={"company_check":company_check, "start_date":start_date, "end_date":end_date})
         return df
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
     
 #WE OBTAIN ALL THE INFORMATION FROM VARIOUS COMPANIES OVER A CERTAIN PERIOD OF TIME
-def GetVariousCompanies(companies, start, end):
+#WITH chunksize IT RETURNS A GENERATOR OF CHUNKS ORDERED BY (Symbol, Fecha) (SEE StockInfoStream)
+@instrumentar("stats")
+def GetVariousCompanies(companies, start, end, chunksize=None):
+    if chunksize:
+        return StockInfoStream(companies, start, end, chunksize=chunksize)
     try:
         start_date = datetime.datetime(start[0], start[1], start[2])
         end_date = datetime.datetime(end[0], end[1], end[2])
-                    
-        query = text("""select * from `stock_info` where Symbol in :companies and 
-                    Fecha between :start_date and :end_date order by Fecha;""")
-        df = pd.read_sql(query, engine, params={"companies":companies, "start_date":start_date, "end_date":end_date})
+        if cache.ACTIVO:
+            df = cache.leer_spans([company.upper() for company in companies], get_engine, start_date, end_date)
+            return df.sort_values("Fecha", kind="stable", ignore_index=True)
+
+        query = sql.text("""select * from `stock_info` where Symbol in :companies and 
+                    Fecha between :start_date and :end_date order by Fecha;""").bindparams(sql.bindparam("companies", expanding=True))
+        df = pd.read_sql(query, get_engine(), params={"companies":companies, "start_date":start_date, "end_date":end_date})
         return df
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
     
-#WE OBTAIN THE MONTHLY VOLUME OF CERTAIN COMPANIES OVER A PERIOD OF TIME (MONTHS)   
-def GetCompaniesVolumeSpan(companies, start, end):
+#WE OBTAIN WEEKLY ('W'), MONTHLY ('M') OR YEARLY ('Y') OHLCV BARS OF SEVERAL COMPANIES: FIRST OPEN, HIGHEST HIGH,
+#LOWEST LOW, LAST CLOSE AND TOTAL VOLUME OF EVERY WHOLE PERIOD FROM THE ONE CONTAINING start UP TO end.
+#THE BARS COME FROM THE ROLLUP TABLES (A FEW ROWS PER COMPANY); WHEN THE ROLLUP IS MISSING OR BEHIND
+#stock_info FOR THESE COMPANIES THE DAILY ROWS ARE RESAMPLED INSTEAD
+#ROWS ARE ORDERED BY COMPANY (IN THE ORDER GIVEN) AND PERIOD
+@instrumentar("stats")
+@memoizar
+def GetOHLCVBars(companies, start, end, frecuencia="M"):
     try:
-        start_date = datetime.datetime(start[0], start[1], start[2])
-        end_date = datetime.datetime(end[0], end[1], end[2])
-                    
-        query = text("""select Symbol as 'Empresa', month(Fecha) as 'Mes', sum(Volume) as 'Volumen mensual' from `stock_info`
-                    where (Fecha between :start_date and :end_date) and (Symbol in :companies)
-                    group by Symbol, month(Fecha)
-                    order by month(Fecha), Symbol;""").bindparams(bindparam("companies", expanding=True))
-        df = pd.read_sql(query, engine, params={"companies":companies, "start_date":start_date.date(), "end_date":end_date.date()})
+        companies_check = [company.upper() for company in companies]
+        start_date = datetime.date(start[0], start[1], start[2])
+        end_date = datetime.date(end[0], end[1], end[2])
+        desde = resampling.periodo(start_date, frecuencia).item()
+        if resampling.al_dia(get_engine(), frecuencia, companies_check):
+            query = sql.text(f"""select {', '.join(resampling.COLUMNAS)} from `{resampling.TABLAS[frecuencia]}`
+                        where (Symbol in :companies) and (Periodo between :desde and :end_date)
+                        order by Symbol, Periodo;""").bindparams(sql.bindparam("companies", expanding=True))
+            df = pd.read_sql(query, get_engine(), params={"companies":companies_check, "desde":desde, "end_date":end_date})
+            df["Periodo"] = pd.to_datetime(df["Periodo"])
+            df["Ultima"] = pd.to_datetime(df["Ultima"])
+        else:
+            hasta = resampling.fin_periodo(end_date, frecuencia).item()
+            if cache.ACTIVO:
+                diarios = cache.leer_spans(companies_check, get_engine, desde, hasta)
+            else:
+                query = sql.text("""select Fecha, Symbol, Open, High, Low, Close_Price, Volume from `stock_info`
+                            where (Symbol in :companies) and (Fecha between :desde and :hasta)
+                            order by Symbol, Fecha;""").bindparams(sql.bindparam("companies", expanding=True))
+                diarios = pd.read_sql(query, get_engine(), params={"companies":companies_check, "desde":desde, "hasta":hasta})
+            df = resampling.resamplear(diarios, frecuencia)
+        orden = {company: i for i, company in enumerate(companies_check)}
+        df = df.sort_values(["Symbol", "Periodo"], key=lambda c: c.map(orden) if c.name == "Symbol" else c,
+                            kind="stable", ignore_index=True)
         return df
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
 
+#RENAMES OHLCV BARS TO THE (Empresa, Mes, Volumen mensual) LAYOUT, ORDERED BY MONTH AND COMPANY
+#Mes IS THE FIRST DAY OF THE MONTH, SO THE SAME MONTH OF DIFFERENT YEARS IS NOT MERGED
+def VolumenMensual(barras):
+    if barras.empty:
+        return pd.DataFrame(columns=["Empresa", "Mes", "Volumen mensual"])
+    df = barras[["Symbol", "Periodo", "Volume"]]
+    df.columns = ["Empresa", "Mes", "Volumen mensual"]
+    return df.sort_values(["Mes", "Empresa"], ignore_index=True)
+
+#WE OBTAIN THE MONTHLY VOLUME OF CERTAIN COMPANIES OVER A PERIOD OF TIME (WHOLE MONTHS)
+@instrumentar("stats")
+def GetCompaniesVolumeSpan(companies, start, end):
+    try:
+        return VolumenMensual(GetOHLCVBars(companies, start, end, "M"))
+    except Exception as e:
+        registrar_error(e)
+        df = pd.DataFrame()
+        return df
+
+#RENAMES A stock_info-SHAPED FRAME TO THE (Fecha, Empresa, Apertura, Cierre) LAYOUT
+def AperturaCierre(df):
+    df = df[["Fecha", "Symbol", "Open", "Close_Price"]]
+    df.columns = ["Fecha", "Empresa", "Apertura", "Cierre"]
+    return df
+
 #WE OBTAIN THE DAILY OPENING AND CLOSING VALUES OF A COMPANY IN A GIVEN PERIOD OF TIME.
+@instrumentar("stats")
 def GetOpenCloseSpan(company, start, end):
     try:
         company_check = company.upper()
         start_date = datetime.date(start[0], start[1], start[2])
         end_date = datetime.date(end[0], end[1], end[2])
-                    
-        query = text("""select Fecha as 'Fecha' ,Symbol as 'Empresa', Open as 'Apertura' , Close_Price as 'Cierre' 
+        if cache.ACTIVO:
+            return AperturaCierre(cache.leer_span(company_check, get_engine, start_date, end_date))
+
+        query = sql.text("""select Fecha as 'Fecha' ,Symbol as 'Empresa', Open as 'Apertura' , Close_Price as 'Cierre' 
                     from `stock_info` where (Symbol = :company_check) and (Fecha between :start_date and :end_date)
                     group by Fecha, Symbol 
                     order by Fecha;""")
-        df = pd.read_sql(query, engine, params={"company_check":company_check, "start_date":start_date, "end_date":end_date})
+        df = pd.read_sql(query, get_engine(), params={"company_check":company_check, "start_date":start_date, "end_date":end_date})
         return df
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         print(e)
         return df
     
-#WE OBTAIN THE MONTHLY VOLUME OF A COMPANY OVER A PERIOD OF TIME (MONTHS)
-def GetCompanyVolumeSpan(company, start, end):
+#WE OBTAIN THE DAILY OPENING AND CLOSING VALUES OF SEVERAL COMPANIES WITH A SINGLE QUERY
+#ROWS ARE ORDERED BY COMPANY (IN THE ORDER GIVEN) AND DATE
+@instrumentar("stats")
+def GetOpenCloseSpanCompanies(companies, start, end):
     try:
-        company_check = company.upper()
-        start_date = datetime.datetime(start[0], start[1], start[2])
-        end_date = datetime.datetime(end[0], end[1], end[2])
-        query = text("""select Symbol as 'Empresa', month(Fecha) as 'Mes', Volume as 'Volumen mensual' from `stock_info`
-                where (Fecha between :start_date and :end_date) and (Symbol = :company_check)
-                order by month(Fecha);""")
-        df = pd.read_sql(query, engine, params={"company_check":company_check, "start_date":start_date, "end_date":end_date})
+        companies_check = [company.upper() for company in companies]
+        start_date = datetime.date(start[0], start[1], start[2])
+        end_date = datetime.date(end[0], end[1], end[2])
+        if cache.ACTIVO:
+            return AperturaCierre(cache.leer_spans(companies_check, get_engine, start_date, end_date))
+
+        query = sql.text("""select Fecha as 'Fecha' ,Symbol as 'Empresa', Open as 'Apertura' , Close_Price as 'Cierre'
+                    from `stock_info` where (Symbol in :companies) and (Fecha between :start_date and :end_date)
+                    order by Symbol, Fecha;""").bindparams(sql.bindparam("companies", expanding=True))
+        df = pd.read_sql(query, get_engine(), params={"companies":companies_check, "start_date":start_date, "end_date":end_date})
+        orden = {company: i for i, company in enumerate(companies_check)}
+        df = df.sort_values(["Empresa", "Fecha"], key=lambda c: c.map(orden) if c.name == "Empresa" else c,
+                            kind="stable", ignore_index=True)
         return df
     except Exception as e:
+        registrar_error(e)
+        df = pd.DataFrame()
+        print(e)
+        return df
+
+#WE OBTAIN THE MONTHLY VOLUME OF A COMPANY OVER A PERIOD OF TIME (WHOLE MONTHS)
+@instrumentar("stats")
+def GetCompanyVolumeSpan(company, start, end):
+    try:
+        return VolumenMensual(GetOHLCVBars([company], start, end, "M"))
+    except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
     
+#RETURNS, ANNUALIZED STATS AND DRAWDOWNS FOR A LONG-FORMAT FRAME (Fecha, Empresa, Apertura, Cierre)
+#EVERY COMPANY IS COMPUTED AT ONCE WITH GROUPED, VECTORIZED OPERATIONS
+def CalcularRetornoAjustado(df):
+    grupos = df.groupby('Empresa', sort=False)['Cierre']
+    df['Retorno diario'] = round(np.log(df['Cierre'] / grupos.shift(1)), 2)
+    retornos = df.groupby('Empresa', sort=False)['Retorno diario']
+    df['Retorno anual'] = (retornos.transform('mean') * 252).round(2)
+    df['Volatilidad anualizada'] = (retornos.transform('std') * np.sqrt(252)).round(2)
+    df['Ratio sharpe'] = ((df['Retorno anual'] - 0.0425) / df['Volatilidad anualizada']).round(2)
+
+    #PICO MÁXIMO, DRAWDOWN ACTUAL Y MÍNIMO ACUMULADO
+    cierre = df['Cierre'].to_numpy(dtype=np.float64)
+    pico = df['Cierre'].fillna(0.0).clip(lower=0.0).groupby(df['Empresa'], sort=False).cummax().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(pico > cierre, np.round((cierre / pico - 1) * 100, 2), 0.0)
+    df['Pico máximo'] = pico
+    df['Drawdown actual'] = drawdown
+    df['MDD'] = grupos.cummin()
+    df['MDD'] = df.groupby('Empresa', sort=False)['MDD'].ffill()
+    return df
+
 #WE OBTAIN THE ADJUSTED RETURN OF A COMPANY OVER A GIVEN PERIOD OF TIME
+@instrumentar("stats")
+@memoizar
 def GetAdjustedReturn(company, start, end):
     try:
         df = GetOpenCloseSpan(company, start, end)
-        df['Retorno diario'] = round(np.log(df['Cierre'] / df['Cierre'].shift(1)), 2)
-        df['Retorno anual'] = round(df['Retorno diario'].mean() * 252,2)
-        df['Volatilidad anualizada'] = round(df['Retorno diario'].std() * np.sqrt(252),2)
-        df['Ratio sharpe'] = round((df['Retorno anual'] - 0.0425) / df['Volatilidad anualizada'],2)
-        df['Pico máximo'] = 0.00
-        df['Drawdown actual'] = 0.00
-        df['MDD'] = 0.00
-        pico = 0.00
-        minimo = df.iat[0,3]
-        for i in range(len(df)):
-            #Calculo el maximo 
-            if df.iat[i, 3] > pico:
-               pico = df.iat[i, 3]
-            #Asigno el maximo
-            df.iat[i, 8] = pico
-            
-            #Calculo el drawdown actual
-            if pico > df.iat[i, 3]:
-                #Asigno el drawdown
-                df.iat[i,9] = round(((df.iat[i,3] / pico) - 1)*100, 2)
-            
-            
-            
-            #Calculo el minimo
-            if minimo > df.iat[i, 3]:
-                minimo = df.iat[i, 3]
-            #Asigno el minimo
-            df.iat[i,10] = minimo 
-
-        return df
+        return CalcularRetornoAjustado(df)
     except Exception as e:
+        registrar_error(e)
         df = pd.DataFrame()
         return df
 
+#VECTORIZED DRAWDOWN ENGINE: RETURNS EVERY DRAWDOWN EPISODE OF A PRICE SERIES IN ONE PASS
+#AN EPISODE STARTS AT THE LAST PEAK, REACHES ITS TROUGH AND ENDS WHEN THE PRICE GETS BACK
+#TO THAT PEAK. UNRECOVERED EPISODES HAVE NaT AS RECOVERY DATE.
+def DrawdownEpisodes(fechas, precios):
+    fechas = pd.to_datetime(pd.Series(fechas)).to_numpy()
+    precios = np.asarray(precios, dtype=np.float64)
+    columnas = ["Fecha último pico", "Valor incial", "Fecha del valle", "Valor del valle:",
+                "% De pérdida", "Fecha de recupero", "Valor alcanzado", "Dias totales en baja",
+                "Dias totales en recuperación", "Días totales transcurridos"]
+    if len(precios) == 0:
+        return pd.DataFrame(columns=columnas)
+
+    pico = np.fmax.accumulate(precios)
+    en_baja = precios < pico
+
+    #INICIO Y FIN DE CADA TRAMO CONSECUTIVO BAJO EL PICO
+    previo = np.r_[False, en_baja[:-1]]
+    siguiente = np.r_[en_baja[1:], False]
+    inicios = np.flatnonzero(en_baja & ~previo)
+    finales = np.flatnonzero(en_baja & ~siguiente)
+    if len(inicios) == 0:
+        return pd.DataFrame(columns=columnas)
+
+    #EL VALLE DE CADA EPISODIO ES EL MÍNIMO DEL TRAMO
+    episodio = np.cumsum(en_baja & ~previo) - 1
+    idx_baja = np.flatnonzero(en_baja)
+    orden = np.lexsort((precios[idx_baja], episodio[idx_baja]))
+    _, primeros = np.unique(episodio[idx_baja][orden], return_index=True)
+    valles = idx_baja[orden][primeros]
+
+    picos = inicios - 1
+    recuperos = finales + 1
+    recuperado = recuperos < len(precios)
+    recuperos_validos = np.where(recuperado, recuperos, 0)
+
+    fecha_pico = fechas[picos]
+    fecha_valle = fechas[valles]
+    fecha_recupero = np.where(recuperado, fechas[recuperos_validos], np.datetime64("NaT"))
+    fecha_recupero = pd.to_datetime(fecha_recupero)
+
+    episodios = pd.DataFrame({
+        "Fecha último pico": fecha_pico,
+        "Valor incial": pico[picos],
+        "Fecha del valle": fecha_valle,
+        "Valor del valle:": precios[valles],
+        "% De pérdida": np.round((precios[valles] / pico[picos] - 1) * 100, 2),
+        "Fecha de recupero": fecha_recupero,
+        "Valor alcanzado": np.where(recuperado, precios[recuperos_validos], np.nan),
+    })
+    episodios["Dias totales en baja"] = episodios["Fecha del valle"] - episodios["Fecha último pico"]
+    episodios["Dias totales en recuperación"] = episodios["Fecha de recupero"] - episodios["Fecha del valle"]
+    episodios["Días totales transcurridos"] = episodios["Fecha de recupero"] - episodios["Fecha último pico"]
+    return episodios
+
+#WE OBTAIN EVERY DRAWDOWN EPISODE OF ONE OR MORE COMPANIES IN A CERTAIN PERIOD OF TIME
+@instrumentar("stats")
+@memoizar
+def GetDrawdownEpisodes(companies, start, end):
+    if isinstance(companies, str):
+        companies = [companies]
+    df = GetOpenCloseSpanCompanies(companies, start, end)
+    if df.empty:
+        return pd.DataFrame()
+    tablas = []
+    for empresa, grupo in df.groupby('Empresa', sort=False):
+        episodios = DrawdownEpisodes(grupo['Fecha'], grupo['Cierre'])
+        episodios.insert(0, "Empresa", empresa)
+        tablas.append(episodios)
+    return pd.concat(tablas, ignore_index=True)
+
 #WE OBTAIN THE DURATION OF THE MDD IN A CERTAIN PERIOD OF TIME.
+#IF THE MDD HAS NOT BEEN RECOVERED YET, THE RECOVERY FIELDS ARE EMPTY (NaT / NaN)
+@instrumentar("stats")
+@memoizar
 def GetMDD_Duration(company, start, end):
-    df = GetAdjustedReturn(company, start, end)
-    fecha_minimo = df.loc[df['Drawdown actual'] == min(df['Drawdown actual'])]
-    fila_minimo = df.loc[df['Drawdown actual'] == df['Drawdown actual'].min()]
-    fecha_minimo = fila_minimo['Fecha'].iat[0]
-    valor_inicial_pico_mdd = fila_minimo['Pico máximo'].iat[0]
-    valor_valle = fila_minimo["Cierre"].iat[0]
-    valor_mdd = fila_minimo['Drawdown actual'].iat[0]
-
-    fila_recupero = df.loc[(df['Fecha'] >= fecha_minimo) & (df['Cierre'] >= valor_inicial_pico_mdd)]
-    fecha_recuperacion = fila_recupero['Fecha'].iat[0]
-    valor_alcanzado = fila_recupero['Cierre'].iat[0]
-
-
-    fila_ultimo_pico = df.loc[(df['Pico máximo'] == valor_inicial_pico_mdd) & (df['Fecha'] <= fecha_minimo)]
-    fecha_ultimo_pico = fila_ultimo_pico['Fecha'].iat[0]
-
-    dias_peak_valle = fecha_minimo - fecha_ultimo_pico
-    dias_valle_recover = fecha_recuperacion - fecha_minimo
-    total_days = fecha_recuperacion - fecha_ultimo_pico
-
-    diccionario = {
-        "Fecha último pico" : fecha_ultimo_pico,
-        "Valor incial" : valor_inicial_pico_mdd,
-        "Fecha del valle" : fecha_minimo,
-        "Valor del valle:": valor_valle,
-        "% De pérdida" : valor_mdd,
-        "Fecha de recupero": fecha_recuperacion,
-        "Valor alcanzado": valor_alcanzado,
-        "Dias totales en baja": dias_peak_valle,
-        "Dias totales en recuperación": dias_valle_recover,
-        "Días totales transcurridos": total_days
-    }
-    lista = [diccionario]
-    df_mmd = pd.DataFrame(lista)
+    df = GetOpenCloseSpan(company, start, end)
+    if df.empty:
+        return pd.DataFrame()
+    episodios = DrawdownEpisodes(df['Fecha'], df['Cierre'])
+    if episodios.empty:
+        return episodios
+    df_mmd = episodios.loc[[episodios["% De pérdida"].idxmin()]].reset_index(drop=True)
     return df_mmd
 
+#ROLLING VOLATILITY ENGINE: STANDARD DEVIATION OVER SEVERAL WINDOWS IN ONE PASS
+#retornos IS A (DATES x SYMBOLS) MATRIX (OR A 1-D SERIES). CUMULATIVE SUMS OF THE CENTERED
+#RETURNS AND THEIR SQUARES ARE BUILT ONCE AND EVERY WINDOW IS A DIFFERENCE OF THEM.
+#RETURNS A (WINDOWS x DATES x SYMBOLS) ARRAY; A WINDOW WITH ANY NaN GIVES NaN (LIKE rolling().std())
+#float32 PANELS ARE READ AS THEY ARE; THE SUMS ARE ACCUMULATED IN float64
+def RollingVolatility(retornos, ventanas):
+    x = np.asarray(retornos)
+    if x.dtype not in (np.float32, np.float64):
+        x = x.astype(np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    filas, columnas = x.shape
+    salida = np.full((len(ventanas), filas, columnas), np.nan)
+
+    valido = ~np.isnan(x)
+    cantidad = valido.sum(axis=0)
+    centro = np.divide(np.where(valido, x, 0.0).sum(axis=0), cantidad,
+                       out=np.zeros(columnas), where=cantidad > 0)
+    xc = np.where(valido, x - centro, 0.0)
+
+    ceros = np.zeros((1, columnas))
+    suma = np.vstack([ceros, np.cumsum(xc, axis=0, dtype=np.float64)])
+    suma_cuadrados = np.vstack([ceros, np.cumsum(xc * xc, axis=0, dtype=np.float64)])
+    conteo = np.vstack([ceros, np.cumsum(valido, axis=0)])
+
+    for k, ventana in enumerate(ventanas):
+        if ventana < 2 or ventana > filas:
+            continue
+        s = suma[ventana:] - suma[:-ventana]
+        s2 = suma_cuadrados[ventana:] - suma_cuadrados[:-ventana]
+        n = conteo[ventana:] - conteo[:-ventana]
+        varianza = np.maximum((s2 - s * s / ventana) / (ventana - 1), 0.0)
+        salida[k, ventana - 1:] = np.where(n == ventana, np.sqrt(varianza), np.nan)
+    return salida
+
+#WE OBTAIN THE FULL ROLLING VOLATILITY TIME SERIES (DAILY AND ANNUALIZED) OF SEVERAL
+#COMPANIES FOR ANY LIST OF WINDOWS. ONE ROW PER (DATE, COMPANY), ONE COLUMN PER WINDOW.
+@instrumentar("stats")
+@memoizar
+def GetVolatilityTermStructure(companies, start, end, ventanas=(20, 40, 60, 80, 100, 252)):
+    if isinstance(companies, str):
+        companies = [companies]
+    panel = GetPanel(companies, start, end)
+    if panel.empty:
+        return pd.DataFrame()
+
+    volatilidad = RollingVolatility(panel.retornos(), ventanas)
+
+    #SOLO DEVUELVO LAS FECHAS QUE EXISTEN PARA CADA EMPRESA (ORDENADAS POR EMPRESA Y FECHA)
+    columna, fila = np.nonzero(panel.presente.T)
+    resultado = {
+        "Fecha": panel.fechas[fila],
+        "Empresa": np.asarray(panel.symbols, dtype=object)[columna],
+    }
+    for k, ventana in enumerate(ventanas):
+        resultado[f"Volatilidad diaria ({ventana}D)"] = volatilidad[k][fila, columna]
+        resultado[f"Volatilidad anualizada ({ventana}D)"] = volatilidad[k][fila, columna] * np.sqrt(252)
+    return pd.DataFrame(resultado)
+
 #WE OBTAIN THE MOVING, DAILY AND ANNUALLY VOLATILITY OVER A PERIOD OF TIME
-def VolatilidadMovil(company, start, end):
-    #Volatilidad Histórica Móvil: Para cada acción, calcula la volatilidad
-    #  (desviación estándar de los retornos logarítmicos)
-    #  en ventanas móviles de diferentes tamaños (ej. 20 días, 60 días, 252 días).
+#Volatilidad Histórica Móvil: para la acción calcula la volatilidad (desviación estándar de
+#los retornos logarítmicos) en ventanas móviles de diferentes tamaños y devuelve el valor
+#de cada ventana en la posición 'ventana' de la serie. Las ventanas se evalúan en orden y
+#se detiene en la primera que no entra en el período o en los datos disponibles.
+@instrumentar("stats")
+@memoizar
+def VolatilidadMovil(company, start, end, ventanas=(20, 40, 60, 80, 100)):
     start_date = datetime.datetime(start[0], start[1], start[2])
     end_date = datetime.datetime(end[0], end[1], end[2])
     dias = end_date - start_date
     if (dias.days) < 20:
         return "Período de tiempo muy corto, debe ser mayor o igual a 20"
-    elif (dias.days) >= 20:
-        #Creo el diccionario para guardar los valores y devolverlos
-        diccionario = {}
-        diccionario["Compañía"] = company
-        #Llamo a la función GetOpenCloseSpan para que me cree el df con los datos necesarios para 
-        #realizar los calculos
-        df = GetOpenCloseSpan(company, start, end)
 
-        #Creo la columna 'Retorno diario' calculando el logaritmo del valor de cierre sobre el 
-        #valor de cierre del dia anterior y lo redondeo a 2 decimales
-        df['Retorno diario'] = round(np.log(df['Cierre'] / df['Cierre'].shift(1)), 2)
-        #Calculo la volatilidad diaria de los primeros 20 dias usando rolling y .std para la
-        #desviacion estandar.
-        volatilidad_20 = df['Retorno diario'].rolling(window=20).std()
-        volatilidad_20 = round(volatilidad_20.iat[20],5)
-        #Creo la columna 'Volatilidad diaria (20D)' la cual tendra el valor de la
-        #volatilidad diaria a en 20 dias calculada en la accion anterior
-        #volatilidad_20
-
-        #Calculo la volatilidad anualizada de esos 20 dias usando la columna anteriormente
-        #creada y la multiplico por la raiz de los dias totales que se hace trading en un año
-        #252 aprox.
-        volatilidad_20_anual = round(volatilidad_20 * np.sqrt(252),5)
-
-        #Creo la columna 'Volatilidad anualizada (20D) la cual tendra el valor
-        #obtenido en el calculo realizado en la variabla de arriba.
-        #df['Volatilidad anualizada (20D)'] = volatilidad_20_anual
-
-        #Asigno los pares llave-valor al diccionario que voy a devolver
-        #creo la llave para la volatilidad diaria a 20 dias y le doy su resultado
-        #lo mismo hago para la volatilidad anualizada
-        diccionario["Volatilidad diaria (20D)"] = volatilidad_20
-        diccionario["Volatilidad anualizada (20D)"] = volatilidad_20_anual
-
-        if dias.days >= 40  and len(df['Retorno diario']) >= 40:
-            volatilidad_40 = df['Retorno diario'].rolling(window=40).std()
-            volatilidad_40 = round(volatilidad_40.iat[40], 5)
-            diccionario["Volatilidad diaria (40D)"] = volatilidad_40
-            diccionario['Volatilidad anualizada (40D)'] = round(volatilidad_40 * np.sqrt(252),5)
-            
-            if dias.days >= 60  and len(df['Retorno diario']) >= 60:
-                volatilidad_60 = df['Retorno diario'].rolling(window=60).std()
-                volatilidad_60 = round(volatilidad_60.iat[60], 5)
-                diccionario["Volatilidad diaria (60D)"] = volatilidad_60
-                diccionario['Volatilidad anualizada (60D)'] = round(volatilidad_60 * np.sqrt(252),5)
-                
-                if dias.days >= 80  and len(df['Retorno diario']) >= 80:
-                    volatilidad_80 = df['Retorno diario'].rolling(window=80).std()
-                    volatilidad_80 = round(volatilidad_80.iat[80], 5)
-                    diccionario["Volatilidad diaria (80D)"] = volatilidad_80
-                    diccionario['Volatilidad anualizada (80D)'] = round(volatilidad_80 * np.sqrt(252),5)
-
-                    if dias.days >= 100 and len(df['Retorno diario']) >= 100:
-                        volatilidad_100 = df['Retorno diario'].rolling(window=100).std()
-                        volatilidad_100 = round(volatilidad_100.iat[100],5)
-                        diccionario['Volatilidad diaria (100D)'] = volatilidad_100
-                        diccionario['Volatilidad anualizada (100D)'] = round(volatilidad_100 * np.sqrt(252),5)
+    #Creo el diccionario para guardar los valores y devolverlos
+    diccionario = {}
+    diccionario["Compañía"] = company
+    df = GetOpenCloseSpan(company, start, end)
+
+    #Retorno logarítmico diario redondeado a 2 decimales y volatilidad de todas las ventanas
+    retornos = round(np.log(df['Cierre'] / df['Cierre'].shift(1)), 2)
+    volatilidad = RollingVolatility(retornos.to_numpy(), ventanas)[:, :, 0]
+
+    for k, ventana in enumerate(ventanas):
+        if dias.days < ventana or len(retornos) <= ventana:
+            break
+        volatilidad_diaria = round(volatilidad[k, ventana], 5)
+        diccionario[f"Volatilidad diaria ({ventana}D)"] = volatilidad_diaria
+        diccionario[f"Volatilidad anualizada ({ventana}D)"] = round(volatilidad_diaria * np.sqrt(252), 5)
 
     return diccionario
 
+#SHARD KERNELS OF GetShardedAnalytics: EACH ONE COMPUTES ITS ANALYSIS FOR THE COMPANIES OF A
+#SUB-PANEL (sharding RUNS THEM IN WORKER PROCESSES OVER THE PANEL IN SHARED MEMORY)
+#SAME ROWS AS GetAdjustedReturn OF EVERY COMPANY, ONE AFTER THE OTHER
+def _ShardAdjustedReturn(panel):
+    df = panel.largo(["Open", "Close_Price"])
+    df["Symbol"] = df["Symbol"].astype(object)
+    df.columns = ["Fecha", "Empresa", "Apertura", "Cierre"]
+    return CalcularRetornoAjustado(df)
+
+#ONE ROW PER COMPANY WITH THE VALUES OF VolatilidadMovil (NaN WHERE IT STOPS)
+def _ShardVolatility(panel, ventanas, dias):
+    retornos, posicion, fila, columna = panel.apilar(panel.retornos())
+    volatilidad = RollingVolatility(retornos, ventanas)
+    largo = np.bincount(columna, minlength=panel.shape[1])
+    df = pd.DataFrame({"Compañía": list(panel.symbols)})
+
+    #COMO EN VolatilidadMovil, LAS VENTANAS SE EVALÚAN EN ORDEN Y SE CORTA EN LA PRIMERA QUE NO ENTRA
+    entra = np.ones(panel.shape[1], dtype=bool)
+    for k, ventana in enumerate(ventanas):
+        entra &= (dias >= ventana) & (largo > ventana)
+        diaria = np.round(volatilidad[k, min(ventana, panel.shape[0] - 1)], 5)
+        df[f"Volatilidad diaria ({ventana}D)"] = np.where(entra, diaria, np.nan)
+        df[f"Volatilidad anualizada ({ventana}D)"] = np.where(entra, np.round(diaria * np.sqrt(252), 5), np.nan)
+    return df
+
+#THE GetMDD_Duration ROW OF EVERY COMPANY THAT HAD A DRAWDOWN, WITH ITS Empresa
+def _ShardMDD(panel):
+    tablas = []
+    for j, empresa in enumerate(panel.symbols):
+        filas = panel.presente[:, j]
+        episodios = DrawdownEpisodes(panel.fechas[filas], panel.campos["Close_Price"][filas, j])
+        if episodios.empty:
+            continue
+        mdd = episodios.loc[[episodios["% De pérdida"].idxmin()]]
+        mdd.insert(0, "Empresa", empresa)
+        tablas.append(mdd)
+    return pd.concat(tablas, ignore_index=True) if tablas else pd.DataFrame()
+
+_KERNELS_SHARD = {"adjusted_return": _ShardAdjustedReturn, "volatility": _ShardVolatility, "mdd": _ShardMDD}
+
+#WE OBTAIN GetAdjustedReturn ('adjusted_return'), VolatilidadMovil ('volatility') OR GetMDD_Duration ('mdd')
+#FOR MANY COMPANIES AS ONE FRAME, COMPANIES IN THE ORDER GIVEN. THE COMPANIES ARE SPLIT IN SHARDS OVER
+#'workers' PROCESSES (DEFAULT FINANCE_SHARD_WORKERS OR ONE PER CPU) THAT READ THE PRICE PANEL FROM
+#SHARED MEMORY, SO ONLY THE RESULTS ARE PICKLED. workers=1 RUNS EVERYTHING IN THIS PROCESS
+@instrumentar("stats")
+@memoizar
+def GetShardedAnalytics(companies, start, end, analisis="adjusted_return", workers=None,
+                        ventanas=(20, 40, 60, 80, 100)):
+    if analisis not in _KERNELS_SHARD:
+        raise ValueError(f"UNKNOWN ANALYSIS '{analisis}'. USE 'adjusted_return', 'volatility' OR 'mdd'.")
+    kwargs = {}
+    if analisis == "volatility":
+        dias = (datetime.datetime(end[0], end[1], end[2]) - datetime.datetime(start[0], start[1], start[2])).days
+        if dias < 20:
+            return "Período de tiempo muy corto, debe ser mayor o igual a 20"
+        kwargs = {"ventanas": tuple(ventanas), "dias": dias}
+
+    panel = GetPanel(companies, start, end)
+    if panel.empty:
+        return pd.DataFrame()
+    return sharding.ejecutar(panel, _KERNELS_SHARD[analisis], workers, **kwargs)
+
 #WE CALCULATE THE ADJUSTED RETURN FOR SEVERAL COMPANIES
+#ONE QUERY FOR ALL THE COMPANIES AND ONE GROUPED PASS FOR THE CALCULATIONS
+@instrumentar("stats")
+@memoizar
 def GetVariousAdjRet(companies, start, end):
-    #CREAMOS UNA LISTA DONDE VAMOS A IR GUARDANDO LOS DATAFRAMES
-    dataframes = []
-
-    #RECORRO LA LISTA PROPORCIONADA DE COMPAÑÍAS Y A CADA UNA LE APLICO LA FUNCIÓN
-    #DE OBTENER EL RETORNO AJUSTADO EN EL PERÍODO DE TIEMPO PROPORCIONADO
-    for company in companies:
-        data = GetAdjustedReturn(company, start, end)
-
-        #COMPRUEBO QUE LA FUNCIÓN SE HAYA EJECUTADO CORRECTAMENTE Y RESETEO EL INDEX Y AGREGO
-        #EL DATAFRAME A LA LISTA INICIAL
-        if not data.empty:
-            data_reset = data.reset_index() 
-            dataframes.append(data_reset)
-    
-    #SI LA LISTA SIGUE VACÍA, DEVUELVO UN DATAFRAME VACÍO
-    if not dataframes:
+    df = GetOpenCloseSpanCompanies(companies, start, end)
+
+    #SI NO HAY DATOS, DEVUELVO UN DATAFRAME VACÍO
+    if df.empty:
         return pd.DataFrame()
-    
-    #FINALMENTE, SI SE OBTIENEN LOS DATOS, CONCATENO LOS DATAFRAMES DE LA LISTA
-    # Y LE PASO ignore_index=True PARA QUE NO TENGA EN CUENTA EL ÍNDICE A LA HORA DE CONCATENAR
-    # Y NO LOS DUPLIQUE
-    df = pd.concat(dataframes, ignore_index=True)
 
-    #DEVUELVO EL DATAFRAME FINAL
+    df = CalcularRetornoAjustado(df)
+
+    #MANTENGO LA COLUMNA 'index' CON LA POSICIÓN DE CADA FILA DENTRO DE SU EMPRESA
+    df.insert(0, 'index', df.groupby('Empresa', sort=False).cumcount())
     return df
 
 #HERE WE GET THE CORRELATION BETWEEN 2 OR MORE COMPANIES IN A SPECIFIC PERIOD OF TIME
+#THE RETURNS ARE READ FROM THE PANEL, SO NOTHING IS PIVOTED (COMPANIES IN ALPHABETICAL ORDER)
+@instrumentar("stats")
+@memoizar
 def GetCompaniesCorrInSpan(empresas, inicio, fin):
-    data = GetVariousAdjRet(empresas, inicio, fin)
+    df = PanelRetornos(empresas, inicio, fin)
+    if df.empty:
+        return pd.DataFrame()
 
-    df = data.pivot_table(values='Retorno diario',index='Fecha', columns='Empresa')
-    df_2 = df.corr()
+    df = df.dropna(axis=1, how='all')
+    df_2 = df[sorted(df.columns)].corr()
 
     return df_2
 
+#WE OBTAIN THE COMPACT (DATES x COMPANIES) PANEL OF SEVERAL COMPANIES IN A PERIOD OF TIME
+#COLUMNS KEEP THE ORDER GIVEN AND COMPANIES WITHOUT DATA IN THE SPAN ARE LEFT OUT.
+#WITH THE CACHE ACTIVE IT IS FILLED STRAIGHT FROM THE MEMORY-MAPPED ARRAYS (NO DATAFRAME).
+#dtype: float64 OR float32 FOR THE PRICES (DEFAULT FINANCE_PANEL_DTYPE)
+@instrumentar("stats")
+def GetPanel(companies, start, end, dtype=None):
+    if isinstance(companies, str):
+        companies = [companies]
+    companies_check = list(dict.fromkeys(company.upper() for company in companies))
+    start_date = datetime.date(start[0], start[1], start[2])
+    end_date = datetime.date(end[0], end[1], end[2])
+    if cache.ACTIVO:
+        tramos = {}
+        for company in companies_check:
+            arr = cache.leer_symbol(company, get_engine)
+            inicio = np.searchsorted(arr["Fecha"], np.datetime64(start_date, "us"), side="left")
+            fin = np.searchsorted(arr["Fecha"], np.datetime64(end_date, "us"), side="right")
+            tramos[company] = arr[inicio:fin]
+        return Panel.desde_arrays(tramos, dtype)
+
+    query = sql.text("""select Fecha, Symbol, Open, High, Low, Close_Price, Volume
+                from `stock_info` where (Symbol in :companies) and (Fecha between :start_date and :end_date)
+                order by Symbol, Fecha;""").bindparams(sql.bindparam("companies", expanding=True))
+    df = pd.read_sql(query, get_engine(), params={"companies":companies_check, "start_date":start_date, "end_date":end_date})
+    orden = {company: i for i, company in enumerate(companies_check)}
+    df = df.sort_values("Symbol", key=lambda c: c.map(orden), kind="stable")
+    return Panel.desde_frame(df, dtype)
+
+#PANEL (DATES x COMPANIES) OF DAILY LOG RETURNS ROUNDED TO 2 DECIMALS, COLUMNS IN THE ORDER GIVEN
+#THE FRAME WRAPS THE RETURNS ARRAY OF THE PANEL WITHOUT COPYING IT
+def PanelRetornos(companies, start, end, dtype=None):
+    panel = GetPanel(companies, start, end, dtype)
+    if panel.empty:
+        return pd.DataFrame()
+    return panel.frame(panel.retornos())
+
+#TURNS THE ACCUMULATED PAIRWISE MOMENTS INTO A COVARIANCE OR CORRELATION MATRIX
+#P = SUM x_i x_j, A = SUM x_i v_j, Q = SUM x_i^2 v_j, C = SUM v_i v_j (v = 1 IF THE RETURN EXISTS)
+def _MatrizDesdeMomentos(P, A, Q, C, correlacion, shrinkage):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cruzado = P - A * A.T / C
+        if correlacion:
+            varianza = Q - A * A / C
+            matriz = cruzado / np.sqrt(varianza * varianza.T)
+            objetivo = np.eye(len(matriz))
+        else:
+            matriz = cruzado / (C - 1)
+            objetivo = np.diag(np.diag(matriz))
+    if shrinkage:
+        #SHRINKAGE HACIA LA DIAGONAL (IDENTIDAD PARA CORRELACIONES)
+        matriz = (1 - shrinkage) * matriz + shrinkage * objetivo
+    return matriz
+
+#ROLLING-WINDOW CORRELATION (OR COVARIANCE) MATRICES UPDATED INCREMENTALLY:
+#EACH NEW DAY ADDS ITS OUTER PRODUCTS AND THE DAY LEAVING THE WINDOW SUBTRACTS THEM.
+#PAIRS ARE COMPUTED OVER THE DAYS WHERE BOTH RETURNS EXIST AND NEED A FULL WINDOW (LIKE pandas).
+#YIELDS (ROW INDEX, N x N MATRIX) EVERY 'paso' DAYS, SO LONG HISTORIES CAN BE STREAMED.
+def RollingCorrelationStream(retornos, ventana, correlacion=True, shrinkage=0.0, dtype=np.float64, paso=1):
+    x = np.asarray(retornos, dtype=np.float64)
+    valido = ~np.isnan(x)
+    centro = np.nanmean(np.where(valido, x, np.nan), axis=0) if valido.any() else np.zeros(x.shape[1])
+    x = np.where(valido, x - np.nan_to_num(centro), 0.0)
+    v = valido.astype(np.float64)
+
+    n = x.shape[1]
+    P, A, Q, C = (np.zeros((n, n)) for _ in range(4))
+    for t in range(len(x)):
+        xt, vt = x[t], v[t]
+        P += np.outer(xt, xt)
+        A += np.outer(xt, vt)
+        Q += np.outer(xt * xt, vt)
+        C += np.outer(vt, vt)
+        if t >= ventana:
+            xs, vs = x[t - ventana], v[t - ventana]
+            P -= np.outer(xs, xs)
+            A -= np.outer(xs, vs)
+            Q -= np.outer(xs * xs, vs)
+            C -= np.outer(vs, vs)
+        if t >= ventana - 1 and (t - ventana + 1) % paso == 0:
+            matriz = _MatrizDesdeMomentos(P, A, Q, C, correlacion, shrinkage)
+            matriz[C < ventana] = np.nan
+            yield t, matriz.astype(dtype, copy=False)
+
+#EXPONENTIALLY-WEIGHTED (RISKMETRICS, ZERO MEAN) CORRELATION OR COVARIANCE MATRICES.
+#cov_t = lam * cov_t-1 + (1 - lam) * x_t x_t', NORMALIZED BY THE ACCUMULATED WEIGHT OF EACH PAIR.
+#MISSING RETURNS LEAVE THEIR PAIRS UNCHANGED. YIELDS FROM ROW 'minimo' - 1 EVERY 'paso' DAYS.
+def EwmaCorrelationStream(retornos, lam=0.94, correlacion=True, shrinkage=0.0, dtype=np.float64, paso=1, minimo=20):
+    x = np.asarray(retornos, dtype=np.float64)
+    valido = ~np.isnan(x)
+    x = np.where(valido, x, 0.0)
+
+    n = x.shape[1]
+    S = np.zeros((n, n))
+    W = np.zeros((n, n))
+    for t in range(len(x)):
+        m = np.outer(valido[t], valido[t])
+        S = np.where(m, lam * S + (1 - lam) * np.outer(x[t], x[t]), S)
+        W = np.where(m, lam * W + (1 - lam), W)
+        if t >= minimo - 1 and (t - minimo + 1) % paso == 0:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cov = S / W
+                if correlacion:
+                    d = np.sqrt(np.diag(cov))
+                    matriz = cov / np.outer(d, d)
+                    objetivo = np.eye(n)
+                else:
+                    matriz = cov
+                    objetivo = np.diag(np.diag(cov))
+            if shrinkage:
+                matriz = (1 - shrinkage) * matriz + shrinkage * objetivo
+            yield t, matriz.astype(dtype, copy=False)
+
+#WE OBTAIN HOW THE CORRELATION (OR COVARIANCE) BETWEEN COMPANIES EVOLVED OVER A PERIOD OF TIME
+#metodo: 'rolling' (WINDOW OF 'ventana' DAYS) OR 'ewma' (DECAY 'lam')
+#RETURNS A DICTIONARY WITH THE DATES, THE COMPANIES AND A (DATES x N x N) ARRAY
+@instrumentar("stats")
+def GetRollingCorrelation(companies, start, end, ventana=60, metodo="rolling", lam=0.94,
+                          correlacion=True, shrinkage=0.0, dtype=np.float32, paso=1):
+    panel = PanelRetornos(companies, start, end)
+    if panel.empty:
+        return {"Fecha": pd.DatetimeIndex([]), "Empresa": [], "Matriz": np.empty((0, 0, 0), dtype=dtype)}
+
+    if metodo == "rolling":
+        stream = RollingCorrelationStream(panel.to_numpy(), ventana, correlacion, shrinkage, dtype, paso)
+    elif metodo == "ewma":
+        stream = EwmaCorrelationStream(panel.to_numpy(), lam, correlacion, shrinkage, dtype, paso)
+    else:
+        raise ValueError(f"UNKNOWN METHOD '{metodo}'. USE 'rolling' OR 'ewma'.")
+
+    filas = []
+    matrices = []
+    for t, matriz in stream:
+        filas.append(t)
+        matrices.append(matriz)
+    n = panel.shape[1]
+    cubo = np.stack(matrices) if matrices else np.empty((0, n, n), dtype=dtype)
+    return {"Fecha": pd.DatetimeIndex(panel.index[filas]), "Empresa": list(panel.columns), "Matriz": cubo}
+
+#RETURNS (DATES x COMPANIES) OF A PORTFOLIO UNIVERSE, UNROUNDED. EVERY COMPANY MUST HAVE DATA
+#BECAUSE THE COLUMNS OF THE WEIGHTS FOLLOW THE ORDER OF companies
+def _RetornosUniverso(companies, start, end):
+    if isinstance(companies, str):
+        companies = [companies]
+    panel = GetPanel(companies, start, end)
+    faltantes = [c.upper() for c in companies if c.upper() not in panel.indice]
+    if faltantes:
+        raise ValueError(f"NO DATA FOR {faltantes} IN THE PERIOD.")
+    return panel.symbols, panel.retornos(decimales=None)
+
+#WE OBTAIN THE ANNUALIZED RETURN, VOLATILITY, SHARPE RATIO AND MAXIMUM DRAWDOWN OF MANY PORTFOLIOS
+#OF THE SAME COMPANIES AT ONCE. pesos IS A (PORTFOLIOS x COMPANIES) MATRIX (OR ONE ROW) WITH THE
+#COLUMNS IN THE ORDER OF companies. ONE ROW PER PORTFOLIO
+@instrumentar("stats")
+def GetPortfolioStats(companies, start, end, pesos, tasa=portfolio.TASA_LIBRE, bloque=4096):
+    symbols, retornos = _RetornosUniverso(companies, start, end)
+    return portfolio.AnalizarPortafolios(pesos, retornos, tasa, bloque)
+
+#WE OBTAIN THE EFFICIENT FRONTIER OF SEVERAL COMPANIES BY MONTE CARLO (LONG-ONLY PORTFOLIOS)
+#THE PORTFOLIOS ARE DRAWN 'bloque' AT A TIME, SO MEMORY DOESN'T DEPEND ON n_portafolios.
+#RETURNS A DICTIONARY WITH THE FRONTIER (ONE ROW PER POINT) AND THE MAXIMUM SHARPE PORTFOLIO
+@instrumentar("stats")
+def GetEfficientFrontier(companies, start, end, n_portafolios=100_000, bloque=20_000, puntos=50, seed=0,
+                         tasa=portfolio.TASA_LIBRE):
+    symbols, retornos = _RetornosUniverso(companies, start, end)
+    media, covarianza = portfolio.momentos(retornos)
+    frontera, sharpe_maximo = portfolio.FronteraEficiente(media, covarianza, symbols, n_portafolios, bloque,
+                                                          puntos, seed, tasa)
+    return {"Frontera": frontera, "Sharpe máximo": sharpe_maximo}
+
+#SUBQUERY WITH THE DAILY LOG RETURN OF EACH ROW COMPUTED IN THE DATABASE (LAG OVER Fecha BY Symbol)
+SQL_RETORNOS = """select Symbol, round(ln(Close_Price / lag(Close_Price) over (partition by Symbol order by Fecha)), 2) as r
+                from `stock_info` where (Symbol in :companies) and (Fecha between :start_date and :end_date)"""
+
+#DAILY RETURN STATISTICS COMPUTED IN THE DATABASE: ONLY n, SUM, SUM OF SQUARES, MIN AND MAX
+#TRAVEL BACK PER COMPANY (STDDEV IS NOT PORTABLE, SO IT IS DERIVED FROM THE SUMS)
+def _DailyReturnStatsSQL(companies, start, end):
+    query = sql.text(f"""select t.Symbol as Empresa, count(t.r) as n, sum(t.r) as s, sum(t.r * t.r) as s2,
+                    min(t.r) as minimo, max(t.r) as maximo
+                    from ({SQL_RETORNOS}) t group by t.Symbol;""").bindparams(sql.bindparam("companies", expanding=True))
+    params = {"companies": [c.upper() for c in companies],
+              "start_date": datetime.date(start[0], start[1], start[2]),
+              "end_date": datetime.date(end[0], end[1], end[2])}
+    df = pd.read_sql(query, get_engine(), params=params).set_index("Empresa")
+    n = df["n"].astype(float)
+    media = df["s"] / n.where(n > 0)
+    varianza = ((df["s2"] - df["s"] * df["s"] / n.where(n > 0)) / (n - 1).where(n > 1)).clip(lower=0)
+    return pd.DataFrame({"mean": media, "std": np.sqrt(varianza), "min": df["minimo"], "max": df["maximo"]})
+
 #THIS FUNCTION GIVES US STATISTICS ABOUT THE DAILY RETURN OF 2 OR MORE COMPANIES
-def DailyReturnStats(companies, start, end):
-    df = GetVariousAdjRet(companies,start,end)
-    nuevos_dfs = []
-    #Para cada empresa en tu DataFrame df_global_retornos_ajustados, calcula el promedio, 
-    # la desviación estándar, el valor mínimo y el valor máximo de los "Retornos diarios".
-    
-    for company in companies:
-        temp_df = df[df["Empresa"] == company]
-        diccionario = {
-            "Empresa": company,
-            "Promedio RD": round(temp_df['Retorno diario'].mean(), 5),
-            "Desviación estándar RD": round(temp_df['Retorno diario'].std(), 5),
-            "Valor mínimo RD": round(temp_df['Retorno diario'].min(), 5),
-            "Valor máximo RD": round(temp_df['Retorno diario'].max(), 5)
-        }
-        nuevos_dfs.append(diccionario)
-        
-    df_final = pd.DataFrame(nuevos_dfs)
+#modo: 'sql' PUSHES THE CALCULATION DOWN TO THE DATABASE, 'pandas' COMPUTES IT LOCALLY AND
+#'auto' TRIES THE DATABASE FIRST AND FALLS BACK TO PANDAS IF THE BACKEND LACKS SUPPORT
+@instrumentar("stats")
+@memoizar
+def DailyReturnStats(companies, start, end, modo="auto"):
+    stats = None
+    if modo in ("auto", "sql"):
+        try:
+            stats = _DailyReturnStatsSQL(companies, start, end)
+        except Exception as e:
+            registrar_error(e)
+            if modo == "sql":
+                raise
+            print(f"SQL PUSHDOWN NOT AVAILABLE, USING PANDAS: {e}")
+    if stats is None:
+        df = GetVariousAdjRet(companies,start,end)
+        #Para cada empresa calcula el promedio, la desviación estándar, el valor mínimo y el valor
+        #máximo de los "Retornos diarios" en una sola agregación agrupada.
+        if df.empty:
+            df = pd.DataFrame(columns=["Empresa", "Retorno diario"])
+        stats = df.groupby("Empresa")["Retorno diario"].agg(["mean", "std", "min", "max"])
+    stats = stats.reindex(list(companies)).astype(float).round(5)
+    stats.columns = ["Promedio RD", "Desviación estándar RD", "Valor mínimo RD", "Valor máximo RD"]
+    stats.index.name = "Empresa"
+    df_final = stats.reset_index()
     return df_final
-    
+
+#QUANTILES COMPUTED IN THE DATABASE: EACH RETURN IS RANKED WITH row_number() AND ONLY THE RANKS
+#AROUND EVERY QUANTILE POSITION q * (n - 1) ARE TRANSFERRED (BOTH NEIGHBOURS, ALSO WHEN THE POSITION
+#IS A WHOLE RANK); THE LINEAR INTERPOLATION (SAME AS pandas) IS DONE HERE
+def _QuantilesSQL(companies, start, end, cuantiles):
+    cerca = " or ".join(f"abs((rn - 1) - {q} * (n - 1)) <= 1" for q in cuantiles)
+    query = sql.text(f"""select Empresa, r, rn, n from (
+                        select t.Symbol as Empresa, t.r,
+                        row_number() over (partition by t.Symbol order by t.r) as rn,
+                        count(*) over (partition by t.Symbol) as n
+                        from ({SQL_RETORNOS}) t where t.r is not null) q
+                    where {cerca}
+                    order by Empresa, rn;""").bindparams(sql.bindparam("companies", expanding=True))
+    params = {"companies": [c.upper() for c in companies],
+              "start_date": datetime.date(start[0], start[1], start[2]),
+              "end_date": datetime.date(end[0], end[1], end[2])}
+    df = pd.read_sql(query, get_engine(), params=params)
+
+    filas = []
+    for empresa, grupo in df.groupby("Empresa"):
+        valores = dict(zip(grupo["rn"].astype(int) - 1, grupo["r"].astype(float)))
+        n = int(grupo["n"].iat[0])
+        fila = {"Empresa": empresa}
+        for q in cuantiles:
+            posicion = q * (n - 1)
+            bajo = int(np.floor(posicion))
+            if posicion == bajo:
+                fila[q] = valores[bajo]
+                continue
+            alto = min(bajo + 1, n - 1)
+            fila[q] = valores[bajo] + (valores[alto] - valores[bajo]) * (posicion - bajo)
+        filas.append(fila)
+    return pd.DataFrame(filas, columns=["Empresa"] + list(cuantiles)).set_index("Empresa")
+
 #THIS FUNCTION CALCULATES THE 1% AND 99% QUANTILES OF THE DAILY RETURNS FOR EACH COMPANY 
 # IN A GIVEN LIST AND TIME PERIOD.
-def GetQuantiilesCompanies(companies,start,end):
-    df = GetVariousAdjRet(companies,start,end)
-    cuantiles = df.groupby("Empresa")["Retorno diario"].quantile([0.01,0.99])
-    nuevo_df = cuantiles.unstack(level=-1)
+#modo WORKS LIKE IN DailyReturnStats
+@instrumentar("stats")
+@memoizar
+def GetQuantiilesCompanies(companies,start,end,modo="auto"):
+    nuevo_df = None
+    if modo in ("auto", "sql"):
+        try:
+            nuevo_df = _QuantilesSQL(companies, start, end, [0.01, 0.99])
+        except Exception as e:
+            registrar_error(e)
+            if modo == "sql":
+                raise
+            print(f"SQL PUSHDOWN NOT AVAILABLE, USING PANDAS: {e}")
+    if nuevo_df is None:
+        df = GetVariousAdjRet(companies,start,end)
+        cuantiles = df.groupby("Empresa")["Retorno diario"].quantile([0.01,0.99])
+        nuevo_df = cuantiles.unstack(level=-1)
     nuevo_df.columns = ["Cuantil 0.01", "Cuantil 0.99"]
     nuevo_df = nuevo_df.reset_index()
     return nuevo_df
 
+#WE OBTAIN THE FULL TIME SERIES OF HISTORICAL VaR AND EXPECTED SHORTFALL (AS POSITIVE LOSSES) OF
+#SEVERAL COMPANIES. metodo: 'exact' (ROLLING WINDOW OF 'ventana' DAYS, ORDER STATISTICS WITHOUT
+#SORTING EVERY WINDOW) OR 'approx' (P-SQUARE OVER ALL THE DAYS SO FAR, O(1) PER DAY; 'ventana' IS
+#IGNORED). ONE ROW PER (DATE, COMPANY) THAT EXISTS, TWO COLUMNS PER LEVEL
+@instrumentar("stats")
+@memoizar
+def GetRollingVaR(companies, start, end, ventana=250, niveles=quantiles.NIVELES, metodo="exact"):
+    panel = GetPanel(companies, start, end)
+    if panel.empty:
+        return pd.DataFrame()
+
+    #LAS VENTANAS RECORREN LAS FECHAS DE CADA EMPRESA: SUS RETORNOS SE APILAN AL INICIO DE SU COLUMNA
+    retornos, posicion, fila, columna = panel.apilar(panel.retornos())
+
+    if metodo == "exact":
+        resultado = quantiles.VaRVentana(retornos, ventana, niveles)
+    elif metodo == "approx":
+        resultado = quantiles.VaRAproximado(retornos, niveles)
+    else:
+        raise ValueError(f"UNKNOWN METHOD '{metodo}'. USE 'exact' OR 'approx'.")
+
+    df = pd.DataFrame({
+        "Fecha": panel.fechas[fila],
+        "Empresa": np.asarray(panel.symbols, dtype=object)[columna],
+    })
+    for q, (var, es) in resultado.items():
+        df[f"VaR {q * 100:g}%"] = var[posicion, columna]
+        df[f"ES {q * 100:g}%"] = es[posicion, columna]
+    return df
+
+
+#STREAMING READ OF stock_info: YIELDS DATAFRAMES OF UP TO chunksize ROWS ORDERED BY (Symbol, Fecha)
+#THE QUERY RUNS ON A SERVER-SIDE CURSOR (stream_results), SO ONLY ONE CHUNK IS IN MEMORY AT A TIME.
+#THE ORDER FOLLOWS THE (Symbol, Fecha) PRIMARY KEY, SO THE DATABASE DOESN'T SORT.
+#companies=None READS EVERY SYMBOL; start/end=None LEAVE THAT SIDE OF THE SPAN OPEN
+def StockInfoStream(companies=None, start=None, end=None, chunksize=50_000):
+    condiciones, params, bindparams = [], {}, []
+    if companies is not None:
+        if isinstance(companies, str):
+            companies = [companies]
+        condiciones.append("Symbol in :companies")
+        params["companies"] = [c.upper() for c in companies]
+        bindparams.append(sql.bindparam("companies", expanding=True))
+    if start is not None:
+        condiciones.append("Fecha >= :start_date")
+        params["start_date"] = datetime.datetime(start[0], start[1], start[2])
+    if end is not None:
+        condiciones.append("Fecha <= :end_date")
+        params["end_date"] = datetime.datetime(end[0], end[1], end[2])
+    where = f"where {' and '.join(condiciones)}" if condiciones else ""
+    query = sql.text(f"""select Fecha, Symbol, Open, High, Low, Close_Price, Volume from `stock_info`
+                    {where} order by Symbol, Fecha;""").bindparams(*bindparams)
+
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunksize).execute(query, params)
+        columnas = list(result.keys())
+        for filas in result.partitions(chunksize):
+            df = pd.DataFrame.from_records(filas, columns=columnas)
+            df["Fecha"] = pd.to_datetime(df["Fecha"])
+            yield df
+
+#MARKS THE ROWS OF A CHUNK THAT START A NEW SYMBOL (THE FIRST ROW ONLY IF IT DOESN'T CONTINUE
+#THE SYMBOL THAT ENDED THE PREVIOUS CHUNK)
+def _InicioSymbol(symbols, ultimo_symbol):
+    nuevo = np.empty(len(symbols), dtype=bool)
+    nuevo[0] = symbols[0] != ultimo_symbol
+    nuevo[1:] = symbols[1:] != symbols[:-1]
+    return nuevo
+
+#STREAMING OPERATOR: ADDS "Retorno" = ln(P_t / P_t-1) OF EVERY SYMBOL TO EACH CHUNK
+#THE LAST PRICE OF THE CHUNK IS CARRIED OVER, SO A SYMBOL SPLIT BETWEEN TWO CHUNKS GETS THE
+#SAME RETURNS AS IF IT WAS READ AT ONCE. THE FIRST ROW OF EVERY SYMBOL IS NaN
+def LogReturnsStream(chunks, columna="Close_Price"):
+    ultimo_symbol, ultimo_precio = None, np.nan
+    for df in chunks:
+        if df.empty:
+            continue
+        symbols = df["Symbol"].to_numpy()
+        precios = df[columna].to_numpy(dtype=np.float64)
+        previo = np.empty_like(precios)
+        previo[0] = ultimo_precio
+        previo[1:] = precios[:-1]
+        previo[_InicioSymbol(symbols, ultimo_symbol)] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            retornos = np.log(precios / previo)
+        yield df.assign(Retorno=retornos)
+        ultimo_symbol, ultimo_precio = symbols[-1], precios[-1]
+
+#STREAMING OPERATOR: ADDS "Pico" (RUNNING MAXIMUM OF THE SYMBOL) AND "Drawdown" (P / Pico - 1)
+#THE PEAK OF THE SYMBOL THAT ENDS THE CHUNK IS CARRIED OVER TO THE NEXT ONE
+def DrawdownStream(chunks, columna="Close_Price"):
+    ultimo_symbol, ultimo_pico = None, np.nan
+    for df in chunks:
+        if df.empty:
+            continue
+        symbols = df["Symbol"].to_numpy()
+        precios = df[columna].to_numpy(dtype=np.float64)
+        nuevo = _InicioSymbol(symbols, ultimo_symbol)
+        grupo = np.cumsum(nuevo)
+        picos = pd.Series(precios).groupby(grupo).cummax().to_numpy(copy=True)
+        continua = grupo == 0
+        picos[continua] = np.fmax(picos[continua], ultimo_pico)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdown = precios / picos - 1
+        yield df.assign(Pico=picos, Drawdown=drawdown)
+        ultimo_symbol, ultimo_pico = symbols[-1], np.fmax.reduce(picos[grupo == grupo[-1]])
+
+#MERGES TWO SETS OF MOMENTS (n, MEAN, SUM OF SQUARED DEVIATIONS, MIN, MAX) OF THE SAME SERIES
+#(CHAN ET AL. PAIRWISE UPDATE); EVERY ARGUMENT IS AN ARRAY WITH ONE VALUE PER COLUMN
+def _CombinarMomentos(a, b):
+    na, ma, m2a, mina, maxa = a
+    nb, mb, m2b, minb, maxb = b
+    n = na + nb
+    ma, mb = np.where(na > 0, ma, 0.0), np.where(nb > 0, mb, 0.0)
+    m2a, m2b = np.where(na > 0, m2a, 0.0), np.where(nb > 0, m2b, 0.0)
+    total = np.maximum(n, 1)
+    delta = mb - ma
+    media = np.where(n > 0, (na * ma + nb * mb) / total, np.nan)
+    m2 = m2a + m2b + delta * delta * na * nb / total
+    return n, media, m2, np.fmin(mina, minb), np.fmax(maxa, maxb)
+
+def _FilasMomentos(symbols, momentos, columnas):
+    n, media, m2, minimo, maximo = momentos
+    df = pd.DataFrame({"Empresa": symbols})
+    for j, columna in enumerate(columnas):
+        df[f"{columna} n"] = n[:, j].astype(np.int64)
+        df[f"{columna} mean"] = media[:, j]
+        df[f"{columna} std"] = np.sqrt(np.where(n[:, j] > 1, m2[:, j] / np.maximum(n[:, j] - 1, 1), np.nan))
+        df[f"{columna} min"] = minimo[:, j]
+        df[f"{columna} max"] = maximo[:, j]
+    return df
+
+#STREAMING OPERATOR: COUNT, MEAN, STD (ddof=1), MIN AND MAX OF columnas FOR EVERY SYMBOL
+#CHUNKS ARE ORDERED BY Symbol, SO A SYMBOL IS FINISHED AS SOON AS THE NEXT ONE APPEARS: EACH
+#CHUNK YIELDS THE ROWS OF THE SYMBOLS IT FINISHED AND ONLY THE MOMENTS OF THE LAST SYMBOL ARE
+#CARRIED OVER. NaN VALUES ARE SKIPPED (LIKE pandas)
+def RunningStatsStream(chunks, columnas=("Retorno",)):
+    columnas = list(columnas)
+    ultimo_symbol, estado = None, None
+    for df in chunks:
+        if df.empty:
+            continue
+        grupos = df.groupby("Symbol", sort=False)[columnas]
+        n = grupos.count().to_numpy(dtype=np.float64)
+        momentos = [n, grupos.mean().to_numpy(), grupos.var(ddof=0).to_numpy() * n,
+                    grupos.min().to_numpy(dtype=np.float64), grupos.max().to_numpy(dtype=np.float64)]
+        symbols = grupos.count().index.to_numpy()
+
+        if symbols[0] == ultimo_symbol:
+            primero = _CombinarMomentos(estado, [m[0] for m in momentos])
+            for m, valor in zip(momentos, primero):
+                m[0] = valor
+        elif estado is not None:
+            yield _FilasMomentos([ultimo_symbol], [m[None, :] for m in estado], columnas)
+
+        if len(symbols) > 1:
+            yield _FilasMomentos(symbols[:-1], [m[:-1] for m in momentos], columnas)
+        ultimo_symbol, estado = symbols[-1], [m[-1] for m in momentos]
+
+    if estado is not None:
+        yield _FilasMomentos([ultimo_symbol], [m[None, :] for m in estado], columnas)
+
+#WHOLE-HISTORY SUMMARY OF EVERY SYMBOL (OR OF companies) IN CONSTANT MEMORY:
+#THE TABLE IS STREAMED IN CHUNKS THROUGH LogReturnsStream -> DrawdownStream -> RunningStatsStream
+#AND ONLY ONE ROW PER SYMBOL IS KEPT
+@instrumentar("stats")
+def GetHistorySummary(companies=None, start=None, end=None, chunksize=50_000):
+    chunks = StockInfoStream(companies, start, end, chunksize=chunksize)
+    resumenes = list(RunningStatsStream(DrawdownStream(LogReturnsStream(chunks)), ["Retorno", "Drawdown"]))
+    if not resumenes:
+        return pd.DataFrame()
+    df = pd.concat(resumenes, ignore_index=True)
+    df_final = pd.DataFrame({
+        "Empresa": df["Empresa"],
+        "Dias": df["Drawdown n"],
+        "Promedio RL": df["Retorno mean"],
+        "Desviación estándar RL": df["Retorno std"],
+        "Valor mínimo RL": df["Retorno min"],
+        "Valor máximo RL": df["Retorno max"],
+        "MDD %": (df["Drawdown min"] * 100).round(2),
+    })
+    return df_final
+
+#WE OBTAIN THE CURRENT RISK METRICS OF SEVERAL COMPANIES (OR OF EVERY COMPANY) FROM THE ONLINE
+#ESTIMATORS THAT THE INGESTION KEEPS UP TO DATE: NO HISTORY IS QUERIED. ONE ROW PER COMPANY
+@instrumentar("stats")
+def GetLiveMetrics(companies=None):
+    if isinstance(companies, str):
+        companies = [companies]
+    filas = online.registro().metricas(companies)
+    if not filas:
+        return pd.DataFrame()
+    df = pd.DataFrame(filas)
+    df["Fecha"] = pd.to_datetime(df["Fecha"])
+    return df
 
+#REBUILDS THE ONLINE ESTIMATORS OF SEVERAL COMPANIES (OR OF EVERY COMPANY) BY REPLAYING THEIR
+#STORED HISTORY IN CHUNKS, AND SAVES THE SNAPSHOT. NEEDED AFTER A PAST BAR WAS CORRECTED
+@instrumentar("stats")
+def RebuildLiveMetrics(companies=None, chunksize=50_000):
+    if isinstance(companies, str):
+        companies = [companies]
+    estimadores = online.registro()
+    estimadores.olvidar(companies)
+    barras = 0
+    for chunk in StockInfoStream(companies, chunksize=chunksize):
+        barras += estimadores.alimentar(chunk)
+    estimadores.guardar()
+    return barras
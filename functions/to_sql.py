@@ -1,13 +1,76 @@
 # THIS MODULE SAVES API DATA INTO THE SQL DATABASE TABLE "stock_info"
-# IT USES CHUNKSIZE TO IMPROVE PERFORMANCE AND PREVENT MEMORY ISSUES
+# IT READS THE LATEST STORED DATE PER SYMBOL (WATERMARK) TO DOWNLOAD AND WRITE ONLY NEW ROWS
+# AND INSERTS THEM WITH AN IDEMPOTENT UPSERT KEYED ON (Symbol, Fecha)
+import datetime
 import pandas as pd
-from main import get_data_daily
-from db import engine
+from sqlalchemy import text
+from main import get_data_daily, cargar_configuracion_yaml
+from db import get_engine
+from bulk_loader import bulk_write
+import cache
+import memo
+import online
+import raw_cache
+import resampling
+from migrations import migrar
+from instrumentation import instrumentar, registrar_error
 
+# COMPACT RESPONSES ONLY CONTAIN THE LAST 100 TRADING DAYS (~140 CALENDAR DAYS)
+DIAS_COMPACT = 130
 
-def to_sql():
+
+# READS THE LATEST Fecha STORED FOR EACH Symbol
+# RETURNS A DICTIONARY {SYMBOL: TIMESTAMP}, EMPTY IF THE TABLE DOES NOT EXIST YET
+def get_watermarks():
+    try:
+        query = text("select Symbol, max(Fecha) as Fecha from `stock_info` group by Symbol;")
+        df = pd.read_sql(query, get_engine())
+        return dict(zip(df["Symbol"], pd.to_datetime(df["Fecha"])))
+    except Exception as e:
+        registrar_error(e)
+        return {}
+
+
+# CHOOSES 'compact' FOR SYMBOLS WHOSE WATERMARK IS RECENT ENOUGH AND 'full' OTHERWISE
+def elegir_outputsize(watermarks, symbols, hoy=None):
+    hoy = pd.Timestamp(hoy or datetime.date.today())
+    sizes = {}
+    for symbol in symbols:
+        ultima = watermarks.get(symbol)
+        if ultima is not None and (hoy - ultima).days <= DIAS_COMPACT:
+            sizes[symbol] = "compact"
+        else:
+            sizes[symbol] = "full"
+    return sizes
+
+
+# STORED HISTORY OF SYMBOLS THE LIVE ESTIMATORS DON'T KNOW YET, IN CHUNKS ORDERED BY (Symbol, Fecha)
+def _historia(symbols):
+    from stats_functions import StockInfoStream
+    return StockInfoStream(symbols)
+
+
+# DOWNLOADS DATA AND WRITES IT INTO stock_info
+# WITH incremental=True ONLY ROWS NEWER THAN EACH SYMBOL'S WATERMARK ARE DOWNLOADED AND WRITTEN
+# WITH replay=True NOTHING IS DOWNLOADED: THE ROWS COME FROM THE RAW RESPONSE CACHE OF THE
+# CONFIGURED SYMBOLS (EVERY CACHED SYMBOL IF THERE ARE NONE), SO to_sql(incremental=False,
+# replay=True) REBUILDS stock_info OFFLINE
+@instrumentar("to_sql")
+def to_sql(incremental=True, replay=False):
     try:
-        df = get_data_daily()
+        configuracion = cargar_configuracion_yaml('config.yaml') or {}
+        watermarks = get_watermarks() if incremental else {}
+        if replay:
+            df = raw_cache.reproducir(
+                configuracion.get('stock_symbols') or None, configuracion.get('funciones'),
+                workers=configuracion.get('replay_workers'),
+            )
+        elif incremental:
+            # SYMBOLS WITHOUT A WATERMARK (EMPTY OR MISSING TABLE INCLUDED) GET THE FULL HISTORY
+            sizes = elegir_outputsize(watermarks, configuracion.get('stock_symbols', []))
+            df = get_data_daily(sizes=sizes)
+        else:
+            df = get_data_daily()
 
         # VALIDATE DATAFRAME
         if df is None or not isinstance(df, pd.DataFrame):
@@ -17,20 +80,54 @@ def to_sql():
             return "ERROR: DATAFRAME IS EMPTY. NOTHING TO INSERT."
 
         # CONVERT DATE TO DATETIME TYPE
-        if "fecha" in df.columns:
-            df["Fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+        df["Fecha"] = pd.to_datetime(df["Fecha"], errors="coerce")
 
         # DROP INVALID DATES
-        df = df.dropna(subset=["fecha"])
+        df = df.dropna(subset=["Fecha"])
 
         # REMOVE DUPLICATES (FECHA + SYMBOL)
-        df = df.drop_duplicates(subset=["fecha", "symbol"])
+        df = df.drop_duplicates(subset=["Fecha", "Symbol"])
+
+        # KEEP ONLY ROWS NEWER THAN THE STORED WATERMARK OF EACH SYMBOL
+        if watermarks:
+            limite = df["Symbol"].map(watermarks)
+            df = df[limite.isna() | (df["Fecha"] > limite)]
+
+        if df.empty:
+            return "TABLE ALREADY UP TO DATE"
+
+        # BRING THE SCHEMA (TYPED COLUMNS + (Symbol, Fecha) PRIMARY KEY) UP TO DATE
+        migrar(get_engine())
+
+        # INSERT INTO SQL DATABASE WITH AN IDEMPOTENT UPSERT, IN BATCHES SIZED BY BYTES
+        filas = bulk_write(
+            df, get_engine(),
+            estrategia=configuracion.get('bulk_strategy', 'auto'),
+            max_bytes=configuracion.get('bulk_batch_bytes'),
+        )
+
+        # REBUILD THE WEEKLY/MONTHLY/YEARLY BARS OF THE PERIODS THE NEW ROWS TOUCH
+        # ON FAILURE THE ROLLUPS ARE STALE UNTIL python resampling.py REBUILDS THEM
+        try:
+            resampling.actualizar(get_engine(), df)
+        except Exception as e:
+            registrar_error(e)
+            print(f"WARNING: OHLCV ROLLUPS NOT UPDATED ({e}). REBUILD THEM WITH python resampling.py")
+
+        # THE LOCAL COLUMNAR CACHE AND THE MEMOIZED ANALYTICS OF THE WRITTEN SYMBOLS ARE NOW STALE
+        cache.invalidar(df["Symbol"].unique())
+        memo.CACHE.invalidar(df["Symbol"].unique())
 
-        # INSERT INTO SQL DATABASE
-        df.to_sql("stock_info", engine, if_exists="append", index=False, chunksize=100)
+        # FEED THE NEW BARS TO THE LIVE ESTIMATORS (O(1) PER BAR) AND SAVE THEIR SNAPSHOT
+        # THE ROWS ARE ALREADY STORED, SO A FAILURE HERE ONLY LEAVES THE LIVE METRICS BEHIND
+        try:
+            online.actualizar_desde_ingesta(df, historia=_historia)
+        except Exception as e:
+            registrar_error(e)
+            print(f"WARNING: LIVE METRICS NOT UPDATED ({e}).")
 
-        return "TABLE UPDATED CORRECTLY"
+        return f"TABLE UPDATED CORRECTLY ({filas} ROWS)"
 
     except Exception as e:
+        registrar_error(e)
         return f"SOMETHING WENT WRONG! {e}"
-    